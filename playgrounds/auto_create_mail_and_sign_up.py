@@ -5,7 +5,6 @@ Author: oaslananka
 GitHub: https://github.com/oaslananka
 """
 
-import time
 import threading
 from email_listener import EmailListener
 from auth_client import AuthClient
@@ -73,14 +72,7 @@ def process_email(email, auth_client, email_listener, results):
 
     # Verification
     email_listener.start_listening()
-    while not email_listener.verification_complete:
-        time.sleep(1)
-
-    verification_code = None
-    for verification in email_listener.verification_codes:
-        if verification['email'] == email:
-            verification_code = verification['verification_code']
-            break
+    verification_code = email_listener.wait_for_code(email)
 
     if not verification_code:
         print(f"Verification failed for {email}")
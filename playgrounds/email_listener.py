@@ -6,23 +6,35 @@ GitHub: https://github.com/oaslananka
 """
 
 from mailtm import Email
-import json
+from mail_backends import extract_verification_code
 import threading
 
 
 class EmailListener:
     """
     Listens for verification emails and extracts verification codes.
+
+    Addresses, codes and the events signalling a code are all kept in dicts by
+    address, so each caller waits for its own address only and a mail is
+    matched to its address in constant time.
     """
 
     def __init__(self, target_address, num_addresses=1, callback=None):
         self.target_address = target_address
         self.num_addresses = num_addresses
-        self.email_objects = []
-        self.verification_codes = []
+        self.email_objects = {}
+        self.verification_codes = {}
+        self.code_events = {}
         self.callback = callback if callback else self.default_callback
-        self.verification_complete = False
         self.lock = threading.Lock()
+        self.listening = False
+
+    @property
+    def verification_complete(self):
+        """
+        Whether every registered address has received its verification code.
+        """
+        return all(event.is_set() for event in self.code_events.values())
 
     def default_callback(self, message):
         """
@@ -31,29 +43,25 @@ class EmailListener:
         Args:
             message (dict): The email message.
         """
-        from_address = message['from']['address']
-        subject = message['subject']
-        text_content = message['text']
-
-        if from_address == self.target_address:
-            to_address = message['to'][0]['address']
-            verification_code = text_content.split("code: ")[1].split("\n")[0]
-            print(f"To: {to_address}, Verification Code: {verification_code}")
-            with self.lock:
-                self.verification_codes.append({"email": to_address, "verification_code": verification_code})
+        if message['from']['address'] != self.target_address:
+            return
 
-            # Stop listening to this email address
-            for email in self.email_objects:
-                if email.address == to_address:
-                    threading.Thread(target=email.stop).start()
-                    with self.lock:
-                        self.email_objects.remove(email)
-                    break
+        to_address = message['to'][0]['address']
+        verification_code = extract_verification_code(message['text'])
+        if not verification_code:
+            return
+        print(f"To: {to_address}, Verification Code: {verification_code}")
 
-            # Check if all email listeners have completed
-            with self.lock:
-                if not self.email_objects:
-                    self.verification_complete = True
+        with self.lock:
+            self.verification_codes[to_address] = verification_code
+            event = self.code_events.get(to_address)
+            email = self.email_objects.pop(to_address, None)
+        if event:
+            event.set()
+
+        # Stop listening to this email address, stop() joins the listener thread we are running in
+        if email:
+            threading.Thread(target=email.stop).start()
 
     def get_domains(self):
         """
@@ -62,7 +70,8 @@ class EmailListener:
         Returns:
             str: The domain of the email addresses.
         """
-        return self.email_objects[0].domain if self.email_objects else ""
+        email = next(iter(self.email_objects.values()), None)
+        return email.domain if email else ""
 
     def register_new_addresses(self):
         """
@@ -71,16 +80,41 @@ class EmailListener:
         Returns:
             list: List of registered email addresses.
         """
+        addresses = []
         for _ in range(self.num_addresses):
             email = Email()
             email.register()
-            self.email_objects.append(email)
-        return [email.address for email in self.email_objects]
+            with self.lock:
+                self.email_objects[email.address] = email
+                self.code_events[email.address] = threading.Event()
+            addresses.append(email.address)
+        return addresses
 
     def start_listening(self):
         """
-        Start listening for emails.
+        Start listening for emails, only the first call has an effect.
         """
-        for email in self.email_objects:
+        with self.lock:
+            if self.listening:
+                return
+            self.listening = True
+            emails = list(self.email_objects.values())
+        for email in emails:
             email.start(self.callback)
         print("\nWaiting for new emails...")
+
+    def wait_for_code(self, address, timeout=120):
+        """
+        Wait for the verification code of one address.
+
+        Args:
+            address (str): The email address.
+            timeout (float, optional): Seconds to wait, None waits forever.
+
+        Returns:
+            str: The verification code, None if it did not arrive in time.
+        """
+        event = self.code_events.get(address)
+        if event is None or not event.wait(timeout):
+            return None
+        return self.verification_codes.get(address)
@@ -0,0 +1,264 @@
+"""
+Module: mail_backends
+Description: Mailbox backends that receive the verification mails of provisioned accounts.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import abc
+import asyncio
+import logging
+import re
+import uuid
+from email import message_from_bytes, policy
+from email.utils import parseaddr
+
+from mailtm import Email
+
+logging.basicConfig(level=logging.INFO)
+
+VERIFICATION_CODE_PATTERN = re.compile(r"code: ([^\n]+)")
+SMTP_ADDRESS_PATTERN = re.compile(r"<([^>]*)>")
+
+
+def extract_verification_code(text):
+    """
+    Extracts the verification code from the text of a verification mail.
+
+    Args:
+        text (str): The mail text.
+
+    Returns:
+        str: The verification code, None if the text has none.
+    """
+    match = VERIFICATION_CODE_PATTERN.search(text or "")
+    return match.group(1).strip() if match else None
+
+
+class Mailbox(abc.ABC):
+    """
+    Base class of the mailbox backends.
+
+    Codes are kept in a dict by address and handed to the account waiting for
+    them through a future, so a mail is matched to its account in constant time
+    and nobody polls. A code arriving before anyone waits for it is kept until
+    it is asked for.
+    """
+
+    def __init__(self, sender):
+        self.sender = sender.lower()
+        self.loop = None
+        self._codes = {}
+        self._waiters = {}
+
+    async def start(self):
+        """
+        Starts the backend on the running event loop.
+        """
+        self.loop = asyncio.get_running_loop()
+
+    async def close(self):
+        """
+        Stops the backend.
+        """
+
+    @abc.abstractmethod
+    async def create_account(self):
+        """
+        Creates a new address.
+
+        Returns:
+            dict: The account fields of the mailbox, at least "email".
+        """
+
+    async def wait_for_code(self, account, timeout):
+        """
+        Waits for the verification code of an account.
+
+        Args:
+            account (dict): The account record.
+            timeout (float): Seconds to wait for the mail.
+
+        Returns:
+            str: The verification code, None if no mail arrived in time.
+        """
+        address = account["email"].lower()
+        code = self._codes.pop(address, None)
+        if code:
+            return code
+        future = self._waiters[address] = self.loop.create_future()
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            del self._waiters[address]
+
+    def deliver(self, address, sender, text):
+        """
+        Indexes a received mail. Must be called on the event loop.
+
+        Args:
+            address (str): Recipient address.
+            sender (str): Sender address.
+            text (str): Mail text.
+        """
+        if sender.lower() != self.sender:
+            return
+        code = extract_verification_code(text)
+        if not code:
+            return
+        address = address.lower()
+        future = self._waiters.get(address)
+        if future is not None and not future.done():
+            future.set_result(code)
+        else:
+            self._codes[address] = code
+
+
+class MailtmMailbox(Mailbox):
+    """
+    Verification mailboxes on mail.tm.
+
+    A mailbox is only polled while its account waits for the verification code,
+    so the number of listener threads is bounded by the number of workers.
+    """
+
+    def __init__(self, sender, poll_interval=3):
+        super().__init__(sender)
+        self.poll_interval = poll_interval
+        self._emails = {}
+
+    def _register(self):
+        email = Email()
+        email.register()
+        self._emails[email.address] = email
+        return {"email": email.address, "mailbox_token": email.token}
+
+    async def create_account(self):
+        return await asyncio.to_thread(self._register)
+
+    def _email(self, account):
+        email = self._emails.get(account["email"])
+        if email is None:
+            # Mailbox of a previous run, the saved token is enough to read it
+            email = self._emails[account["email"]] = Email()
+            email.address = account["email"]
+            email.token = account["mailbox_token"]
+        return email
+
+    def _on_message(self, address, message):
+        # Runs in the mail.tm listener thread
+        self.loop.call_soon_threadsafe(self.deliver, address, message['from']['address'], message['text'])
+
+    async def wait_for_code(self, account, timeout):
+        address = account["email"]
+        if address.lower() in self._codes:
+            return await super().wait_for_code(account, timeout)
+        email = await asyncio.to_thread(self._email, account)
+        email.start(lambda message: self._on_message(address, message), interval=self.poll_interval)
+        try:
+            return await super().wait_for_code(account, timeout)
+        finally:
+            await asyncio.to_thread(email.stop)
+            del self._emails[address]
+
+
+class SmtpSinkMailbox(Mailbox):
+    """
+    Local SMTP server accepting the mail of any address in its domain.
+
+    Point the auth service's outgoing mail at this server and every account gets
+    an address without registering anything, one server receiving the mails of
+    all of them. Mails are parsed as they arrive and wake the waiting account
+    directly, nothing is stored on disk.
+    """
+
+    def __init__(self, sender, host="0.0.0.0", port=2525, domain="loadtest.local"):
+        super().__init__(sender)
+        self.host = host
+        self.port = port
+        self.domain = domain
+        self.received = 0
+        self._server = None
+
+    async def start(self):
+        await super().start()
+        self._server = await asyncio.start_server(self._handle_session, self.host, self.port)
+        logging.info(f"SMTP sink listening on {self.host}:{self.port} for @{self.domain}")
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def create_account(self):
+        return {"email": f"lt{uuid.uuid4().hex[:16]}@{self.domain}"}
+
+    async def _handle_session(self, reader, writer):
+        """
+        Serves one SMTP session, just enough of RFC 5321 for a mail client to deliver.
+        """
+        recipients = []
+        writer.write(b"220 LoadTestCyrex SMTP sink\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode("utf-8", "replace").strip()
+                verb = command[:4].upper()
+                if verb in ("HELO", "EHLO"):
+                    writer.write(b"250 LoadTestCyrex\r\n")
+                elif verb == "MAIL" or verb == "RSET":
+                    recipients = []
+                    writer.write(b"250 OK\r\n")
+                elif verb == "RCPT":
+                    match = SMTP_ADDRESS_PATTERN.search(command)
+                    if match:
+                        recipients.append(match.group(1))
+                    writer.write(b"250 OK\r\n")
+                elif verb == "DATA":
+                    writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    await writer.drain()
+                    self._receive(recipients, await self._read_data(reader))
+                    recipients = []
+                    writer.write(b"250 OK\r\n")
+                elif verb == "NOOP":
+                    writer.write(b"250 OK\r\n")
+                elif verb == "QUIT":
+                    writer.write(b"221 Bye\r\n")
+                    break
+                else:
+                    writer.write(b"502 Command not implemented\r\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_data(reader):
+        lines = []
+        while True:
+            line = await reader.readline()
+            if not line or line.rstrip(b"\r\n") == b".":
+                break
+            # Undo the dot stuffing of the client
+            lines.append(line[1:] if line.startswith(b"..") else line)
+        return b"".join(lines)
+
+    def _receive(self, recipients, data):
+        self.received += 1
+        message = message_from_bytes(data, policy=policy.default)
+        body = message.get_body(preferencelist=("plain", "html"))
+        text = body.get_content() if body is not None else ""
+        sender = parseaddr(message.get("From", ""))[1]
+        for address in recipients:
+            self.deliver(address, sender, text)
+
+
+MAILBOX_BACKENDS = {
+    "mailtm": MailtmMailbox,
+    "smtp": SmtpSinkMailbox,
+}
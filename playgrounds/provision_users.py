@@ -0,0 +1,352 @@
+"""
+Module: provision_users
+Description: Signs up, verifies and signs in test accounts in bulk with resumable checkpoints.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+import grpc
+import jwt
+from mail_backends import MAILBOX_BACKENDS, SmtpSinkMailbox
+from proto_out import auth_service_pb2_grpc as auth_service_grpc
+from proto_out.auth_service_pb2 import VerifyEmailRequest
+from proto_out.rpc_signin_user_pb2 import SignInUserInput
+from proto_out.rpc_signup_user_pb2 import SignUpUserInput
+
+# The credential store is shared with the load test in src/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.utils.credential_store import CredentialStore  # noqa: E402
+
+logging.basicConfig(level=logging.INFO)
+
+# Account states, in the order an account goes through them
+NEW = "new"
+SIGNED_UP = "signed_up"
+CODE_RECEIVED = "code_received"
+VERIFIED = "verified"
+SIGNED_IN = "signed_in"
+FAILED = "failed"
+
+# Result statuses of signin_from_json.py, by the state an account failed in
+FAILED_STATUSES = {
+    NEW: "signup_failed",
+    SIGNED_UP: "verification_failed",
+    CODE_RECEIVED: "verification_failed",
+    VERIFIED: "signin_failed",
+}
+
+RETRYABLE_CODES = {
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+}
+
+
+class ProvisioningError(Exception):
+    """
+    Raised when an account cannot move on to its next state.
+    """
+
+
+def extract_local_part(email):
+    """
+    Extracts the local part of an email address.
+
+    Args:
+        email (str): The email address.
+
+    Returns:
+        str: The local part of the email address.
+    """
+    return email.split('@')[0]
+
+
+def decode_jwt(token):
+    """
+    Decodes the payload of a JWT token without verifying its signature.
+
+    Args:
+        token (str): The JWT token.
+
+    Returns:
+        dict: The decoded token payload, None if the token cannot be decoded.
+    """
+    try:
+        return jwt.decode(token, options={"verify_signature": False})
+    except jwt.InvalidTokenError:
+        return None
+
+
+class Checkpoint:
+    """
+    Append-only JSON lines file holding the latest state of every account.
+
+    Each state change appends the whole account, so the last line of an address
+    wins when the file is loaded again and a run can resume where it stopped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def load(self):
+        """
+        Reads the accounts of a previous run.
+
+        Returns:
+            dict: Latest account record by email address.
+        """
+        accounts = {}
+        if not os.path.exists(self.path):
+            return accounts
+        with open(self.path, "r") as file:
+            for line in file:
+                try:
+                    account = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line cut short by a crash
+                    continue
+                accounts[account["email"]] = account
+        return accounts
+
+    def open(self):
+        self.file = open(self.path, "a")
+
+    def save(self, account):
+        """
+        Appends the current state of an account.
+
+        Args:
+            account (dict): The account record.
+        """
+        self.file.write(json.dumps(account) + "\n")
+        self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+class Provisioner:
+    """
+    Moves accounts through signup, verification and signin with a bounded pool of workers.
+
+    Every account is its own state machine, a worker takes an account and drives
+    it to signed in or failed before taking the next one. All state changes are
+    checkpointed, so an interrupted run picks up each account at its last state.
+    """
+
+    def __init__(
+        self, host, mailbox, checkpoint, credential_store=None, workers=50, code_timeout=120.0, rpc_timeout=10.0, retries=3
+    ):
+        self.host = host
+        self.mailbox = mailbox
+        self.checkpoint = checkpoint
+        self.credential_store = credential_store
+        self.workers = workers
+        self.code_timeout = code_timeout
+        self.rpc_timeout = rpc_timeout
+        self.retries = retries
+        self.accounts = {}
+        self.stub = None
+        self._steps = {
+            NEW: self._sign_up,
+            SIGNED_UP: self._receive_code,
+            CODE_RECEIVED: self._verify,
+            VERIFIED: self._sign_in,
+        }
+
+    async def run(self, count, retry_failed=False):
+        """
+        Provisions accounts until count accounts are signed in or have failed.
+
+        Args:
+            count (int): Total number of accounts wanted, including those of previous runs.
+            retry_failed (bool): Retry failed accounts from the state they failed in.
+        """
+        self.accounts = self.checkpoint.load()
+        states = Counter(account["state"] for account in self.accounts.values())
+        pending = [
+            account for account in self.accounts.values()
+            if account["state"] != SIGNED_IN and (account["state"] != FAILED or retry_failed)
+        ]
+        missing = max(count - states[SIGNED_IN] - len(pending), 0)
+        logging.info(
+            "Resuming %d accounts, %d already signed in, creating %d new",
+            len(pending), states[SIGNED_IN], missing,
+        )
+
+        await self.mailbox.start()
+        self.checkpoint.open()
+        # Workers share one iterator, so new accounts are only created when a worker is free
+        work = itertools.chain(pending, itertools.repeat(None, missing))
+        async with grpc.aio.insecure_channel(self.host) as channel:
+            self.stub = auth_service_grpc.AuthServiceStub(channel)
+            progress = asyncio.create_task(self._log_progress())
+            try:
+                await asyncio.gather(*(self._worker(work) for _ in range(self.workers)))
+            finally:
+                progress.cancel()
+                self.checkpoint.close()
+                await self.mailbox.close()
+        self._log_states()
+
+    async def _worker(self, work):
+        for account in work:
+            await self._provision(account)
+
+    async def _provision(self, account):
+        if account is None:
+            try:
+                account = await self.mailbox.create_account()
+            except Exception as e:
+                logging.error(f"Mailbox creation failed: {e}")
+                return
+            account.update(password=extract_local_part(account["email"]), state=NEW)
+            self._save(account)
+        elif account["state"] == FAILED:
+            account["state"] = account.pop("failed_state")
+            account.pop("error", None)
+
+        while account["state"] in self._steps:
+            state = account["state"]
+            try:
+                await self._steps[state](account)
+            except grpc.aio.AioRpcError as e:
+                account.update(state=FAILED, failed_state=state, error=f"{e.code().name}: {e.details()}")
+            except ProvisioningError as e:
+                account.update(state=FAILED, failed_state=state, error=str(e))
+            self._save(account)
+
+    def _save(self, account):
+        account["updated"] = time.time()
+        self.accounts[account["email"]] = account
+        self.checkpoint.save(account)
+
+    async def _call(self, rpc, request):
+        """
+        Calls an RPC, retrying with backoff while the service is overloaded or unreachable.
+        """
+        for attempt in itertools.count():
+            try:
+                return await rpc(request, timeout=self.rpc_timeout)
+            except grpc.aio.AioRpcError as e:
+                if e.code() not in RETRYABLE_CODES or attempt >= self.retries:
+                    raise
+            await asyncio.sleep(min(0.2 * 2 ** attempt, 5.0) * random.uniform(0.5, 1.5))
+
+    async def _sign_up(self, account):
+        local_part = extract_local_part(account["email"])
+        request = SignUpUserInput(
+            name=local_part, email=account["email"], password=account["password"], passwordConfirm=account["password"]
+        )
+        try:
+            await self._call(self.stub.SignUpUser, request)
+        except grpc.aio.AioRpcError as e:
+            # Signed up by a run that stopped before saving the state
+            if e.code() != grpc.StatusCode.ALREADY_EXISTS:
+                raise
+        account["state"] = SIGNED_UP
+
+    async def _receive_code(self, account):
+        code = await self.mailbox.wait_for_code(account, self.code_timeout)
+        if not code:
+            raise ProvisioningError(f"No verification code within {self.code_timeout:g}s")
+        account.update(code=code, state=CODE_RECEIVED)
+
+    async def _verify(self, account):
+        await self._call(self.stub.VerifyEmail, VerifyEmailRequest(verificationCode=account["code"]))
+        account["state"] = VERIFIED
+
+    async def _sign_in(self, account):
+        response = await self._call(
+            self.stub.SignInUser, SignInUserInput(email=account["email"], password=account["password"])
+        )
+        account.update(access_token=response.access_token, refresh_token=response.refresh_token, state=SIGNED_IN)
+        if self.credential_store:
+            self.credential_store.add(account["email"], account["password"], response.access_token, response.refresh_token)
+
+    async def _log_progress(self, interval=10.0):
+        while True:
+            await asyncio.sleep(interval)
+            self._log_states()
+
+    def _log_states(self):
+        states = Counter(account["state"] for account in self.accounts.values())
+        logging.info("Accounts: " + ", ".join(f"{state} {count}" for state, count in sorted(states.items())))
+
+    def write_results(self, path):
+        """
+        Writes the accounts in the format of signin_from_json.py.
+
+        Args:
+            path (str): Output JSON file.
+        """
+        results = {}
+        for email, account in self.accounts.items():
+            if account["state"] == SIGNED_IN:
+                results[email] = {
+                    "status": "success",
+                    "email": email,
+                    "password": account["password"],
+                    "access_token": decode_jwt(account["access_token"]),
+                    "refresh_token": decode_jwt(account["refresh_token"]),
+                }
+            elif account["state"] == FAILED:
+                results[email] = {"status": FAILED_STATUSES[account["failed_state"]], "error": account["error"]}
+        with open(path, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Provision verified and signed in test accounts in bulk.")
+    parser.add_argument("--count", type=int, required=True, help="Total number of accounts wanted")
+    parser.add_argument("--host", default="vacancies.cyrextech.net:7823", help="Auth service address")
+    parser.add_argument("--sender", default="noreply@cyrextech.net", help="Sender of the verification mails")
+    parser.add_argument("--mailbox", choices=MAILBOX_BACKENDS, default="mailtm", help="Mailbox backend")
+    parser.add_argument("--smtp-listen", default="0.0.0.0:2525", help="Address of the local SMTP sink")
+    parser.add_argument("--mail-domain", default="loadtest.local", help="Domain of the SMTP sink addresses")
+    parser.add_argument("--workers", type=int, default=50, help="Accounts provisioned at the same time")
+    parser.add_argument("--checkpoint", default="provisioning_checkpoint.jsonl", help="Checkpoint file to resume from")
+    parser.add_argument("--output", default="signedup_succesfully_users.json", help="Results file")
+    parser.add_argument("--credential-store", default="credentials.db", help="Credential store for the load test")
+    parser.add_argument("--code-timeout", type=float, default=120.0, help="Seconds to wait for a verification mail")
+    parser.add_argument("--retries", type=int, default=3, help="Retries of overloaded or unreachable calls")
+    parser.add_argument("--retry-failed", action="store_true", help="Retry the failed accounts of previous runs")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.mailbox == "smtp":
+        smtp_host, smtp_port = args.smtp_listen.rsplit(":", 1)
+        mailbox = SmtpSinkMailbox(args.sender, host=smtp_host, port=int(smtp_port), domain=args.mail_domain)
+    else:
+        mailbox = MAILBOX_BACKENDS[args.mailbox](args.sender)
+    credential_store = CredentialStore(args.credential_store)
+    provisioner = Provisioner(
+        args.host,
+        mailbox,
+        Checkpoint(args.checkpoint),
+        credential_store=credential_store,
+        workers=args.workers,
+        code_timeout=args.code_timeout,
+        retries=args.retries,
+    )
+    try:
+        asyncio.run(provisioner.run(args.count, retry_failed=args.retry_failed))
+    finally:
+        credential_store.close()
+        provisioner.write_results(args.output)
+        print(f"Results saved to {args.output}")
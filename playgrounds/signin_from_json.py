@@ -5,13 +5,18 @@ Author: oaslananka
 GitHub: https://github.com/oaslananka
 """
 
-import time
+import os
+import sys
 import threading
 from email_listener import EmailListener
 from auth_client import AuthClient
 import json
 import jwt
 
+# The credential store is shared with the load test in src/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.utils.credential_store import CredentialStore  # noqa: E402
+
 
 def decode_jwt(encoded_jwt, secret_key=None):
     """
@@ -51,7 +56,7 @@ def extract_local_part(email):
     return email.split('@')[0]
 
 
-def process_email(email, auth_client, email_listener, results):
+def process_email(email, auth_client, email_listener, results, credential_store=None):
     """
     Processes email for signup, verification, and signin.
 
@@ -60,6 +65,7 @@ def process_email(email, auth_client, email_listener, results):
         auth_client (AuthClient): The authentication client.
         email_listener (EmailListener): The email listener.
         results (dict): Dictionary to store results.
+        credential_store (CredentialStore, optional): Store receiving the tokens as soon as the user is signed in.
     """
     local_part = extract_local_part(email)
 
@@ -80,14 +86,7 @@ def process_email(email, auth_client, email_listener, results):
 
     # Verification
     email_listener.start_listening()
-    while not email_listener.verification_complete:
-        time.sleep(1)
-
-    verification_code = None
-    for verification in email_listener.verification_codes:
-        if verification['email'] == email:
-            verification_code = verification['verification_code']
-            break
+    verification_code = email_listener.wait_for_code(email)
 
     if not verification_code:
         print(f"Verification failed for {email}")
@@ -111,6 +110,8 @@ def process_email(email, auth_client, email_listener, results):
     signin_response = auth_client.signin_user(signin_data)
     if signin_response:
         print(f"Signin successful for {email}")
+        if credential_store:
+            credential_store.add(email, local_part, signin_response.access_token, signin_response.refresh_token)
         access_token_decoded = decode_jwt(signin_response.access_token)["payload"]
         refresh_token_decoded = decode_jwt(signin_response.refresh_token)["payload"]
         results[email] = {
@@ -138,14 +139,16 @@ if __name__ == "__main__":
         print("\nEmail Address: " + email_address)
 
     results = {}
+    credential_store = CredentialStore("credentials.db", batch_size=1)
     threads = []
     for email in email_addresses:
-        t = threading.Thread(target=process_email, args=(email, auth_client, email_listener, results))
+        t = threading.Thread(target=process_email, args=(email, auth_client, email_listener, results, credential_store))
         threads.append(t)
         t.start()
 
     for t in threads:
         t.join()
+    credential_store.close()
 
     with open("signedup_succesfully_users.json", "w") as file:
         json.dump(results, file, indent=4)
@@ -0,0 +1,64 @@
+"""
+Module: accounts
+Description: Signs gRPC users in with a test account or a token from the credential store.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import logging
+
+from locust import events
+
+from src.clients.messages_client import Messages
+from src.utils.credential_store import get_stored_credential, token_subject
+from src.utils.utils import get_user
+
+
+@events.init_command_line_parser.add_listener
+def on_init_command_line_parser(parser, **kwargs):
+    """
+    Adds the credential store options to Locust so they can be set from task.config.
+    """
+    parser.add_argument(
+        "--credential-store",
+        type=str,
+        default="",
+        help="Credential store written by playgrounds/provision_users.py, users take a stored token instead of signing in",
+    )
+    parser.add_argument(
+        "--min-token-validity",
+        type=float,
+        default=30,
+        help="Minutes a stored access token must still be valid to be used",
+    )
+
+
+def sign_in(user):
+    """
+    Signs a user in and attaches the access token to all of its clients.
+
+    With a credential store, a stored access token is used and no SignInUser
+    call is made.
+
+    Args:
+        user (GrpcUser): The user to sign in.
+
+    Returns:
+        tuple: (email, password, account ID) of the signed in account.
+    """
+    options = user.environment.parsed_options
+    if options and options.credential_store:
+        credential = get_stored_credential(options.credential_store, options.min_token_validity)
+        user.identify(credential.email)
+        user.set_access_token(credential.access_token)
+        logging.info('Using the stored token of %s', credential.email)
+        return credential.email, credential.password, credential.user_id
+
+    email, password = get_user()
+    user.identify(email)
+
+    credentials = Messages.sign_in_user(email=email, password=password)
+    res = user.client["authClient"].sign_in_user(credentials=credentials)
+    user.set_access_token(res.access_token)
+    logging.info('Login with %s email and %s password', email, password)
+    return email, password, token_subject(res.access_token)
@@ -0,0 +1,90 @@
+"""
+Module: channel_options
+Description: Loads named gRPC channel option profiles from the config directory.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import configparser
+import os
+
+from locust import events
+from locust.exception import LocustError
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+CHANNEL_PROFILES_PATH = os.path.join(ROOT_DIR, "config", "channel_profiles.config")
+DEFAULT_CHANNEL_PROFILE = "default"
+
+_profiles_cache = {}
+
+
+def _parse_value(value: str):
+    """
+    Converts a config value to an int when possible, channel arguments are mostly integers.
+
+    Args:
+        value (str): Raw config value.
+
+    Returns:
+        int | str: The parsed value.
+    """
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def load_channel_profiles(path: str = CHANNEL_PROFILES_PATH):
+    """
+    Loads all channel option profiles from a config file.
+
+    Args:
+        path (str, optional): Path of the profiles config file.
+
+    Returns:
+        dict: Profile name mapped to a list of (option, value) tuples.
+    """
+    if path in _profiles_cache:
+        return _profiles_cache[path]
+
+    parser = configparser.ConfigParser()
+    if not parser.read(path):
+        raise LocustError(f"Channel profiles file {path} could not be read.")
+
+    profiles = {
+        section: [(option, _parse_value(value)) for option, value in parser.items(section)]
+        for section in parser.sections()
+    }
+    _profiles_cache[path] = profiles
+    return profiles
+
+
+def get_channel_options(profile: str = None, path: str = CHANNEL_PROFILES_PATH):
+    """
+    Returns the channel options of a named profile.
+
+    Args:
+        profile (str, optional): Profile name, the default profile when empty.
+        path (str, optional): Path of the profiles config file.
+
+    Returns:
+        list: List of (option, value) tuples to pass to grpc channel constructors.
+    """
+    profiles = load_channel_profiles(path)
+    profile = profile or DEFAULT_CHANNEL_PROFILE
+    if profile not in profiles:
+        raise LocustError(f"Unknown channel profile {profile}, available profiles: {', '.join(profiles)}.")
+    return list(profiles[profile])
+
+
+@events.init_command_line_parser.add_listener
+def on_init_command_line_parser(parser, **kwargs):
+    """
+    Adds the channel-profile option to Locust so it can be set from task.config.
+    """
+    parser.add_argument(
+        "--channel-profile",
+        type=str,
+        default=DEFAULT_CHANNEL_PROFILE,
+        help="Name of the gRPC channel option profile from config/channel_profiles.config",
+    )
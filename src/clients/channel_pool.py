@@ -0,0 +1,272 @@
+"""
+Module: channel_pool
+Description: Creates plaintext or TLS gRPC channels and shares them between Locust users.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import threading
+import time
+
+import gevent
+import grpc
+from locust import events
+
+from src.clients.channel_options import get_channel_options
+
+
+def _read_file(path: str):
+    """
+    Reads a certificate or key file.
+
+    Args:
+        path (str): Path of the file, may be empty.
+
+    Returns:
+        bytes: File content, None when no path is given.
+    """
+    if not path:
+        return None
+    with open(path, "rb") as file:
+        return file.read()
+
+
+class ChannelPool:
+    """
+    Creates gRPC channels for Locust users and shares them per host.
+
+    With channels-per-host set to 0 every user gets a channel of its own, as before.
+    Otherwise users of the same host and channel profile are spread round-robin over
+    at most that many channels, so TLS handshakes are paid once per channel instead
+    of once per user. The time from channel creation to READY is reported to Locust
+    as a "connect" request, which makes connection storms visible during ramp-up.
+    """
+
+    def __init__(self, environment):
+        self.environment = environment
+        options = environment.parsed_options
+        self.tls = getattr(options, "tls", False)
+        self.tls_server_name = getattr(options, "tls_server_name", None)
+        self.channels_per_host = getattr(options, "channels_per_host", 0) or 0
+        self.connect_timeout = getattr(options, "connect_timeout", 10.0)
+        self.credentials = None
+        if self.tls:
+            self.credentials = grpc.ssl_channel_credentials(
+                root_certificates=_read_file(getattr(options, "tls_root_certs", None)),
+                private_key=_read_file(getattr(options, "tls_client_key", None)),
+                certificate_chain=_read_file(getattr(options, "tls_client_cert", None)),
+            )
+        self._slots = {}
+        self._next_slot = {}
+        self._refcounts = {}
+        self._warm = {}
+        self._states = {}
+        self._labels = {}
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_environment(cls, environment):
+        """
+        Returns the pool of an environment, creating it on first use.
+
+        Args:
+            environment: The Locust environment.
+
+        Returns:
+            ChannelPool: The pool shared by all users of the environment.
+        """
+        pool = getattr(environment, "channel_pool", None)
+        if pool is None:
+            pool = environment.channel_pool = cls(environment)
+        return pool
+
+    def open_channel(self, host: str, profile: str = None, measure: bool = True):
+        """
+        Opens a new channel and records how long it takes to become ready in the background.
+
+        Args:
+            host (str): Target host.
+            profile (str, optional): Channel option profile name.
+            measure (bool, optional): Start the connect measurement.
+
+        Returns:
+            grpc.Channel: The new channel.
+        """
+        options = get_channel_options(profile)
+        if self.tls:
+            if self.tls_server_name:
+                options.append(("grpc.ssl_target_name_override", self.tls_server_name))
+            channel = grpc.secure_channel(host, self.credentials, options=options)
+        else:
+            channel = grpc.insecure_channel(host, options=options)
+        self._opened += 1
+        self._labels[channel] = f"{host}#{self._opened}"
+        self._watch_state(channel)
+        if measure:
+            gevent.spawn(self._measure_connect, channel, host)
+        return channel
+
+    def _watch_state(self, channel):
+        """
+        Keeps track of the connectivity state of a channel.
+
+        Args:
+            channel (grpc.Channel): The channel to watch.
+        """
+        def on_state_change(state):
+            if channel in self._states:
+                self._states[channel] = (state, on_state_change)
+
+        self._states[channel] = (grpc.ChannelConnectivity.IDLE, on_state_change)
+        channel.subscribe(on_state_change)
+
+    def label(self, channel):
+        """
+        Returns the name of a channel in reports, the host and the channel's number.
+
+        Args:
+            channel (grpc.Channel): A channel opened by the pool.
+
+        Returns:
+            str: The label, e.g. "vacancies.cyrextech.net:7823#3".
+        """
+        return self._labels.get(channel, "")
+
+    def state_counts(self):
+        """
+        Counts the open channels per connectivity state.
+
+        Returns:
+            dict: Lowercase state name, e.g. "ready", mapped to the number of channels.
+        """
+        counts = {}
+        for state, _ in list(self._states.values()):
+            name = state.name.lower()
+            counts[name] = counts.get(name, 0) + 1
+        return counts
+
+    def prewarm(self, host: str, profile: str = None, count: int = 1):
+        """
+        Opens channels ahead of the users and waits until all of them are connected.
+
+        Shared channels fill the per-host slots, otherwise the channels are handed
+        to the first users that acquire a channel for the host.
+
+        Args:
+            host (str): Target host.
+            profile (str, optional): Channel option profile name.
+            count (int, optional): Number of channels to open.
+        """
+        key = (host, profile)
+        with self._lock:
+            if self.channels_per_host > 0:
+                slots = self._slots.setdefault(key, [])
+                count = min(count, self.channels_per_host - len(slots))
+            else:
+                slots = self._warm.setdefault(key, [])
+            channels = [self.open_channel(host, profile, measure=False) for _ in range(max(count, 0))]
+            gevent.joinall([gevent.spawn(self._measure_connect, channel, host) for channel in channels])
+            slots.extend(channels)
+
+    def _measure_connect(self, channel, host: str):
+        """
+        Waits for a channel to connect and reports the connection setup time.
+
+        Args:
+            channel (grpc.Channel): The channel to wait for.
+            host (str): Target host, used as request name.
+        """
+        exception = None
+        status_code = "OK"
+        start_perf_counter = time.perf_counter()
+        try:
+            grpc.channel_ready_future(channel).result(timeout=self.connect_timeout)
+        except grpc.FutureTimeoutError as e:
+            exception = e
+            status_code = "DEADLINE_EXCEEDED"
+        except grpc.FutureCancelledError:
+            # The channel was released before it ever connected
+            return
+
+        self.environment.events.request.fire(
+            request_type="connect",
+            name=f"{'tls' if self.tls else 'plaintext'}://{host}",
+            response_time=(time.perf_counter() - start_perf_counter) * 1000,
+            response_length=0,
+            response=None,
+            context=None,
+            exception=exception,
+            status_code=status_code,
+        )
+
+    def acquire(self, host: str, profile: str = None):
+        """
+        Returns a channel for a user, opening one if needed.
+
+        Args:
+            host (str): Target host.
+            profile (str, optional): Channel option profile name.
+
+        Returns:
+            grpc.Channel: The channel, to be handed back with release().
+        """
+        key = (host, profile)
+        if self.channels_per_host <= 0:
+            warm = self._warm.get(key)
+            channel = warm.pop() if warm else self.open_channel(host, profile)
+            self._refcounts[channel] = 1
+            return channel
+
+        with self._lock:
+            slots = self._slots.setdefault(key, [])
+            if len(slots) < self.channels_per_host:
+                channel = self.open_channel(host, profile)
+                slots.append(channel)
+            else:
+                index = self._next_slot.get(key, 0)
+                self._next_slot[key] = index + 1
+                channel = slots[index % len(slots)]
+            self._refcounts[channel] = self._refcounts.get(channel, 0) + 1
+        return channel
+
+    def release(self, channel):
+        """
+        Hands back a channel, closing it when no user holds it anymore.
+
+        Args:
+            channel (grpc.Channel): A channel returned by acquire().
+        """
+        with self._lock:
+            count = self._refcounts.get(channel, 1) - 1
+            if count > 0:
+                self._refcounts[channel] = count
+                return
+            self._refcounts.pop(channel, None)
+            for slots in self._slots.values():
+                if channel in slots:
+                    slots.remove(channel)
+        self._labels.pop(channel, None)
+        watched = self._states.pop(channel, None)
+        if watched is not None:
+            channel.unsubscribe(watched[1])
+        channel.close()
+
+
+@events.init_command_line_parser.add_listener
+def on_init_command_line_parser(parser, **kwargs):
+    """
+    Adds the TLS and channel sharing options to Locust so they can be set from task.config.
+    """
+    parser.add_argument("--tls", action="store_true", default=False, help="Use TLS channels")
+    parser.add_argument("--tls-root-certs", type=str, default="", help="PEM file with the root certificates, system roots when empty")
+    parser.add_argument("--tls-client-cert", type=str, default="", help="PEM file with the client certificate chain for mutual TLS")
+    parser.add_argument("--tls-client-key", type=str, default="", help="PEM file with the client private key for mutual TLS", include_in_web_ui=False)
+    parser.add_argument("--tls-server-name", type=str, default="", help="Overrides the server name used for TLS verification")
+    parser.add_argument(
+        "--channels-per-host",
+        type=int,
+        default=0,
+        help="Number of channels shared by all users of a host, 0 opens one channel per user",
+    )
+    parser.add_argument("--connect-timeout", type=float, default=10.0, help="Seconds to wait for a new channel to connect")
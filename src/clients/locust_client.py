@@ -5,104 +5,500 @@ Author: oaslananka
 GitHub: https://github.com/oaslananka
 """
 
+import gevent
 import grpc
 import grpc.experimental.gevent as grpc_gevent
+import itertools
+import logging
+import random
 import time
 
-from grpc_interceptor import ClientInterceptor
-from locust import HttpUser, User
+from locust import HttpUser, User, events
 from locust.exception import LocustError
-from typing import Any, Callable
+
+from src.clients import ramp_control  # noqa: F401  registers the ramp-up control options and listeners
+from src.clients.channel_pool import ChannelPool
+from src.clients.tracing import Tracer
+from src.stats import generator_health  # noqa: F401  registers the load generator health monitor
+from src.stats.prometheus_exporter import GrpcMetrics
 
 grpc_gevent.init_gevent()
 
+OK = grpc.StatusCode.OK
+CANCELLED = grpc.StatusCode.CANCELLED
+UNKNOWN = grpc.StatusCode.UNKNOWN
+STATUS_NAMES = {code: code.name for code in grpc.StatusCode}
+
+
+class RequestEventBatch:
+    """
+    Collects request events and fires them in batches.
+
+    A call then only appends its event, the listeners run for size events at
+    a time or every interval seconds, whichever comes first. The listeners
+    cost the same in total, but they run off the calls' path and back to back,
+    which keeps their code and data warm. Stats lag behind by up to interval
+    seconds, the batch is flushed when the test stops. Listeners that put
+    calls into seconds take them from the start_time of the event.
+    """
+
+    def __init__(self, request_event, size: int, interval: float):
+        self.request_event = request_event
+        self.size = size
+        self.interval = interval
+        self.events = []
+        self._flusher = gevent.spawn(self._run)
+
+    def add(self, **kwargs):
+        """
+        Adds a request event, firing the batch when it is full.
+        """
+        self.events.append(kwargs)
+        if len(self.events) >= self.size:
+            self.flush()
+
+    def _run(self):
+        while True:
+            gevent.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        """
+        Fires the collected events.
+        """
+        batch, self.events = self.events, []
+        fire = self.request_event.fire
+        for kwargs in batch:
+            try:
+                fire(**kwargs)
+            except Exception:
+                # Keeps the rest of the batch and the periodic flush going
+                logging.exception("Firing a batched request event failed")
+
+    def close(self):
+        """
+        Stops the periodic flush and fires the remaining events.
+        """
+        self._flusher.kill()
+        self.flush()
+
+    @classmethod
+    def for_environment(cls, environment):
+        """
+        Returns the batch of an environment, creating it on first use.
+
+        Args:
+            environment: The Locust environment.
+
+        Returns:
+            RequestEventBatch: The batch shared by all users, None when events are fired one by one.
+        """
+        batch = getattr(environment, "request_event_batch", None)
+        if batch is None:
+            options = environment.parsed_options
+            size = getattr(options, "event_batch_size", 1) if options else 1
+            if size <= 1:
+                return None
+            batch = environment.request_event_batch = cls(environment.events.request, size, options.event_flush_interval)
+        return batch
+
+
+class ReceivedStream:
+    """
+    A server stream the interceptor has read to the end, iterated again by the caller.
+
+    Other attributes, such as code() and details(), come from the call. A stream
+    that failed raises its error after the messages received before it.
+    """
+
+    def __init__(self, call, messages: list, error: grpc.RpcError = None):
+        self._call = call
+        self._count = len(messages)
+        self._messages = iter(messages)
+        self._error = error
+
+    def __repr__(self):
+        status_code = self._error.code() if self._error is not None else OK
+        return f"<ReceivedStream of {self._count} messages, {status_code}>"
 
-class LocustInterceptor(ClientInterceptor):
+    def __iter__(self):
+        # Without an error the caller iterates the messages directly
+        return self._messages if self._error is None else self
+
+    def __next__(self):
+        try:
+            return next(self._messages)
+        except StopIteration:
+            if self._error is not None:
+                error, self._error = self._error, None
+                raise error
+            raise
+
+    def __getattr__(self, name: str):
+        return getattr(self._call, name)
+
+
+class LocustInterceptor(grpc.UnaryUnaryClientInterceptor, grpc.UnaryStreamClientInterceptor):
     """
     Intercepts gRPC calls to measure performance metrics.
+
+    Unary and server streaming calls have their own entry points, so neither
+    has to find out what kind of call it got. The metrics of every method are
+    looked up once and kept by method name.
     """
 
-    def __init__(self, environment, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def __init__(self, environment, context: dict = None):
         self.env = environment
+        self.context = context if context is not None else {}
+        self.metrics = GrpcMetrics.for_environment(environment)
+        self.tracer = Tracer.for_environment(environment)
+        batch = RequestEventBatch.for_environment(environment)
+        self._fire = batch.add if batch is not None else environment.events.request.fire
+        self._methods = {}
+
+    def _start(self, call_details: grpc.ClientCallDetails):
+        method = self._methods.get(call_details.method)
+        if method is None:
+            method = self._methods[call_details.method] = self.metrics.method(call_details.method)
+        span = None
+        if self.tracer is not None:
+            call_details, span = self.tracer.start(call_details)
+        method.in_flight += 1
+        return method, call_details, span
+
+    def _finish(self, method, span, start_time: float, start_perf_counter: float, request, request_length: int,
+                response, response_length: int, status_code: grpc.StatusCode, exception):
+        response_time = time.perf_counter() - start_perf_counter
+        status_name = STATUS_NAMES.get(status_code, "UNKNOWN")
+        method.finished(status_name, response_time)
+        trace_id = None
+        if span is not None:
+            self.tracer.end(span, method.method, status_name, response_time * 1000)
+            trace_id = span.trace_id
+        self._fire(
+            request_type="grpc",
+            name=method.method,
+            response_time=response_time * 1000,
+            response_length=response_length,
+            request_length=request_length,
+            response=response,
+            # A copy, identify() must not change the events of earlier calls
+            context=dict(self.context),
+            start_time=start_time,
+            request=request,
+            exception=exception,
+            status_code=status_name,
+            trace_id=trace_id,
+        )
+
+    @staticmethod
+    def _failure_status(exception: BaseException):
+        # Users killed while waiting for a call, e.g. on stop or ramp-down, cancel it
+        if isinstance(exception, (gevent.GreenletExit, gevent.Timeout)):
+            return CANCELLED
+        return UNKNOWN
 
-    def intercept(
-        self,
-        method: Callable,
-        request_or_iterator: Any,
-        call_details: grpc.ClientCallDetails,
-    ):
+    def intercept_unary_unary(self, continuation, call_details: grpc.ClientCallDetails, request):
         """
-        Intercepts gRPC calls to measure performance metrics.
+        Measures a unary call.
 
         Args:
-            method (Callable): The gRPC method to call.
-            request_or_iterator (Any): The request or iterator for the call.
-            call_details (grpc.ClientCallDetails): The details of the gRPC call.
+            continuation (Callable): Makes the call.
+            call_details (grpc.ClientCallDetails): The details of the call.
+            request: The request message, or its serialized bytes for replayed calls.
 
         Returns:
-            response: The response from the gRPC call.
+            The call outcome.
         """
+        method, call_details, span = self._start(call_details)
+        request_length = 0
         response = None
+        response_length = 0
         exception = None
+        status_code = OK
+        start_time = time.time()
         start_perf_counter = time.perf_counter()
-        response_length = 0
         try:
-            response = method(request_or_iterator, call_details)
-            try:
-                response_length = len(list(response))
-            except:
-                pass
-            try:
-                response_length = response.result().ByteSize()
-            except:
-                pass
+            # Replayed calls send serialized bytes
+            request_length = len(request) if type(request) is bytes else request.ByteSize()
+            start_perf_counter = time.perf_counter()
+            response = continuation(call_details, request)
+            status_code = response.code()
+            if status_code is OK:
+                result = response.result()
+                response_length = len(result) if type(result) is bytes else result.ByteSize()
+            else:
+                # Unary failures come back as an outcome object instead of being raised
+                exception = response
         except grpc.RpcError as e:
             exception = e
+            status_code = e.code()
+        except BaseException as e:
+            exception = e
+            status_code = self._failure_status(e)
+            raise
+        finally:
+            self._finish(method, span, start_time, start_perf_counter, request, request_length, response,
+                         response_length, status_code, exception)
+        return response
 
-        self.env.events.request.fire(
-            request_type="grpc",
-            name=call_details.method,
-            response_time=(time.perf_counter() - start_perf_counter) * 1000,
-            response_length=response_length,
-            response=response,
-            context=None,
-            exception=exception,
-        )
+    def intercept_unary_stream(self, continuation, call_details: grpc.ClientCallDetails, request):
+        """
+        Measures a server streaming call until its last message.
+
+        Args:
+            continuation (Callable): Makes the call.
+            call_details (grpc.ClientCallDetails): The details of the call.
+            request: The request message, or its serialized bytes for replayed calls.
+
+        Returns:
+            ReceivedStream: The received messages.
+        """
+        method, call_details, span = self._start(call_details)
+        request_length = 0
+        call = None
+        messages = []
+        response = None
+        response_length = 0
+        exception = None
+        status_code = OK
+        start_time = time.time()
+        start_perf_counter = time.perf_counter()
+        try:
+            request_length = len(request) if type(request) is bytes else request.ByteSize()
+            start_perf_counter = time.perf_counter()
+            call = continuation(call_details, request)
+            # Keeps the messages received before an error
+            messages.extend(call)
+            status_code = call.code()
+            response = ReceivedStream(call, messages)
+        except grpc.RpcError as e:
+            exception = e
+            status_code = e.code()
+            response = ReceivedStream(call if call is not None else e, messages, e)
+        except BaseException as e:
+            exception = e
+            status_code = self._failure_status(e)
+            raise
+        finally:
+            if messages:
+                # Replayed calls receive serialized bytes, all messages of a stream have the same type
+                response_length = sum(map(len if type(messages[0]) is bytes else type(messages[0]).ByteSize, messages))
+            self._finish(method, span, start_time, start_perf_counter, request, request_length, response,
+                         response_length, status_code, exception)
         return response
 
 
+@events.init_command_line_parser.add_listener
+def on_init_command_line_parser(parser, **kwargs):
+    """
+    Adds the service host and request event options to Locust so they can be set from task.config.
+    """
+    parser.add_argument(
+        "--service-hosts",
+        type=str,
+        default="",
+        help="Comma separated client=host:port pairs for services that are not on the host, e.g. userClient=users:7823",
+    )
+    parser.add_argument(
+        "--event-batch-size",
+        type=int,
+        default=1,
+        help="Request events collected before the listeners run, 1 fires every event right away",
+    )
+    parser.add_argument(
+        "--event-flush-interval",
+        type=float,
+        default=1.0,
+        help="Seconds after which collected request events are fired at the latest",
+    )
+
+
+@events.test_stop.add_listener
+def on_test_stop(environment, **kwargs):
+    """
+    Fires the request events still collected when the test stops.
+    """
+    batch = getattr(environment, "request_event_batch", None)
+    if batch is not None:
+        batch.flush()
+
+
+@events.quitting.add_listener
+def on_quitting(environment, **kwargs):
+    """
+    Stops the request event batch when Locust stops.
+    """
+    batch = getattr(environment, "request_event_batch", None)
+    if batch is not None:
+        batch.close()
+
+
+def parse_service_hosts(spec: str):
+    """
+    Parses a service host list, e.g. "userClient=users.example.com:7823,authClient=auth.example.com:7823".
+
+    Args:
+        spec (str): Comma separated client name and host pairs.
+
+    Returns:
+        dict: Client names mapped to hosts.
+    """
+    hosts = {}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        name, separator, host = item.partition("=")
+        if not separator or not name.strip() or not host.strip():
+            raise LocustError(f"Invalid service host {item!r}, expected name=host:port")
+        hosts[name.strip()] = host.strip()
+    return hosts
+
+
 class GrpcUser(HttpUser):
     """
     Abstract user class for Locust performance testing with gRPC.
+
+    The service clients are listed in service_clients by the name they get in
+    self.client. A value is a client class, or a (client class, host) tuple for
+    a service that is not on the user's host. The --service-hosts option
+    overrides the host of any client. All clients on the same host share one
+    pooled channel. Without service_clients, the user gets the authClient and
+    vacancyClient of auth_service_stub_class and vacancy_service_stub_class.
     """
     abstract = True
+    service_clients = None
     vacancy_service_stub_class = None
     auth_service_stub_class = None
+    channel_profile = None
+    _user_numbers = itertools.count(1)
 
     def __init__(self, environment):
         super().__init__(environment)
-        for attr_value, attr_name in ((self.host, "host"), (self.vacancy_service_stub_class, "vacancy_service_stub_class"),  (self.auth_service_stub_class, "auth_service_stub_class")):
-            if attr_value is None:
-                raise LocustError(f"You must specify the {attr_name}.")
-
-        self._channel = grpc.insecure_channel(self.host)
+        self._services = self.resolve_services(environment)
+        self._channel_pool = ChannelPool.for_environment(environment)
+        self._pooled_channels = {}
         self._channel_closed = False
-        interceptor = LocustInterceptor(environment=environment)
-        self._channel = grpc.intercept_channel(self._channel, interceptor)
-        self.client = {
-            "authClient": self.auth_service_stub_class(self._channel),
-            "vacancyClient": self.vacancy_service_stub_class(self._channel),
-        }
+        self.client = {}
+        self.user_id = f"{type(self).__name__}-{next(GrpcUser._user_numbers)}"
+        self._context = {"user_id": self.user_id, "channel": ""}
+        self._contexts = [self._context]
+
+    @classmethod
+    def resolve_services(cls, environment):
+        """
+        Resolves the service clients of the user class to their client classes and hosts.
+
+        Args:
+            environment: The Locust environment.
+
+        Returns:
+            dict: Client names mapped to (client class, host) tuples.
+        """
+        service_clients = cls.service_clients
+        if service_clients is None:
+            for attr_value, attr_name in ((cls.vacancy_service_stub_class, "vacancy_service_stub_class"), (cls.auth_service_stub_class, "auth_service_stub_class")):
+                if attr_value is None:
+                    raise LocustError(f"You must specify the {attr_name}.")
+            service_clients = {"authClient": cls.auth_service_stub_class, "vacancyClient": cls.vacancy_service_stub_class}
+
+        host_overrides = parse_service_hosts(getattr(environment.parsed_options, "service_hosts", ""))
+        services = {}
+        for name, spec in service_clients.items():
+            client_class, host = spec if isinstance(spec, tuple) else (spec, None)
+            host = host_overrides.get(name) or host or environment.host or cls.host
+            if host is None:
+                raise LocustError("You must specify the host.")
+            services[name] = (client_class, host)
+        return services
+
+    def _open_channel(self):
+        """
+        Acquires a channel per host from the pool and builds the service clients on them.
+
+        Calls on the first host carry the user's context, calls on the other
+        hosts a copy of it naming their own channel.
+        """
+        channel_profile = self.channel_profile or getattr(self.environment.parsed_options, "channel_profile", None)
+        channels = {}
+        self.client = {}
+        for name, (client_class, host) in self._services.items():
+            channel = channels.get(host)
+            if channel is None:
+                pooled_channel = self._pooled_channels[host] = self._channel_pool.acquire(host, channel_profile)
+                if channels:
+                    context = {"user_id": self.user_id}
+                    self._contexts.append(context)
+                else:
+                    context = self._context
+                context["channel"] = self._channel_pool.label(pooled_channel)
+                interceptor = LocustInterceptor(environment=self.environment, context=context)
+                channel = channels[host] = grpc.intercept_channel(pooled_channel, interceptor)
+            self.client[name] = client_class(channel)
+
+    def pooled_channel(self, name: str):
+        """
+        Returns the pooled channel a service client runs on, without the interceptor.
+
+        Args:
+            name (str): Client name, e.g. "vacancyClient".
+
+        Returns:
+            grpc.Channel: The channel, None before the user started.
+        """
+        return self._pooled_channels.get(self._services[name][1])
+
+    def run(self):
+        """
+        Runs the user, first waiting a random spawn jitter so connects and sign-ins are spread out.
+        """
+        spawn_jitter = getattr(self.environment.parsed_options, "spawn_jitter", 0)
+        if spawn_jitter:
+            gevent.sleep(random.uniform(0, spawn_jitter))
+        self._open_channel()
+        super().run()
+
+    def context(self):
+        """
+        Returns the context passed with every request event of this user.
+
+        Returns:
+            dict: The user ID and the label of the user's channel on its first host.
+        """
+        return self._context
+
+    def identify(self, user_id: str):
+        """
+        Names the user in reports, e.g. by the account it signed in with.
+
+        Args:
+            user_id (str): The new user ID, an empty ID keeps the current one.
+        """
+        if user_id:
+            self.user_id = user_id
+            for context in self._contexts:
+                context["user_id"] = user_id
+
+    def set_access_token(self, access_token: str):
+        """
+        Attaches a JWT access token to every call made by this user's clients.
+
+        Args:
+            access_token (str): Access token returned by SignInUser.
+        """
+        for client in self.client.values():
+            client.set_access_token(access_token)
 
     def stop(self, force=False):
         """
-        Stops the gRPC user and closes the channel.
+        Stops the gRPC user and hands its channels back to the pool.
 
         Args:
             force (bool): Force stop the user.
         """
         self._channel_closed = True
         time.sleep(1)
-        self._channel.close()
+        for pooled_channel in self._pooled_channels.values():
+            self._channel_pool.release(pooled_channel)
+        self._pooled_channels = {}
         super().stop(force=True)
@@ -5,9 +5,12 @@ Author: oaslananka
 GitHub: https://github.com/oaslananka
 """
 
+import src.protos.auth_service_pb2 as auth_service
 import src.protos.rpc_create_vacancy_pb2 as rpc_create_vacancy
 import src.protos.rpc_signin_user_pb2 as rpc_signin_user
+import src.protos.rpc_signup_user_pb2 as rpc_signup_user
 import src.protos.rpc_update_vacancy_pb2 as rpc_update_vacancy
+import src.protos.user_service_pb2 as user_service
 import src.protos.vacancy_service_pb2 as vacancy_service
 
 
@@ -32,6 +35,56 @@ class Messages:
             password=password
         )
 
+    @classmethod
+    def sign_up_user(cls, name: str, email: str, password: str):
+        """
+        Creates a sign-up user request message.
+
+        Args:
+            name (str): User name.
+            email (str): User email.
+            password (str): User password, also sent as the confirmation.
+
+        Returns:
+            rpc_signup_user.SignUpUserInput: The sign-up user request message.
+        """
+        return rpc_signup_user.SignUpUserInput(
+            name=name,
+            email=email,
+            password=password,
+            passwordConfirm=password
+        )
+
+    @classmethod
+    def verify_email(cls, verification_code: str):
+        """
+        Creates a verify email request message.
+
+        Args:
+            verification_code (str): Verification code from the sign-up email.
+
+        Returns:
+            auth_service.VerifyEmailRequest: The verify email request message.
+        """
+        return auth_service.VerifyEmailRequest(
+            verificationCode=verification_code
+        )
+
+    @classmethod
+    def get_me(cls, id: str):
+        """
+        Creates a get me request message.
+
+        Args:
+            id (str): ID of the signed in user, the sub claim of its access token.
+
+        Returns:
+            user_service.GetMeRequest: The get me request message.
+        """
+        return user_service.GetMeRequest(
+            Id=id
+        )
+
     @classmethod
     def create_vacancy(cls, country: str, description: str, division: int, title: str):
         """
@@ -0,0 +1,162 @@
+"""
+Module: payload_sizes
+Description: Draws the sizes of the vacancy string fields from fixed, uniform, lognormal or captured distributions.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import math
+import random
+import string
+from functools import lru_cache
+
+from locust import events
+from locust.exception import LocustError
+
+from src.replay.capture import METHODS, iter_capture
+
+# Request field of the vacancy messages, per payload field option
+PAYLOAD_FIELDS = {"title": "Title", "description": "Description", "country": "Country"}
+VACANCY_WRITE_METHODS = ("/pb.VacancyService/CreateVacancy", "/pb.VacancyService/UpdateVacancy")
+TEXT_POOL_SIZE = 1 << 16
+
+
+@lru_cache(maxsize=None)
+def read_capture_field_sizes(path: str):
+    """
+    Collects the sizes of the vacancy string fields sent in a capture, once per process.
+
+    Args:
+        path (str): Capture file recorded by src/tools/recording_proxy.py.
+
+    Returns:
+        dict: Request field name mapped to the list of its non-empty sizes in characters.
+    """
+    sizes = {field: [] for field in PAYLOAD_FIELDS.values()}
+    for record in iter_capture(path):
+        if record.method not in VACANCY_WRITE_METHODS:
+            continue
+        request = METHODS[record.method].request_class.FromString(record.request)
+        for field, values in sizes.items():
+            value = getattr(request, field)
+            if value:
+                values.append(len(value))
+    return sizes
+
+
+class SizeDistribution:
+    """
+    Draws payload sizes in characters, parsed from a spec:
+
+    - "fixed:8"
+    - "uniform:8-200"
+    - "lognormal:median=400,sigma=0.8,max=8000"
+    - "empirical:capture.bin", resamples the sizes the field had in a capture
+    """
+
+    def __init__(self, spec: str, field: str):
+        kind, _, arguments = spec.partition(":")
+        self.spec = spec
+        self.sizes = None
+        try:
+            if kind == "fixed":
+                self.low = self.high = int(arguments)
+            elif kind == "uniform":
+                low, _, high = arguments.partition("-")
+                self.low, self.high = int(low), int(high or low)
+            elif kind == "lognormal":
+                parameters = dict(item.strip().split("=") for item in arguments.split(","))
+                self.mu = math.log(float(parameters["median"]))
+                self.sigma = float(parameters.get("sigma", 1.0))
+                self.high = int(parameters.get("max", 1 << 20))
+            elif kind == "empirical":
+                self.sizes = read_capture_field_sizes(arguments)[field]
+                if not self.sizes:
+                    raise LocustError(f"The capture {arguments} has no {field} values to take sizes from")
+            else:
+                raise ValueError(f"unknown distribution {kind!r}")
+        except (ValueError, KeyError) as e:
+            raise LocustError(f"Invalid payload size spec {spec!r}: {e}")
+        self.kind = kind
+
+    def draw(self, rng: random.Random):
+        """
+        Draws one size.
+
+        Args:
+            rng (random.Random): Random number generator.
+
+        Returns:
+            int: Size in characters.
+        """
+        if self.kind == "fixed":
+            return self.low
+        if self.kind == "uniform":
+            return rng.randint(self.low, self.high)
+        if self.kind == "lognormal":
+            return max(1, min(self.high, int(rng.lognormvariate(self.mu, self.sigma))))
+        return self.sizes[int(rng.random() * len(self.sizes))]
+
+
+class PayloadGenerator:
+    """
+    Builds random field values with the configured size distributions.
+
+    Values are slices of one random text, so a large description costs no more
+    to build than a short one.
+    """
+
+    def __init__(self, specs: dict, seed: int = None):
+        self.rng = random.Random(seed)
+        self.distributions = {name: SizeDistribution(spec, PAYLOAD_FIELDS[name]) for name, spec in specs.items()}
+        self.pool = "".join(self.rng.choice(string.ascii_lowercase) for _ in range(TEXT_POOL_SIZE))
+
+    def text(self, name: str):
+        """
+        Returns a random value for a field.
+
+        Args:
+            name (str): Field name, one of PAYLOAD_FIELDS.
+
+        Returns:
+            str: Random lowercase text of a drawn size.
+        """
+        size = self.distributions[name].draw(self.rng)
+        pool = self.pool
+        if size > len(pool):
+            pool = pool * (size // len(pool) + 1)
+        offset = int(self.rng.random() * (len(pool) - size + 1))
+        return pool[offset:offset + size]
+
+    @classmethod
+    def for_environment(cls, environment):
+        """
+        Returns the generator of an environment, creating it on first use.
+
+        Args:
+            environment: The Locust environment.
+
+        Returns:
+            PayloadGenerator: The generator shared by all users of the environment.
+        """
+        generator = getattr(environment, "payload_generator", None)
+        if generator is None:
+            options = environment.parsed_options
+            specs = {name: getattr(options, f"{name}_size", "fixed:8") for name in PAYLOAD_FIELDS}
+            generator = environment.payload_generator = cls(specs)
+        return generator
+
+
+@events.init_command_line_parser.add_listener
+def on_init_command_line_parser(parser, **kwargs):
+    """
+    Adds the payload size options to Locust so they can be set from task.config.
+    """
+    for name in PAYLOAD_FIELDS:
+        parser.add_argument(
+            f"--{name}-size",
+            type=str,
+            default="fixed:8",
+            help=f"Size distribution of the vacancy {name}: fixed:N, uniform:MIN-MAX, "
+                 "lognormal:median=M,sigma=S,max=N or empirical:CAPTURE",
+        )
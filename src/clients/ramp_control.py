@@ -0,0 +1,110 @@
+"""
+Module: ramp_control
+Description: Smooths the ramp-up of gRPC users with spawn jitter, channel pre-warming and a warm-up phase excluded from stats.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import logging
+
+import gevent
+from locust import events
+from locust.runners import MasterRunner, WorkerRunner
+
+from src.clients.channel_pool import ChannelPool
+
+
+def reset_all_stats(environment):
+    """
+    Resets Locust's and the custom stats, the same way the web UI reset button does.
+
+    Args:
+        environment: The Locust environment.
+    """
+    environment.events.reset_stats.fire()
+    if environment.runner is not None:
+        environment.runner.stats.reset_all()
+        environment.runner.exceptions = {}
+
+
+def prewarm_channels(environment, count: int):
+    """
+    Opens channels for every host of the gRPC user classes and waits until they are ready.
+
+    Args:
+        environment: The Locust environment.
+        count (int): Number of channels to open per host and channel profile.
+    """
+    # Imported here, locust_client imports this module to register the listeners
+    from src.clients.locust_client import GrpcUser
+
+    pool = ChannelPool.for_environment(environment)
+    profile_option = getattr(environment.parsed_options, "channel_profile", None)
+    targets = set()
+    for user_class in environment.user_classes:
+        if issubclass(user_class, GrpcUser):
+            for _, host in user_class.resolve_services(environment).values():
+                targets.add((host, user_class.channel_profile or profile_option))
+
+    for host, profile in targets:
+        logging.info("Pre-warming %d channels to %s", count, host)
+        pool.prewarm(host, profile, count)
+
+
+@events.init_command_line_parser.add_listener
+def on_init_command_line_parser(parser, **kwargs):
+    """
+    Adds the ramp-up control options to Locust so they can be set from task.config.
+    """
+    parser.add_argument(
+        "--spawn-jitter",
+        type=float,
+        default=0.0,
+        help="Each user waits a random 0..N seconds before on_start, spreading connects and sign-ins",
+    )
+    parser.add_argument(
+        "--prewarm-channels",
+        type=int,
+        default=0,
+        help="Channels per host opened and connected before any user starts",
+    )
+    parser.add_argument(
+        "--warmup-time",
+        type=float,
+        default=0.0,
+        help="Seconds after spawning completes whose stats are discarded",
+    )
+
+
+@events.init.add_listener
+def on_locust_init(environment, **kwargs):
+    """
+    Wires channel pre-warming and the warm-up phase to the test lifecycle.
+    """
+    environment.warmup_scheduled = False
+
+    @environment.events.test_start.add_listener
+    def on_test_start(**kwargs):
+        count = getattr(environment.parsed_options, "prewarm_channels", 0)
+        if count and not isinstance(environment.runner, MasterRunner):
+            prewarm_channels(environment, count)
+
+    @environment.events.spawning_complete.add_listener
+    def on_spawning_complete(**kwargs):
+        warmup_time = getattr(environment.parsed_options, "warmup_time", 0)
+        if not warmup_time or environment.warmup_scheduled:
+            return
+        # Set right away, spawning_complete fires again whenever the user count changes
+        environment.warmup_scheduled = True
+
+        def finish_warmup():
+            gevent.sleep(warmup_time)
+            if not isinstance(environment.runner, WorkerRunner):
+                logging.info("Warm-up of %.1fs finished, resetting stats", warmup_time)
+            reset_all_stats(environment)
+
+        gevent.spawn(finish_warmup)
+
+    @environment.events.test_stop.add_listener
+    def on_test_stop(**kwargs):
+        environment.warmup_scheduled = False
@@ -8,6 +8,7 @@ GitHub: https://github.com/oaslananka
 from abc import ABC
 
 import src.protos.auth_service_pb2_grpc as auth_service_grpc
+import src.protos.user_service_pb2_grpc as user_service_grpc
 import src.protos.vacancy_service_pb2_grpc as vacancy_service_grpc
 
 
@@ -18,6 +19,16 @@ class BaseClient(ABC):
 
     def __init__(self, channel):
         self.channel = channel
+        self.metadata = None
+
+    def set_access_token(self, access_token: str):
+        """
+        Sends the access token as bearer authorization metadata on every call.
+
+        Args:
+            access_token (str): JWT access token, None to stop sending it.
+        """
+        self.metadata = (("authorization", f"Bearer {access_token}"),) if access_token else None
 
 
 class AuthServiceClient(BaseClient):
@@ -39,7 +50,19 @@ class AuthServiceClient(BaseClient):
         Returns:
             The response from the sign-in method.
         """
-        return self.stub.SignInUser(credentials)
+        return self.stub.SignInUser(credentials, metadata=self.metadata)
+
+    def sign_up_user(self, message):
+        """
+        Signs up a user.
+
+        Args:
+            message: The sign-up user request message.
+
+        Returns:
+            The response from the sign-up method.
+        """
+        return self.stub.SignUpUser(message, metadata=self.metadata)
 
     def sign_out_user(self):
         """
@@ -47,11 +70,39 @@ class AuthServiceClient(BaseClient):
         """
         pass
 
-    def verify_email(self):
+    def verify_email(self, message):
         """
         Verifies a user's email.
+
+        Args:
+            message: The verify email request message.
+
+        Returns:
+            The response from the verify email method.
         """
-        pass
+        return self.stub.VerifyEmail(message, metadata=self.metadata)
+
+
+class UserServiceClient(BaseClient):
+    """
+    Client class for the user service.
+    """
+
+    def __init__(self, channel):
+        super().__init__(channel)
+        self.stub = user_service_grpc.UserServiceStub(self.channel)
+
+    def get_me(self, message):
+        """
+        Gets the signed in user.
+
+        Args:
+            message: The get me request message.
+
+        Returns:
+            The response from the get me method.
+        """
+        return self.stub.GetMe(message, metadata=self.metadata)
 
 
 class VacancyServiceClient(BaseClient):
@@ -73,7 +124,7 @@ class VacancyServiceClient(BaseClient):
         Returns:
             The response from the create vacancy method.
         """
-        return self.stub.CreateVacancy(message)
+        return self.stub.CreateVacancy(message, metadata=self.metadata)
 
     def get_vacancy(self, message):
         """
@@ -85,7 +136,7 @@ class VacancyServiceClient(BaseClient):
         Returns:
             The response from the get vacancy method.
         """
-        return self.stub.GetVacancy(message)
+        return self.stub.GetVacancy(message, metadata=self.metadata)
 
     def get_vacancies(self, message):
         """
@@ -97,7 +148,7 @@ class VacancyServiceClient(BaseClient):
         Returns:
             The response from the get vacancies method.
         """
-        return self.stub.GetVacancies(message)
+        return self.stub.GetVacancies(message, metadata=self.metadata)
 
     def update_vacancy(self, message):
         """
@@ -109,7 +160,7 @@ class VacancyServiceClient(BaseClient):
         Returns:
             The response from the update vacancy method.
         """
-        return self.stub.UpdateVacancy(message)
+        return self.stub.UpdateVacancy(message, metadata=self.metadata)
 
     def delete_vacancy(self, message):
         """
@@ -121,4 +172,4 @@ class VacancyServiceClient(BaseClient):
         Returns:
             The response from the delete vacancy method.
         """
-        return self.stub.DeleteVacancy(message)
+        return self.stub.DeleteVacancy(message, metadata=self.metadata)
@@ -0,0 +1,256 @@
+"""
+Module: tracing
+Description: Propagates W3C trace context on gRPC calls and exports client spans in the OTLP JSON format.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import json
+import logging
+import random
+import time
+import urllib.request
+from collections import namedtuple
+
+import gevent
+import grpc
+from locust import events
+
+Span = namedtuple("Span", ["trace_id", "span_id", "sampled", "start_ns"])
+
+
+class ClientCallDetails(
+    namedtuple("ClientCallDetails", ["method", "timeout", "metadata", "credentials", "wait_for_ready", "compression"]),
+    grpc.ClientCallDetails,
+):
+    """
+    Call details an interceptor passes on to the channel in place of the original ones.
+    """
+
+
+STATUS_VALUES_BY_NAME = {code.name: code.value[0] for code in grpc.StatusCode}
+# OpenTelemetry span kind and status codes
+SPAN_KIND_CLIENT = 3
+SPAN_STATUS_OK = 1
+SPAN_STATUS_ERROR = 2
+
+
+def _attribute(key: str, value):
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    return {"key": key, "value": {"stringValue": value}}
+
+
+class SpanExporter:
+    """
+    Buffers finished spans and exports them in batches as OTLP JSON.
+
+    The target is either a file, which gets one ExportTraceServiceRequest per
+    line like the OpenTelemetry collector's file exporter writes, or the URL of
+    an OTLP/HTTP endpoint such as http://localhost:4318/v1/traces. Batches are
+    sent from a background greenlet, so calls never wait for the export.
+    """
+
+    def __init__(self, target: str, service_name: str, batch_size: int = 512, flush_interval: float = 5.0):
+        self.target = target
+        self.is_url = target.startswith(("http://", "https://"))
+        self.file = None if self.is_url else open(target, "a")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.resource = {"attributes": [_attribute("service.name", service_name)]}
+        self.spans = []
+        self.exported = 0
+        self.failed = 0
+        self._flusher = gevent.spawn(self._run)
+
+    def add(self, span: dict):
+        """
+        Adds a finished span to the next batch.
+
+        Args:
+            span (dict): The span in OTLP JSON form.
+        """
+        self.spans.append(span)
+        if len(self.spans) >= self.batch_size:
+            gevent.spawn(self.flush)
+
+    def _run(self):
+        while True:
+            gevent.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """
+        Exports the buffered spans.
+        """
+        spans, self.spans = self.spans, []
+        if not spans:
+            return
+        body = json.dumps({
+            "resourceSpans": [{
+                "resource": self.resource,
+                "scopeSpans": [{"scope": {"name": "loadtestcyrex"}, "spans": spans}],
+            }]
+        })
+        try:
+            if self.is_url:
+                request = urllib.request.Request(
+                    self.target, data=body.encode(), headers={"Content-Type": "application/json"}, method="POST"
+                )
+                urllib.request.urlopen(request, timeout=10).close()
+            else:
+                self.file.write(body + "\n")
+                self.file.flush()
+            self.exported += len(spans)
+        except OSError as e:
+            self.failed += len(spans)
+            logging.warning("Exporting %d spans to %s failed: %s", len(spans), self.target, e)
+
+    def close(self):
+        """
+        Exports the remaining spans and closes the file.
+        """
+        self._flusher.kill()
+        self.flush()
+        if self.file:
+            self.file.close()
+        logging.info("Exported %d spans to %s, %d failed", self.exported, self.target, self.failed)
+
+
+class Tracer:
+    """
+    Adds a traceparent header to every call and exports the client spans of the sampled ones.
+
+    Every call gets a new trace, so the server trace of any call can be found
+    by its trace ID. The sampled flag tells the server which traces to keep.
+    Calls slower than slow_threshold are exported even when they were not
+    sampled, so the outliers always have a client span.
+    """
+
+    def __init__(self, sample_rate: float, exporter: SpanExporter = None, slow_threshold: float = 0):
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+        self.slow_threshold = slow_threshold
+        self.rng = random.Random()
+
+    def start(self, call_details: grpc.ClientCallDetails):
+        """
+        Starts a span and adds its trace context to the call metadata.
+
+        Args:
+            call_details (grpc.ClientCallDetails): The details of the call.
+
+        Returns:
+            tuple: The call details with the traceparent header and the started Span.
+        """
+        span = Span(
+            trace_id=f"{self.rng.getrandbits(128) or 1:032x}",
+            span_id=f"{self.rng.getrandbits(64) or 1:016x}",
+            sampled=self.rng.random() < self.sample_rate,
+            start_ns=time.time_ns(),
+        )
+        metadata = list(call_details.metadata or ())
+        metadata.append(("traceparent", f"00-{span.trace_id}-{span.span_id}-{'01' if span.sampled else '00'}"))
+        call_details = ClientCallDetails(
+            call_details.method,
+            call_details.timeout,
+            metadata,
+            call_details.credentials,
+            call_details.wait_for_ready,
+            getattr(call_details, "compression", None),
+        )
+        return call_details, span
+
+    def end(self, span: Span, method: str, status_code: str, response_time: float):
+        """
+        Finishes a span and exports it if it was sampled or slow.
+
+        Args:
+            span (Span): The span returned by start().
+            method (str): Full gRPC method name.
+            status_code (str): gRPC status code name.
+            response_time (float): Response time in milliseconds.
+        """
+        if self.exporter is None:
+            return
+        if not span.sampled and not (self.slow_threshold and response_time >= self.slow_threshold):
+            return
+        service, _, rpc_method = method.lstrip("/").partition("/")
+        self.exporter.add({
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": method.lstrip("/"),
+            "kind": SPAN_KIND_CLIENT,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.start_ns + int(response_time * 1e6)),
+            "attributes": [
+                _attribute("rpc.system", "grpc"),
+                _attribute("rpc.service", service),
+                _attribute("rpc.method", rpc_method),
+                _attribute("rpc.grpc.status_code", STATUS_VALUES_BY_NAME.get(status_code, 2)),
+            ],
+            "status": {"code": SPAN_STATUS_OK if status_code == "OK" else SPAN_STATUS_ERROR},
+        })
+
+    @classmethod
+    def for_environment(cls, environment):
+        """
+        Returns the tracer of an environment, creating it on first use.
+
+        Args:
+            environment: The Locust environment.
+
+        Returns:
+            Tracer: The tracer shared by all users, None when trace propagation is off.
+        """
+        tracer = getattr(environment, "tracer", None)
+        if tracer is None:
+            options = environment.parsed_options
+            if not options or not options.trace_propagation:
+                return None
+            exporter = None
+            if options.trace_export:
+                exporter = environment.span_exporter = SpanExporter(options.trace_export, options.trace_service_name)
+            tracer = environment.tracer = cls(
+                options.trace_sample_rate,
+                exporter,
+                slow_threshold=options.slow_request_threshold,
+            )
+        return tracer
+
+
+@events.init_command_line_parser.add_listener
+def on_init_command_line_parser(parser, **kwargs):
+    """
+    Adds the tracing options to Locust so they can be set from task.config.
+    """
+    parser.add_argument(
+        "--trace-propagation",
+        action="store_true",
+        default=False,
+        help="Send a W3C traceparent header with every call",
+    )
+    parser.add_argument("--trace-sample-rate", type=float, default=0.01, help="Fraction of the traces marked as sampled")
+    parser.add_argument(
+        "--trace-export",
+        type=str,
+        default="",
+        help="File or OTLP/HTTP URL, e.g. http://localhost:4318/v1/traces, the client spans are exported to",
+    )
+    parser.add_argument("--trace-service-name", type=str, default="loadtestcyrex", help="service.name of the exported spans")
+    parser.add_argument(
+        "--slow-request-threshold",
+        type=float,
+        default=1000,
+        help="Spans of calls slower than this many milliseconds are exported even when not sampled, 0 disables",
+    )
+
+
+@events.quitting.add_listener
+def on_quitting(environment, **kwargs):
+    """
+    Exports the spans still buffered when Locust stops.
+    """
+    exporter = getattr(environment, "span_exporter", None)
+    if exporter is not None:
+        exporter.close()
@@ -0,0 +1,230 @@
+"""
+Module: vacancy_ids
+Description: Index of known vacancy IDs with uniform, Zipfian, hot-set and recency weighted sampling.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import csv
+import logging
+import random
+from array import array
+
+from gevent.lock import BoundedSemaphore
+from locust import events
+from locust.exception import LocustError
+
+from src.clients.messages_client import Messages
+
+SAMPLING_STRATEGIES = ("none", "uniform", "zipf", "hot-set", "recency")
+
+
+class AliasTable:
+    """
+    Walker's alias table, draws index i with probability weights[i] / sum(weights).
+
+    Building the table is O(n), every draw afterwards is O(1): one uniform
+    column and one biased coin flip, whatever the shape of the weights.
+    """
+
+    def __init__(self, weights: list):
+        n = len(weights)
+        total = float(sum(weights))
+        scaled = [weight * n / total for weight in weights]
+        self.size = n
+        self.probability = array("d", [1.0]) * n
+        self.alias = array("l", [0]) * n
+        small = [index for index, value in enumerate(scaled) if value < 1.0]
+        large = [index for index, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] += scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Whatever is left is 1 up to rounding errors
+        for index in small + large:
+            self.probability[index] = 1.0
+            self.alias[index] = index
+
+    def draw(self, rng: random.Random):
+        """
+        Draws one index.
+
+        Args:
+            rng (random.Random): Random number generator.
+
+        Returns:
+            int: The drawn index.
+        """
+        index = int(rng.random() * self.size)
+        return index if rng.random() < self.probability[index] else self.alias[index]
+
+
+class VacancyIdSampler:
+    """
+    Draws vacancy IDs from an index following a sampling strategy.
+
+    The IDs must be ordered oldest first, the recency strategy gives the last
+    ones the highest weight. read_manifest_ids and collect_vacancy_ids sort
+    them by creation time. Zipfian popularity ranks are assigned in a random
+    order, so the popular IDs are spread over the whole dataset instead of all
+    being the oldest ones.
+    """
+
+    def __init__(self, ids: list, strategy: str = "uniform", zipf_exponent: float = 1.1,
+                 hot_fraction: float = 0.2, hot_share: float = 0.8, recency_half_life: float = 0.1, seed: int = None):
+        if not ids:
+            raise LocustError("The vacancy ID index is empty, seed vacancies or pass a manifest with --vacancy-ids.")
+        self.ids = ids
+        self.strategy = strategy
+        self.rng = random.Random(seed)
+        self.table = None
+        n = len(ids)
+
+        if strategy == "zipf":
+            self.ids = list(ids)
+            self.rng.shuffle(self.ids)
+            self.table = AliasTable([1.0 / rank ** zipf_exponent for rank in range(1, n + 1)])
+        elif strategy == "hot-set":
+            hot = max(1, min(n, round(n * hot_fraction)))
+            self.ids = list(ids)
+            self.rng.shuffle(self.ids)
+            cold_weight = (1.0 - hot_share) / (n - hot) if n > hot else 0.0
+            self.table = AliasTable([hot_share / hot] * hot + [cold_weight] * (n - hot))
+        elif strategy == "recency":
+            # The weight halves every half_life * n positions going back from the newest ID
+            decay = 0.5 ** (1.0 / max(recency_half_life * n, 1e-9))
+            self.table = AliasTable([decay ** (n - 1 - index) for index in range(n)])
+
+    def sample(self):
+        """
+        Draws one vacancy ID.
+
+        Returns:
+            str: The vacancy ID.
+        """
+        if self.table is None:
+            return self.ids[int(self.rng.random() * len(self.ids))]
+        return self.ids[self.table.draw(self.rng)]
+
+    @classmethod
+    def for_user(cls, user):
+        """
+        Returns the sampler of the user's environment, building the index on first use.
+
+        Without a manifest the index is collected from GetVacancies pages on the
+        user's channel, bypassing the interceptor so the collection neither
+        shows up in the stats nor has its streams consumed by it. Concurrent
+        callers wait for the first one.
+
+        Args:
+            user (GrpcUser): The calling user.
+
+        Returns:
+            VacancyIdSampler: The shared sampler, None when ID sampling is disabled.
+        """
+        environment = user.environment
+        options = environment.parsed_options
+        if not options or options.id_sampling == "none":
+            return None
+        sampler = getattr(environment, "vacancy_id_sampler", None)
+        if sampler is not None:
+            return sampler
+
+        lock = getattr(environment, "vacancy_id_sampler_lock", None)
+        if lock is None:
+            lock = environment.vacancy_id_sampler_lock = BoundedSemaphore()
+        with lock:
+            sampler = getattr(environment, "vacancy_id_sampler", None)
+            if sampler is None:
+                if options.vacancy_ids:
+                    ids = read_manifest_ids(options.vacancy_ids)
+                else:
+                    vacancy_client = type(user.client["vacancyClient"])(user.pooled_channel("vacancyClient"))
+                    vacancy_client.metadata = user.client["vacancyClient"].metadata
+                    ids = collect_vacancy_ids(vacancy_client, options.id_collect_pages, options.id_collect_page_size)
+                sampler = environment.vacancy_id_sampler = cls(
+                    ids,
+                    strategy=options.id_sampling,
+                    zipf_exponent=options.zipf_exponent,
+                    hot_fraction=options.hot_set_fraction,
+                    hot_share=options.hot_set_share,
+                    recency_half_life=options.recency_half_life,
+                )
+                logging.info("Sampling %d vacancy IDs with the %s strategy", len(ids), options.id_sampling)
+        return sampler
+
+
+def read_manifest_ids(path: str):
+    """
+    Reads the vacancy IDs of a seeding manifest, oldest first.
+
+    Concurrent seeders do not write the manifest in creation order, so the
+    rows are sorted by their created_at column. Manifests without one keep
+    their row order.
+
+    Args:
+        path (str): Manifest CSV file with an id column.
+
+    Returns:
+        list: The vacancy IDs.
+    """
+    try:
+        with open(path, "r", newline="") as file:
+            rows = list(csv.DictReader(file))
+        if rows and "created_at" in rows[0]:
+            rows.sort(key=lambda row: float(row["created_at"] or 0))
+        return [row["id"] for row in rows]
+    except (OSError, KeyError, ValueError) as e:
+        raise LocustError(f"Could not read vacancy IDs from {path}: {e}")
+
+
+def collect_vacancy_ids(vacancy_client, pages: int, page_size: int):
+    """
+    Collects vacancy IDs from GetVacancies pages, oldest first.
+
+    Args:
+        vacancy_client (VacancyServiceClient): The vacancy service client.
+        pages (int): Maximum number of pages to read.
+        page_size (int): Vacancies per page.
+
+    Returns:
+        list: The vacancy IDs sorted by creation time, in listing order when it is not set.
+    """
+    vacancies = []
+    for page in range(1, pages + 1):
+        page_vacancies = list(vacancy_client.get_vacancies(Messages.get_vacancies(page=page, limit=page_size)))
+        vacancies.extend(
+            (vacancy.created_at.seconds, vacancy.created_at.nanos, vacancy.Id) for vacancy in page_vacancies
+        )
+        if len(page_vacancies) < page_size:
+            break
+    vacancies.sort(key=lambda vacancy: vacancy[:2])
+    return [vacancy_id for _, _, vacancy_id in vacancies]
+
+
+@events.init_command_line_parser.add_listener
+def on_init_command_line_parser(parser, **kwargs):
+    """
+    Adds the vacancy ID sampling options to Locust so they can be set from task.config.
+    """
+    parser.add_argument(
+        "--id-sampling",
+        choices=SAMPLING_STRATEGIES,
+        default="none",
+        help="How fetch_vacancy picks IDs, none reads the vacancy the user just created",
+    )
+    parser.add_argument("--vacancy-ids", type=str, default="", help="Seeding manifest to take the vacancy IDs from")
+    parser.add_argument("--id-collect-pages", type=int, default=100, help="GetVacancies pages read when there is no manifest")
+    parser.add_argument("--id-collect-page-size", type=int, default=1000, help="Vacancies per page when collecting IDs")
+    parser.add_argument("--zipf-exponent", type=float, default=1.1, help="Exponent of the Zipfian popularity")
+    parser.add_argument("--hot-set-fraction", type=float, default=0.2, help="Fraction of the IDs in the hot set")
+    parser.add_argument("--hot-set-share", type=float, default=0.8, help="Share of the reads going to the hot set")
+    parser.add_argument(
+        "--recency-half-life",
+        type=float,
+        default=0.1,
+        help="Fraction of the IDs, counted from the newest, after which the read weight halves",
+    )
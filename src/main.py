@@ -11,11 +11,19 @@ import os
 from dotenv import load_dotenv
 
 from locust import task, SequentialTaskSet, constant
+from src.clients.accounts import sign_in
 from src.clients.service_client import AuthServiceClient, VacancyServiceClient
 from src.clients.messages_client import Messages
-from src.utils.utils import RandomText, get_user
+from src.clients.payload_sizes import PayloadGenerator
+from src.clients.vacancy_ids import VacancyIdSampler
+from src.utils.utils import tag_text
 
 from src.clients.locust_client import GrpcUser
+from src.stats import status_codes  # noqa: F401  registers the status code breakdown listeners
+from src.stats import payload_sizes  # noqa: F401  registers the payload size breakdown listeners
+from src.stats import slow_requests  # noqa: F401  registers the slowest request tracker listeners
+from src.stats import rolling_windows  # noqa: F401  registers the rolling window stats listeners
+from src.stats import columnar_export  # noqa: F401  registers the Parquet and Arrow export listeners
 
 # Load environment variables from .env file
 load_dotenv()
@@ -37,12 +45,11 @@ class LoginWithUsers(SequentialTaskSet):
     def on_start(self):
         """
         Runs when the task set starts. Retrieves user credentials and logs in.
-        """
-        self.email, self.password = get_user()
 
-        credentials = Messages.sign_in_user(email=self.email, password=self.password)
-        self.client["authClient"].sign_in_user(credentials=credentials)
-        logging.info('Login with %s email and %s password', self.email, self.password)
+        With a credential store, a stored access token is used and no SignInUser
+        call is made.
+        """
+        self.email, self.password, _ = sign_in(self.user)
 
     @task
     class VacancyLoad(SequentialTaskSet):
@@ -55,11 +62,12 @@ class LoginWithUsers(SequentialTaskSet):
             Creates a vacancy and logs the result.
             """
             global vacancy_id
+            payload = PayloadGenerator.for_environment(self.user.environment)
             create_vacancy_message = Messages.create_vacancy(
-                country=RandomText.lowercase(8),
-                description=RandomText.lowercase(8),
+                country=payload.text("country"),
+                description=tag_text(payload.text("description")),
                 division=2,
-                title=RandomText.lowercase(8)
+                title=payload.text("title")
             )
             res = self.client["vacancyClient"].create_vacancy(create_vacancy_message)
             vacancy_id = res.vacancy.Id
@@ -71,7 +79,8 @@ class LoginWithUsers(SequentialTaskSet):
             Updates the vacancy and logs the result.
             """
             global vacancy_id
-            update_vacancy_message = Messages.update_vacancy(id=vacancy_id, title=RandomText.lowercase(8))
+            payload = PayloadGenerator.for_environment(self.user.environment)
+            update_vacancy_message = Messages.update_vacancy(id=vacancy_id, title=payload.text("title"))
             res = self.client["vacancyClient"].update_vacancy(update_vacancy_message)
             logging.info("Vacancy is updated with { %s }", res.vacancy)
 
@@ -79,9 +88,13 @@ class LoginWithUsers(SequentialTaskSet):
         def fetch_vacancy(self):
             """
             Fetches the vacancy and logs the result.
+
+            With ID sampling enabled, the vacancy is drawn from the ID index
+            instead of being the one just created.
             """
             global vacancy_id
-            get_vacancy_message = Messages.get_vacancy(id=vacancy_id)
+            sampler = VacancyIdSampler.for_user(self.user)
+            get_vacancy_message = Messages.get_vacancy(id=sampler.sample() if sampler else vacancy_id)
             res = self.client["vacancyClient"].get_vacancy(get_vacancy_message)
             logging.info("Vacancy is fetched { %s }", res.vacancy)
 
@@ -0,0 +1,86 @@
+"""
+Module: profile_session
+Description: Locustfile for sign-in, profile and browsing sessions across the auth, user and vacancy services.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import logging
+import os
+
+from dotenv import load_dotenv
+from locust import SequentialTaskSet, between, task
+
+from src.clients.accounts import sign_in
+from src.clients.locust_client import GrpcUser
+from src.clients.messages_client import Messages
+from src.clients.service_client import AuthServiceClient, UserServiceClient, VacancyServiceClient
+from src.clients.vacancy_ids import VacancyIdSampler
+from src.stats import status_codes  # noqa: F401  registers the status code breakdown listeners
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Get the host address from environment variables
+host = os.getenv("HOST")
+
+
+class ProfileAndBrowse(SequentialTaskSet):
+    """
+    A task set for a browsing session: signs in, loads the profile with GetMe, then browses vacancies.
+    """
+    wait_time = between(2, 10)
+    email = "NOT_FOUND"
+    password = "NOT_FOUND"
+    account_id = None
+
+    def on_start(self):
+        """
+        Runs when the task set starts. Signs in like LoginWithUsers.
+        """
+        self.email, self.password, self.account_id = sign_in(self.user)
+
+    @task
+    def get_me(self):
+        """
+        Loads the signed in user's profile and logs the result.
+        """
+        res = self.client["userClient"].get_me(Messages.get_me(id=self.account_id))
+        logging.info("Profile is fetched { %s }", res.user)
+
+    @task
+    def browse_vacancies(self):
+        """
+        Fetches a page of vacancies and logs the result.
+        """
+        res = self.client["vacancyClient"].get_vacancies(Messages.get_vacancies(limit=20))
+        logging.info("Vacancies are browsed : {%s} ", str(res))
+
+    @task
+    def open_vacancy(self):
+        """
+        Fetches one vacancy drawn by the vacancy ID sampler, when ID sampling is enabled.
+        """
+        sampler = VacancyIdSampler.for_user(self.user)
+        if sampler is None:
+            return
+        res = self.client["vacancyClient"].get_vacancy(Messages.get_vacancy(id=sampler.sample()))
+        logging.info("Vacancy is fetched { %s }", res.vacancy)
+
+
+class ProfileSessionTest(GrpcUser):
+    """
+    A Locust user class for sign-in, profile and browsing sessions across the auth, user and vacancy services.
+
+    Set --service-hosts when the user service is not on the host.
+    """
+    host = host
+    tasks = [ProfileAndBrowse]
+    service_clients = {
+        "authClient": AuthServiceClient,
+        "userClient": UserServiceClient,
+        "vacancyClient": VacancyServiceClient,
+    }
+
+# Command to run the profile sessions
+# locust -f src/profile_session.py --config config/task.config
@@ -0,0 +1,8 @@
+"""
+Module: replay
+Description: Initializes the replay module.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+# No specific initialization code required for this module
@@ -0,0 +1,259 @@
+"""
+Module: capture
+Description: Reads and writes captures of gRPC calls in JSONL or compact binary format.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import base64
+import json
+import struct
+from collections import namedtuple
+
+import grpc
+from google.protobuf import message_factory
+from google.protobuf.json_format import MessageToDict, ParseDict
+
+import src.protos.auth_service_pb2 as auth_service
+import src.protos.user_service_pb2 as user_service
+import src.protos.vacancy_service_pb2 as vacancy_service
+
+CaptureRecord = namedtuple(
+    "CaptureRecord", ["timestamp", "method", "request", "response_size", "status", "latency_ms", "session"], defaults=("",)
+)
+CaptureRecord.__doc__ = """
+One captured call. timestamp is in epoch seconds, request holds the serialized
+request message, status the gRPC status code name. session identifies the
+client the call came from, e.g. its connection, empty when unknown.
+"""
+
+RpcMethod = namedtuple("RpcMethod", ["path", "request_class", "response_class", "server_streaming"])
+
+BINARY_MAGIC = b"LTCCAP\x02\n"
+# Version 1 files have no session records and are still read
+BINARY_MAGIC_V1 = b"LTCCAP\x01\n"
+# Method definition: record type, method id, name length
+_METHOD_HEADER = struct.Struct("<BHH")
+# Call: record type, method id, timestamp, latency, response size, status code, request length
+_CALL_HEADER = struct.Struct("<BHdfIBI")
+# Session definition: record type, session id, key length
+_SESSION_HEADER = struct.Struct("<BIH")
+# Call of a session: the call header followed by the session id
+_SESSION_CALL_HEADER = struct.Struct("<BHdfIBII")
+_RECORD_METHOD = 0
+_RECORD_CALL = 1
+_RECORD_SESSION = 2
+_RECORD_SESSION_CALL = 3
+_HEADERS = {
+    _RECORD_METHOD: _METHOD_HEADER,
+    _RECORD_CALL: _CALL_HEADER,
+    _RECORD_SESSION: _SESSION_HEADER,
+    _RECORD_SESSION_CALL: _SESSION_CALL_HEADER,
+}
+
+STATUS_CODES_BY_VALUE = {code.value[0]: code.name for code in grpc.StatusCode}
+STATUS_VALUES_BY_NAME = {code.name: code.value[0] for code in grpc.StatusCode}
+
+
+def _build_method_registry():
+    """
+    Collects every RPC of the generated service modules.
+
+    Returns:
+        dict: Full method path, e.g. "/pb.VacancyService/GetVacancy", mapped to RpcMethod.
+    """
+    registry = {}
+    for module in (auth_service, user_service, vacancy_service):
+        for service in module.DESCRIPTOR.services_by_name.values():
+            for method in service.methods:
+                path = f"/{service.full_name}/{method.name}"
+                registry[path] = RpcMethod(
+                    path=path,
+                    request_class=message_factory.GetMessageClass(method.input_type),
+                    response_class=message_factory.GetMessageClass(method.output_type),
+                    server_streaming=method.server_streaming,
+                )
+    return registry
+
+
+METHODS = _build_method_registry()
+
+
+def is_binary_capture(path: str):
+    """
+    Tells the capture format from the file name, everything but .jsonl is binary.
+
+    Args:
+        path (str): Capture file path.
+
+    Returns:
+        bool: True for the binary format.
+    """
+    return not path.endswith(".jsonl")
+
+
+def _iter_jsonl(file):
+    for line in file:
+        if not line.strip():
+            continue
+        data = json.loads(line)
+        method = data["method"]
+        if "request_b64" in data:
+            request = base64.b64decode(data["request_b64"])
+        else:
+            request = ParseDict(data.get("request", {}), METHODS[method].request_class()).SerializeToString()
+        yield CaptureRecord(
+            timestamp=data["timestamp"],
+            method=method,
+            request=request,
+            response_size=data.get("response_size", 0),
+            status=data.get("status", "OK"),
+            latency_ms=data.get("latency_ms", 0.0),
+            session=data.get("session", ""),
+        )
+
+
+def _iter_binary(file):
+    if file.read(len(BINARY_MAGIC)) not in (BINARY_MAGIC, BINARY_MAGIC_V1):
+        raise ValueError(f"{file.name} is not a binary capture file")
+    methods = {}
+    sessions = {}
+    read = file.read
+    while True:
+        record_type = read(1)
+        if not record_type:
+            return
+        header = _HEADERS.get(record_type[0])
+        if header is None:
+            raise ValueError(f"{file.name} has an unknown record type {record_type[0]}")
+        data = record_type + read(header.size - 1)
+        if len(data) < header.size:
+            # Truncated by a recorder that was killed mid-write
+            return
+        if header is _METHOD_HEADER:
+            _, method_id, name_length = header.unpack(data)
+            methods[method_id] = read(name_length).decode()
+            continue
+        if header is _SESSION_HEADER:
+            _, session_id, key_length = header.unpack(data)
+            sessions[session_id] = read(key_length).decode()
+            continue
+        if header is _SESSION_CALL_HEADER:
+            _, method_id, timestamp, latency_ms, response_size, status, request_length, session_id = header.unpack(data)
+            session = sessions[session_id]
+        else:
+            _, method_id, timestamp, latency_ms, response_size, status, request_length = header.unpack(data)
+            session = ""
+        request = read(request_length)
+        if len(request) < request_length:
+            return
+        yield CaptureRecord(
+            timestamp=timestamp,
+            method=methods[method_id],
+            request=request,
+            response_size=response_size,
+            status=STATUS_CODES_BY_VALUE.get(status, "UNKNOWN"),
+            latency_ms=latency_ms,
+            session=session,
+        )
+
+
+def iter_capture(path: str):
+    """
+    Streams the records of a capture file without loading it into memory.
+
+    Args:
+        path (str): Capture file path, .jsonl for JSON lines, anything else for binary.
+
+    Yields:
+        CaptureRecord: The captured calls in file order.
+    """
+    if is_binary_capture(path):
+        with open(path, "rb", buffering=1 << 20) as file:
+            yield from _iter_binary(file)
+    else:
+        with open(path, "r", buffering=1 << 20) as file:
+            yield from _iter_jsonl(file)
+
+
+class CaptureWriter:
+    """
+    Appends records to a capture file.
+
+    The binary format stores each method name and session key once and refers
+    to them by id, so a call costs a fixed 28 byte header plus the serialized
+    request.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.binary = is_binary_capture(path)
+        self._method_ids = {}
+        self._session_ids = {}
+        if self.binary:
+            self.file = open(path, "wb", buffering=1 << 20)
+            self.file.write(BINARY_MAGIC)
+        else:
+            self.file = open(path, "w", buffering=1 << 20)
+
+    def write(self, record: CaptureRecord):
+        """
+        Writes one record.
+
+        Args:
+            record (CaptureRecord): The captured call.
+        """
+        if self.binary:
+            self._write_binary(record)
+        else:
+            self._write_jsonl(record)
+
+    def _write_binary(self, record: CaptureRecord):
+        method_id = self._method_ids.get(record.method)
+        if method_id is None:
+            method_id = self._method_ids[record.method] = len(self._method_ids)
+            name = record.method.encode()
+            self.file.write(_METHOD_HEADER.pack(_RECORD_METHOD, method_id, len(name)) + name)
+        status = STATUS_VALUES_BY_NAME.get(record.status, STATUS_VALUES_BY_NAME["UNKNOWN"])
+        if not record.session:
+            self.file.write(_CALL_HEADER.pack(
+                _RECORD_CALL, method_id, record.timestamp, record.latency_ms, record.response_size, status,
+                len(record.request),
+            ))
+        else:
+            session_id = self._session_ids.get(record.session)
+            if session_id is None:
+                session_id = self._session_ids[record.session] = len(self._session_ids)
+                key = record.session.encode()
+                self.file.write(_SESSION_HEADER.pack(_RECORD_SESSION, session_id, len(key)) + key)
+            self.file.write(_SESSION_CALL_HEADER.pack(
+                _RECORD_SESSION_CALL, method_id, record.timestamp, record.latency_ms, record.response_size, status,
+                len(record.request), session_id,
+            ))
+        self.file.write(record.request)
+
+    def _write_jsonl(self, record: CaptureRecord):
+        data = {"timestamp": record.timestamp, "method": record.method}
+        method = METHODS.get(record.method)
+        if method is None:
+            data["request_b64"] = base64.b64encode(record.request).decode()
+        else:
+            data["request"] = MessageToDict(method.request_class.FromString(record.request), preserving_proto_field_name=True)
+        data["response_size"] = record.response_size
+        data["status"] = record.status
+        data["latency_ms"] = round(record.latency_ms, 3)
+        if record.session:
+            data["session"] = record.session
+        self.file.write(json.dumps(data) + "\n")
+
+    def flush(self):
+        """
+        Flushes buffered records to disk.
+        """
+        self.file.flush()
+
+    def close(self):
+        """
+        Closes the capture file.
+        """
+        self.file.close()
@@ -0,0 +1,352 @@
+"""
+Module: journey
+Description: Markov chain model of user sessions with think time distributions, fitted from a traffic capture.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import bisect
+import json
+import logging
+import math
+import random
+from collections import defaultdict
+
+from locust import events
+from locust.exception import LocustError
+
+from src.replay.capture import iter_capture
+
+START = "start"
+END = "end"
+THINK_TIME_KINDS = ("lognormal", "exponential", "empirical")
+EMPIRICAL_QUANTILES = 50
+# Think times below a millisecond are clamped before taking logs
+MIN_THINK_TIME = 0.001
+
+
+class ThinkTime:
+    """
+    Draws think times in seconds, parsed from a spec:
+
+    - "constant:2"
+    - "exponential:mean=5,max=120"
+    - "lognormal:median=3,sigma=0.8,max=120"
+    - "empirical:0.4,1.2,2.5,8.0", resamples the listed times with linear interpolation
+    """
+
+    def __init__(self, spec: str):
+        kind, _, arguments = spec.partition(":")
+        self.spec = spec
+        self.high = math.inf
+        try:
+            if kind == "constant":
+                self.value = float(arguments)
+            elif kind in ("exponential", "lognormal"):
+                parameters = dict(item.strip().split("=") for item in arguments.split(","))
+                if kind == "exponential":
+                    self.mean = float(parameters["mean"])
+                else:
+                    self.mu = math.log(float(parameters["median"]))
+                    self.sigma = float(parameters.get("sigma", 1.0))
+                self.high = float(parameters.get("max", math.inf))
+            elif kind == "empirical":
+                self.values = sorted(float(value) for value in arguments.split(","))
+            else:
+                raise ValueError(f"unknown distribution {kind!r}")
+        except (ValueError, KeyError) as e:
+            raise LocustError(f"Invalid think time spec {spec!r}: {e}")
+        self.kind = kind
+
+    def draw(self, rng: random.Random):
+        """
+        Draws one think time.
+
+        Args:
+            rng (random.Random): Random number generator.
+
+        Returns:
+            float: Think time in seconds.
+        """
+        if self.kind == "constant":
+            return self.value
+        if self.kind == "exponential":
+            return min(self.high, rng.expovariate(1 / self.mean)) if self.mean > 0 else 0.0
+        if self.kind == "lognormal":
+            return min(self.high, rng.lognormvariate(self.mu, self.sigma))
+        position = rng.random() * (len(self.values) - 1)
+        index = int(position)
+        if index + 1 >= len(self.values):
+            return self.values[-1]
+        return self.values[index] + (self.values[index + 1] - self.values[index]) * (position - index)
+
+
+def fit_think_time(samples: list, kind: str, maximum: float = None):
+    """
+    Fits a think time distribution to observed think times.
+
+    Args:
+        samples (list): Think times in seconds.
+        kind (str): One of THINK_TIME_KINDS.
+        maximum (float, optional): Upper bound of drawn times, the largest sample by default.
+
+    Returns:
+        str: The ThinkTime spec.
+    """
+    maximum = maximum if maximum is not None else max(samples)
+    if kind == "exponential":
+        return f"exponential:mean={sum(samples) / len(samples):.3f},max={maximum:.3f}"
+    if kind == "lognormal":
+        logs = [math.log(max(sample, MIN_THINK_TIME)) for sample in samples]
+        mu = sum(logs) / len(logs)
+        sigma = math.sqrt(sum((value - mu) ** 2 for value in logs) / len(logs))
+        return f"lognormal:median={math.exp(mu):.3f},sigma={sigma:.3f},max={maximum:.3f}"
+    ordered = sorted(samples)
+    count = min(EMPIRICAL_QUANTILES, len(ordered))
+    if count == 1:
+        return f"empirical:{ordered[0]:.3f}"
+    quantiles = [ordered[round(index * (len(ordered) - 1) / (count - 1))] for index in range(count)]
+    return "empirical:" + ",".join(f"{value:.3f}" for value in quantiles)
+
+
+class JourneyModel:
+    """
+    A Markov chain over the RPC methods of a session.
+
+    A session walks from START through methods until it reaches END. After a
+    call of a method, the user thinks for a time drawn from that method's
+    think time distribution before the next call. The think time of END is the
+    pause between two sessions of the same user.
+    """
+
+    def __init__(self, transitions: dict, think_times: dict):
+        self.transitions = transitions
+        self.think_times = {state: ThinkTime(spec) for state, spec in think_times.items()}
+        self._choices = {}
+        for state, targets in transitions.items():
+            total = sum(targets.values())
+            if total <= 0:
+                raise LocustError(f"The journey state {state} has no transitions")
+            cumulative, running = [], 0.0
+            for probability in targets.values():
+                running += probability / total
+                cumulative.append(running)
+            self._choices[state] = (list(targets), cumulative)
+        if START not in self._choices:
+            raise LocustError(f"The journey model has no {START} state")
+
+    def next_state(self, state: str, rng: random.Random):
+        """
+        Draws the state that follows a state.
+
+        Args:
+            state (str): The current state, START or a method.
+            rng (random.Random): Random number generator.
+
+        Returns:
+            str: The next method, or END.
+        """
+        choices = self._choices.get(state)
+        if choices is None:
+            return END
+        targets, cumulative = choices
+        return targets[min(bisect.bisect_right(cumulative, rng.random()), len(targets) - 1)]
+
+    def think_time(self, state: str, rng: random.Random):
+        """
+        Draws the think time after a state.
+
+        Args:
+            state (str): The state just left, a method or END.
+            rng (random.Random): Random number generator.
+
+        Returns:
+            float: Think time in seconds, 0 when the state has no distribution.
+        """
+        think_time = self.think_times.get(state)
+        return think_time.draw(rng) if think_time is not None else 0.0
+
+    def to_dict(self):
+        """
+        Returns the model in its JSON form.
+
+        Returns:
+            dict: The transitions and the think time specs.
+        """
+        return {
+            "transitions": self.transitions,
+            "think_times": {state: think_time.spec for state, think_time in self.think_times.items()},
+        }
+
+    def save(self, path: str):
+        """
+        Writes the model to a JSON file.
+
+        Args:
+            path (str): Path of the model file.
+        """
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Reads a model from a JSON file.
+
+        Args:
+            path (str): Path of the model file.
+
+        Returns:
+            JourneyModel: The model.
+        """
+        with open(path) as file:
+            data = json.load(file)
+        return cls(data["transitions"], data.get("think_times", {}))
+
+    @classmethod
+    def for_environment(cls, environment):
+        """
+        Returns the model of an environment, loading or fitting it on first use.
+
+        Args:
+            environment: The Locust environment.
+
+        Returns:
+            JourneyModel: The model shared by all users of the environment.
+        """
+        model = getattr(environment, "journey_model", None)
+        if model is None:
+            options = environment.parsed_options
+            if not options or not options.journey:
+                raise LocustError("Set --journey to a journey model or a capture file")
+            if options.journey.endswith(".json"):
+                model = cls.load(options.journey)
+            else:
+                model = fit_journey(
+                    iter_capture(options.journey),
+                    session_gap=options.journey_session_gap,
+                    think_time=options.journey_think_time,
+                )
+            if END not in model.think_times:
+                # Sessions that sign in get a new token each, so captures rarely show the pause between them
+                model.think_times[END] = ThinkTime(options.journey_session_pause)
+            environment.journey_model = model
+        return model
+
+
+def split_sessions(records, session_gap: float):
+    """
+    Groups captured calls into sessions.
+
+    Calls of the same client belong to one session until the client is idle
+    for more than session_gap seconds.
+
+    Args:
+        records: CaptureRecord iterable with session keys.
+        session_gap (float): Idle seconds that end a session.
+
+    Returns:
+        list: Sessions, each a list of CaptureRecords in time order.
+    """
+    by_client = defaultdict(list)
+    for record in records:
+        by_client[record.session].append(record)
+    if "" in by_client:
+        logging.warning("Skipped %d captured calls without a session", len(by_client.pop("")))
+
+    sessions = []
+    for calls in by_client.values():
+        calls.sort(key=lambda record: record.timestamp)
+        session = [calls[0]]
+        for previous, record in zip(calls, calls[1:]):
+            if record.timestamp - (previous.timestamp + previous.latency_ms / 1000) > session_gap:
+                sessions.append(session)
+                session = []
+            session.append(record)
+        sessions.append(session)
+    return sessions
+
+
+def fit_journey(records, session_gap: float = 300, think_time: str = "lognormal", max_think_time: float = None):
+    """
+    Fits a journey model to the sessions of a capture.
+
+    Transition probabilities are the observed transition frequencies between
+    the methods of a session. The think time after a method is the time from
+    the end of its call to the start of the next call of the session. The think
+    time of END is the idle time between sessions of the same client.
+
+    Args:
+        records: CaptureRecord iterable recorded by src/tools/recording_proxy.py.
+        session_gap (float, optional): Idle seconds that end a session.
+        think_time (str, optional): Distribution fitted to the think times, one of THINK_TIME_KINDS.
+        max_think_time (float, optional): Upper bound of drawn think times, the largest observed by default.
+
+    Returns:
+        JourneyModel: The fitted model.
+    """
+    if think_time not in THINK_TIME_KINDS:
+        raise LocustError(f"Unknown think time distribution {think_time!r}, expected one of {THINK_TIME_KINDS}")
+    sessions = split_sessions(records, session_gap)
+    if not sessions:
+        raise LocustError("The capture has no sessions to fit a journey model to")
+
+    counts = defaultdict(lambda: defaultdict(int))
+    samples = defaultdict(list)
+    last_end = {}
+    for session in sessions:
+        client = session[0].session
+        if client in last_end:
+            samples[END].append(max(0.0, session[0].timestamp - last_end[client]))
+        state = START
+        for previous, record in zip([None] + session, session):
+            counts[state][record.method] += 1
+            if previous is not None:
+                samples[previous.method].append(
+                    max(0.0, record.timestamp - (previous.timestamp + previous.latency_ms / 1000))
+                )
+            state = record.method
+        counts[state][END] += 1
+        last_end[client] = session[-1].timestamp + session[-1].latency_ms / 1000
+
+    transitions = {
+        state: {target: round(count / sum(targets.values()), 6) for target, count in sorted(targets.items())}
+        for state, targets in sorted(counts.items())
+    }
+    think_times = {
+        state: fit_think_time(values, think_time, max_think_time)
+        for state, values in sorted(samples.items()) if values
+    }
+    logging.info("Fitted a journey model to %d sessions over %d methods", len(sessions), len(transitions) - 1)
+    return JourneyModel(transitions, think_times)
+
+
+@events.init_command_line_parser.add_listener
+def on_init_command_line_parser(parser, **kwargs):
+    """
+    Adds the journey options to Locust so they can be set from task.config.
+    """
+    parser.add_argument(
+        "--journey",
+        type=str,
+        default="",
+        help="Journey model written by src/tools/fit_journey.py (.json), or a capture to fit one from at start",
+    )
+    parser.add_argument(
+        "--journey-session-gap",
+        type=float,
+        default=300,
+        help="Idle seconds that end a captured session, when fitting from a capture",
+    )
+    parser.add_argument(
+        "--journey-session-pause",
+        type=str,
+        default="exponential:mean=60,max=600",
+        help="Think time spec of the pause between sessions, when the model has none",
+    )
+    parser.add_argument(
+        "--journey-think-time",
+        choices=THINK_TIME_KINDS,
+        default="lognormal",
+        help="Think time distribution fitted from a capture",
+    )
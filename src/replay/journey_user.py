@@ -0,0 +1,153 @@
+"""
+Module: journey_user
+Description: Locustfile walking users through sessions drawn from a Markov chain journey model.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import logging
+import os
+import random
+
+import gevent
+import grpc
+from dotenv import load_dotenv
+from locust import task
+
+from src.clients.accounts import sign_in
+from src.clients.locust_client import GrpcUser
+from src.clients.messages_client import Messages
+from src.clients.payload_sizes import PayloadGenerator
+from src.clients.service_client import AuthServiceClient, UserServiceClient, VacancyServiceClient
+from src.clients.vacancy_ids import VacancyIdSampler
+from src.replay.journey import END, START, JourneyModel
+from src.stats import status_codes  # noqa: F401  registers the status code breakdown listeners
+from src.utils.utils import tag_text
+
+# Load environment variables from .env file
+load_dotenv()
+
+# JourneyUser method that makes the call of a journey state
+ACTIONS = {
+    "/pb.AuthService/SignInUser": "sign_in_user",
+    "/pb.UserService/GetMe": "get_me",
+    "/pb.VacancyService/GetVacancies": "get_vacancies",
+    "/pb.VacancyService/GetVacancy": "get_vacancy",
+    "/pb.VacancyService/CreateVacancy": "create_vacancy",
+    "/pb.VacancyService/UpdateVacancy": "update_vacancy",
+    "/pb.VacancyService/DeleteVacancy": "delete_vacancy",
+}
+
+
+class JourneyUser(GrpcUser):
+    """
+    A Locust user class walking through sessions drawn from the journey model.
+
+    Every user signs in once and then runs one session after the other. A
+    session draws its calls from the model's transitions and waits the drawn
+    think time between them, the pause between sessions is the think time of
+    END. Methods without an action, such as SignUpUser, are skipped.
+    """
+    host = os.getenv("HOST")
+    service_clients = {
+        "authClient": AuthServiceClient,
+        "userClient": UserServiceClient,
+        "vacancyClient": VacancyServiceClient,
+    }
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        self.rng = random.Random()
+        self.account_id = None
+        self.vacancy_ids = []
+
+    def wait_time(self):
+        return JourneyModel.for_environment(self.environment).think_time(END, self.rng)
+
+    def on_start(self):
+        """
+        Signs the user in, so the calls of sessions that do not start with SignInUser are authorized.
+        """
+        _, _, self.account_id = sign_in(self)
+
+    @task
+    def session(self):
+        """
+        Runs one session of the journey model.
+        """
+        model = JourneyModel.for_environment(self.environment)
+        state = model.next_state(START, self.rng)
+        while state != END:
+            self.call(state)
+            next_state = model.next_state(state, self.rng)
+            if next_state != END:
+                gevent.sleep(model.think_time(state, self.rng))
+            state = next_state
+
+    def call(self, method: str):
+        """
+        Makes the call of a journey state.
+
+        Args:
+            method (str): Full gRPC method name.
+        """
+        action = ACTIONS.get(method)
+        if action is None:
+            skipped = getattr(self.environment, "journey_skipped_methods", None)
+            if skipped is None:
+                skipped = self.environment.journey_skipped_methods = set()
+            if method not in skipped:
+                skipped.add(method)
+                logging.warning("The journey calls %s, which has no action and is skipped", method)
+            return
+        try:
+            getattr(self, action)()
+        except grpc.RpcError:
+            # Already reported as a failure by the interceptor
+            pass
+
+    def sign_in_user(self):
+        _, _, self.account_id = sign_in(self)
+
+    def get_me(self):
+        self.client["userClient"].get_me(Messages.get_me(id=self.account_id))
+
+    def get_vacancies(self):
+        for _ in self.client["vacancyClient"].get_vacancies(Messages.get_vacancies(limit=20)):
+            pass
+
+    def get_vacancy(self):
+        sampler = VacancyIdSampler.for_user(self)
+        if sampler is not None:
+            vacancy_id = sampler.sample()
+        elif self.vacancy_ids:
+            vacancy_id = self.rng.choice(self.vacancy_ids)
+        else:
+            return
+        self.client["vacancyClient"].get_vacancy(Messages.get_vacancy(id=vacancy_id))
+
+    def create_vacancy(self):
+        payload = PayloadGenerator.for_environment(self.environment)
+        res = self.client["vacancyClient"].create_vacancy(Messages.create_vacancy(
+            country=payload.text("country"),
+            description=tag_text(payload.text("description")),
+            division=2,
+            title=payload.text("title"),
+        ))
+        self.vacancy_ids.append(res.vacancy.Id)
+
+    def update_vacancy(self):
+        if not self.vacancy_ids:
+            return
+        payload = PayloadGenerator.for_environment(self.environment)
+        self.client["vacancyClient"].update_vacancy(
+            Messages.update_vacancy(id=self.vacancy_ids[-1], title=payload.text("title"))
+        )
+
+    def delete_vacancy(self):
+        if not self.vacancy_ids:
+            return
+        self.client["vacancyClient"].delete_vacancy(Messages.delete_vacancy(id=self.vacancy_ids.pop()))
+
+# Command to run the journey model
+# locust -f src/replay/journey_user.py --config config/task.config --journey config/journey.json
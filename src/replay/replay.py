@@ -0,0 +1,247 @@
+"""
+Module: replay
+Description: Replays captured gRPC calls at original timing, scaled speed or maximum speed.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import logging
+import time
+
+import gevent
+from gevent.queue import Queue
+from locust import events
+
+from src.replay.capture import METHODS, iter_capture
+
+_END = object()
+
+
+class PrefetchReader:
+    """
+    Streams a capture file through a bounded queue filled by a background greenlet.
+
+    At most buffer_size records are held in memory, so captures of any size are
+    replayed with constant memory. With partitions > 1 only every n-th record
+    starting at partition_index is kept, which splits a capture across workers.
+    """
+
+    def __init__(self, path: str, buffer_size: int = 10000, loop: bool = False, partition_index: int = 0, partitions: int = 1):
+        self.path = path
+        self.loop = loop
+        self.partition_index = partition_index
+        self.partitions = max(partitions, 1)
+        self.records_read = 0
+        self.queue = Queue(maxsize=buffer_size)
+        self._greenlet = gevent.spawn(self._fill)
+
+    def _fill(self):
+        while True:
+            for index, record in enumerate(iter_capture(self.path)):
+                if index % self.partitions != self.partition_index:
+                    continue
+                self.queue.put(record)
+                self.records_read += 1
+                if not self.records_read % 1000:
+                    # File reads never block in gevent, let the users run between batches
+                    gevent.sleep(0)
+            if not self.loop:
+                break
+        self.queue.put(_END)
+
+    def get(self):
+        """
+        Returns the next record, waiting for the filler if the buffer is empty.
+
+        Returns:
+            CaptureRecord: The next record, None at the end of the capture.
+        """
+        record = self.queue.get()
+        if record is _END:
+            # Leave the marker for the other users
+            self.queue.put(_END)
+            return None
+        return record
+
+    def close(self):
+        """
+        Stops the background filler.
+        """
+        self._greenlet.kill()
+
+
+class ReplayClock:
+    """
+    Maps capture timestamps onto the replay timeline.
+
+    A speed of 1 keeps the original timing, 2 replays twice as fast and 0 or
+    less replays as fast as the users can send.
+    """
+
+    def __init__(self, speed: float = 1.0):
+        self.speed = speed
+        self.origin = None
+        self.start = None
+        self.max_lag = 0.0
+
+    def delay(self, timestamp: float):
+        """
+        Returns how long to wait before sending a record.
+
+        Args:
+            timestamp (float): Capture timestamp of the record.
+
+        Returns:
+            float: Seconds to wait, 0 when the record is due or overdue.
+        """
+        if self.speed <= 0:
+            return 0.0
+        now = time.perf_counter()
+        if self.origin is None:
+            self.origin = timestamp
+            self.start = now
+        delay = self.start + (timestamp - self.origin) / self.speed - now
+        if delay < 0:
+            self.max_lag = max(self.max_lag, -delay)
+            return 0.0
+        return delay
+
+
+class Replayer:
+    """
+    Shares one prefetch reader and replay clock between all replay users of an environment.
+    """
+
+    def __init__(self, environment):
+        options = environment.parsed_options
+        runner = environment.runner
+        partition_index = getattr(runner, "worker_index", 0) if options.replay_partitions > 1 else 0
+        if options.replay_partitions > 1:
+            worker_count = getattr(runner, "worker_count", 1)
+            if partition_index >= options.replay_partitions:
+                logging.warning(
+                    "Worker %d gets no replay partition and replays nothing, there are %d partitions for %d workers",
+                    partition_index, options.replay_partitions, worker_count,
+                )
+            elif partition_index == 0 and worker_count < options.replay_partitions:
+                logging.warning(
+                    "Replay partitions %d to %d are not replayed, there are %d partitions for %d workers",
+                    worker_count, options.replay_partitions - 1, options.replay_partitions, worker_count,
+                )
+        self.reader = PrefetchReader(
+            options.capture_file,
+            buffer_size=options.replay_buffer,
+            loop=options.replay_loop,
+            partition_index=partition_index,
+            partitions=options.replay_partitions,
+        )
+        self.clock = ReplayClock(options.replay_speed)
+        self.skipped = 0
+
+    @classmethod
+    def for_environment(cls, environment):
+        """
+        Returns the replayer of an environment, creating it on first use.
+
+        Args:
+            environment: The Locust environment.
+
+        Returns:
+            Replayer: The shared replayer.
+        """
+        replayer = getattr(environment, "replayer", None)
+        if replayer is None:
+            replayer = environment.replayer = cls(environment)
+        return replayer
+
+    def next_call(self):
+        """
+        Takes the next record and waits until it is due.
+
+        Returns:
+            CaptureRecord: The record, None at the end of the capture.
+        """
+        while True:
+            record = self.reader.get()
+            if record is None:
+                return None
+            if record.method in METHODS:
+                break
+            self.skipped += 1
+
+        delay = self.clock.delay(record.timestamp)
+        if delay:
+            gevent.sleep(delay)
+        return record
+
+
+class ReplayCalls:
+    """
+    Sends captured request bytes as-is over a channel.
+
+    Requests are not deserialized, the captured bytes are passed straight to the
+    channel. Responses are deserialized so the interceptor can measure them.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+        self._callables = {}
+
+    def call(self, record):
+        """
+        Sends one captured call.
+
+        Args:
+            record (CaptureRecord): The captured call.
+
+        Returns:
+            The response, or the list of streamed responses.
+        """
+        callable_ = self._callables.get(record.method)
+        if callable_ is None:
+            method = METHODS[record.method]
+            factory = self.channel.unary_stream if method.server_streaming else self.channel.unary_unary
+            callable_ = self._callables[record.method] = factory(
+                record.method,
+                request_serializer=None,
+                response_deserializer=method.response_class.FromString,
+            )
+        return callable_(record.request)
+
+
+@events.init_command_line_parser.add_listener
+def on_init_command_line_parser(parser, **kwargs):
+    """
+    Adds the replay options to Locust so they can be set from task.config.
+    """
+    parser.add_argument("--capture-file", type=str, default="", help="Capture to replay, .jsonl or binary")
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        default=1.0,
+        help="1 keeps the original timing, 2 replays twice as fast, 0 replays at maximum speed",
+    )
+    parser.add_argument("--replay-buffer", type=int, default=10000, help="Records prefetched ahead of the users")
+    parser.add_argument("--replay-loop", action="store_true", default=False, help="Start over at the end of the capture")
+    parser.add_argument(
+        "--replay-partitions",
+        type=int,
+        default=0,
+        help="Number of workers sharing the capture, each worker replays every n-th record",
+    )
+
+
+@events.test_stop.add_listener
+def on_test_stop(environment, **kwargs):
+    """
+    Reports the replay lag and drops the replayer so the next run starts from the beginning.
+    """
+    replayer = getattr(environment, "replayer", None)
+    if replayer is None:
+        return
+    logging.info(
+        "Read %d capture records, %d skipped, max lag behind schedule %.3fs",
+        replayer.reader.records_read, replayer.skipped, replayer.clock.max_lag,
+    )
+    replayer.reader.close()
+    environment.replayer = None
@@ -0,0 +1,64 @@
+"""
+Module: replay_user
+Description: Locustfile replaying a capture of gRPC calls through the instrumented channels.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import logging
+import os
+
+import gevent
+import grpc
+from dotenv import load_dotenv
+from locust import constant, task
+from locust.exception import StopUser
+
+from src.clients.locust_client import GrpcUser
+from src.clients.service_client import AuthServiceClient, VacancyServiceClient
+from src.replay.replay import ReplayCalls, Replayer
+from src.stats import status_codes  # noqa: F401  registers the status code breakdown listeners
+
+# Load environment variables from .env file
+load_dotenv()
+
+
+class ReplayUser(GrpcUser):
+    """
+    A Locust user class sending the calls of a capture file.
+
+    All replay users share one reader, so the number of users only bounds how
+    many captured calls can be in flight at the same time.
+    """
+    host = os.getenv("HOST")
+    vacancy_service_stub_class = VacancyServiceClient
+    auth_service_stub_class = AuthServiceClient
+    wait_time = constant(0)
+
+    def on_start(self):
+        """
+        Prepares the raw callables on the user's instrumented channel.
+        """
+        self.replay_calls = ReplayCalls(self.client["vacancyClient"].channel)
+
+    @task
+    def replay(self):
+        """
+        Sends the next captured call once it is due.
+        """
+        record = Replayer.for_environment(self.environment).next_call()
+        if record is None:
+            if not getattr(self.environment, "replay_finished", False):
+                self.environment.replay_finished = True
+                logging.info("Capture replay finished")
+                gevent.spawn(self.environment.runner.quit)
+            raise StopUser()
+
+        try:
+            self.replay_calls.call(record)
+        except grpc.RpcError:
+            # Already reported as a failure by the interceptor
+            pass
+
+# Command to run the replay
+# locust -f src/replay/replay_user.py --config config/task.config --capture-file captures/staging.bin --replay-speed 1
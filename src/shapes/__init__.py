@@ -0,0 +1,8 @@
+"""
+Module: shapes
+Description: Initializes the shapes module.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+# No specific initialization code required for this module
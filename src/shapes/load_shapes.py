@@ -0,0 +1,437 @@
+"""
+Module: load_shapes
+Description: Provides a library of LoadTestShape implementations for the gRPC user classes.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import configparser
+import csv
+import logging
+import math
+import os
+import time
+
+from locust import LoadTestShape
+from locust.exception import LocustError
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+LOAD_SHAPES_PATH = os.path.join(ROOT_DIR, "config", "load_shapes.config")
+
+
+def _convert(value: str, default):
+    """
+    Converts a config value to the type of the attribute default.
+
+    Args:
+        value (str): Raw config value.
+        default: Default value of the attribute.
+
+    Returns:
+        The converted value.
+    """
+    if isinstance(default, bool):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    if isinstance(default, int):
+        return int(value)
+    if isinstance(default, float):
+        return float(value)
+    return value.strip()
+
+
+class SloWindow:
+    """
+    Measures throughput, p99 latency and failure ratio of a set of methods from a point in time.
+
+    Reads the status code stats, which on the master contain the merged data of all workers.
+    """
+
+    def __init__(self, status_code_stats, method_prefix: str = ""):
+        self.status_code_stats = status_code_stats
+        self.method_prefix = method_prefix
+        self.start = time.perf_counter()
+        self.histogram, self.failures = status_code_stats.totals(method_prefix)
+
+    def measure(self):
+        """
+        Returns the figures for everything recorded since the window was opened.
+
+        Returns:
+            tuple: (requests per second, p99 in milliseconds, failure ratio)
+        """
+        histogram, failures = self.status_code_stats.totals(self.method_prefix)
+        if histogram.count < self.histogram.count:
+            # Stats were reset in between, everything recorded belongs to this window
+            delta = histogram
+        else:
+            delta = histogram.difference(self.histogram)
+            failures -= self.failures
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        fail_ratio = failures / delta.count if delta.count else 0.0
+        return delta.count / elapsed, delta.percentile(0.99), fail_ratio
+
+
+class GrpcLoadShape(LoadTestShape):
+    """
+    Base class of the configurable load shapes.
+
+    Every class attribute not starting with an underscore can be set from a
+    section of config/load_shapes.config, with dashes in place of underscores.
+    """
+    abstract = True
+    user_classes = ""
+    spawn_rate = 10.0
+    time_limit = 0
+
+    def configure(self, params: dict):
+        """
+        Sets the shape parameters.
+
+        Args:
+            params (dict): Parameter names mapped to raw config values.
+        """
+        for key, value in params.items():
+            name = key.replace("-", "_")
+            if name == "type":
+                continue
+            if name.startswith("_") or not hasattr(type(self), name):
+                raise LocustError(f"Unknown parameter {key} for {type(self).__name__}.")
+            setattr(self, name, _convert(value, getattr(type(self), name)))
+
+    def time_limit_reached(self, run_time: float):
+        """
+        Checks the optional overall time limit.
+
+        Args:
+            run_time (float): Seconds since the shape started.
+
+        Returns:
+            bool: True when the test should stop.
+        """
+        return bool(self.time_limit) and run_time > self.time_limit
+
+    def result(self, user_count: int, spawn_rate: float = None):
+        """
+        Builds the tick result, limited to the configured user classes if any.
+
+        Args:
+            user_count (int): Total user count.
+            spawn_rate (float, optional): Users to start or stop per second.
+
+        Returns:
+            tuple: The tick result.
+        """
+        spawn_rate = spawn_rate or self.spawn_rate
+        if not self.user_classes:
+            return user_count, spawn_rate
+        user_classes = [self.runner.user_classes_by_name[name.strip()] for name in self.user_classes.split(",")]
+        return user_count, spawn_rate, user_classes
+
+    def status_code_stats(self):
+        """
+        Returns the status code stats the SLO based shapes measure with.
+
+        Returns:
+            StatusCodeStats: The stats of the runner environment.
+        """
+        stats = getattr(self.runner.environment, "status_code_stats", None)
+        if stats is None:
+            raise LocustError("The status code stats are required, import src.stats.status_codes in the locustfile.")
+        return stats
+
+
+class StepLoadShape(GrpcLoadShape):
+    """
+    Adds step_users every step_time seconds up to max_users.
+    """
+    abstract = True
+    step_users = 10
+    step_time = 60.0
+    max_users = 100
+
+    def tick(self):
+        run_time = self.get_run_time()
+        if self.time_limit_reached(run_time):
+            return None
+        user_count = min(self.max_users, (int(run_time // self.step_time) + 1) * self.step_users)
+        return self.result(user_count)
+
+
+class RampToBreakShape(GrpcLoadShape):
+    """
+    Adds ramp_users every ramp_interval seconds until the p99 SLO or the failure ratio is broken.
+
+    Each interval is judged on its own, the test stops at the first interval that
+    breaks and logs the user count and throughput of the breaking point.
+    """
+    abstract = True
+    method_prefix = ""
+    ramp_users = 5
+    ramp_interval = 30.0
+    max_users = 2000
+    p99_slo_ms = 500.0
+    max_fail_ratio = 0.01
+
+    def __init__(self):
+        super().__init__()
+        self._step = -1
+        self._window = None
+
+    def tick(self):
+        run_time = self.get_run_time()
+        if self.time_limit_reached(run_time):
+            return None
+
+        step = int(run_time // self.ramp_interval)
+        if step != self._step:
+            if self._window is not None:
+                rps, p99, fail_ratio = self._window.measure()
+                user_count = min(self.max_users, (self._step + 1) * self.ramp_users)
+                logging.info("Ramp step %d users: %.1f req/s, p99 %.1f ms, fail ratio %.4f", user_count, rps, p99, fail_ratio)
+                if p99 > self.p99_slo_ms or fail_ratio > self.max_fail_ratio:
+                    logging.info("Breaking point reached at %d users (%.1f req/s)", user_count, rps)
+                    return None
+            self._step = step
+            self._window = SloWindow(self.status_code_stats(), self.method_prefix)
+
+        return self.result(min(self.max_users, (step + 1) * self.ramp_users))
+
+
+class DiurnalShape(GrpcLoadShape):
+    """
+    Replays a daily load curve compressed into period seconds.
+
+    The curve is either a comma separated hourly profile of relative load
+    scaled to peak_users, or a CSV file of time,users rows. User counts are
+    interpolated linearly between points.
+    """
+    abstract = True
+    profile = "1.0"
+    profile_file = ""
+    peak_users = 100
+    period = 1440.0
+    cycles = 1
+
+    def __init__(self):
+        super().__init__()
+        self._points = None
+
+    def load_points(self):
+        """
+        Builds the (time, users) points of one cycle.
+
+        Returns:
+            list: Sorted list of (seconds, users) tuples.
+        """
+        if self.profile_file:
+            with open(self.profile_file, newline="") as file:
+                points = [(float(row["time"]), float(row["users"])) for row in csv.DictReader(file)]
+            self.period = max(point[0] for point in points)
+            return sorted(points)
+
+        weights = [float(weight) for weight in self.profile.split(",")]
+        step = self.period / len(weights)
+        points = [(index * step, weight * self.peak_users) for index, weight in enumerate(weights)]
+        # Close the cycle so the last hour interpolates back to the first one
+        points.append((self.period, points[0][1]))
+        return points
+
+    def tick(self):
+        if self._points is None:
+            self._points = self.load_points()
+
+        run_time = self.get_run_time()
+        if run_time >= self.period * self.cycles or self.time_limit_reached(run_time):
+            return None
+
+        offset = run_time % self.period
+        points = self._points
+        user_count = points[-1][1]
+        for (start, start_users), (end, end_users) in zip(points, points[1:]):
+            if start <= offset < end:
+                user_count = start_users + (end_users - start_users) * (offset - start) / (end - start)
+                break
+        return self.result(max(1, round(user_count)))
+
+
+class SpikeShape(GrpcLoadShape):
+    """
+    Holds base_users, jumps to spike_users for spike_duration seconds and then watches the recovery.
+    """
+    abstract = True
+    base_users = 10
+    spike_users = 200
+    warmup = 60.0
+    spike_duration = 60.0
+    recovery = 180.0
+
+    def tick(self):
+        run_time = self.get_run_time()
+        if self.time_limit_reached(run_time):
+            return None
+        if run_time < self.warmup:
+            return self.result(self.base_users)
+        if run_time < self.warmup + self.spike_duration:
+            return self.result(self.spike_users)
+        if run_time < self.warmup + self.spike_duration + self.recovery:
+            return self.result(self.base_users)
+        return None
+
+
+class MaxRpsSearchShape(GrpcLoadShape):
+    """
+    Searches the highest throughput that still meets a p99 SLO.
+
+    Each probe runs a user count for settle_time seconds, then measures the
+    methods matching method_prefix for measure_time seconds. The user count grows
+    by growth_factor while the SLO holds and is then bisected between the last
+    passing and the first failing count until they are resolution users apart.
+    The best passing probe is the maximum sustainable throughput.
+    """
+    abstract = True
+    method_prefix = "/pb.VacancyService/"
+    start_users = 10
+    growth_factor = 2.0
+    max_users = 5000
+    resolution = 5
+    settle_time = 20.0
+    measure_time = 40.0
+    p99_slo_ms = 300.0
+    max_fail_ratio = 0.01
+    report_file = ""
+
+    def __init__(self):
+        super().__init__()
+        self.probes = []
+        self._user_count = None
+        self._probe_start = None
+        self._window = None
+        self._passing = 0
+        self._failing = None
+
+    def start_probe(self, user_count: int, run_time: float):
+        """
+        Starts running a new user count.
+
+        Args:
+            user_count (int): Users of the probe.
+            run_time (float): Current run time in seconds.
+        """
+        self._user_count = user_count
+        self._probe_start = run_time
+        self._window = None
+
+    def next_user_count(self, passed: bool):
+        """
+        Picks the user count of the next probe.
+
+        Args:
+            passed (bool): Whether the finished probe met the SLO.
+
+        Returns:
+            int: The next user count, None when the search is over.
+        """
+        if passed:
+            self._passing = self._user_count
+        else:
+            self._failing = self._user_count
+
+        if self._failing is None:
+            if self._user_count >= self.max_users:
+                return None
+            return min(self.max_users, max(self._user_count + 1, math.ceil(self._user_count * self.growth_factor)))
+
+        if self._failing - self._passing <= self.resolution:
+            return None
+        return (self._passing + self._failing) // 2
+
+    def finish(self):
+        """
+        Logs the search result and writes the probes report.
+        """
+        passing = [probe for probe in self.probes if probe["passed"]]
+        if passing:
+            best = max(passing, key=lambda probe: probe["rps"])
+            logging.info(
+                "Max sustainable throughput: %.1f req/s with %d users (p99 %.1f ms, SLO %.1f ms)",
+                best["rps"], best["users"], best["p99"], self.p99_slo_ms,
+            )
+        else:
+            logging.info("No probe met the p99 SLO of %.1f ms", self.p99_slo_ms)
+
+        if self.report_file:
+            with open(self.report_file, "w", newline="") as file:
+                writer = csv.DictWriter(file, fieldnames=["users", "rps", "p99", "fail_ratio", "passed"])
+                writer.writeheader()
+                writer.writerows(self.probes)
+
+    def tick(self):
+        run_time = self.get_run_time()
+        if self.time_limit_reached(run_time):
+            self.finish()
+            return None
+        if self._user_count is None:
+            self.start_probe(self.start_users, run_time)
+
+        elapsed = run_time - self._probe_start
+        if elapsed >= self.settle_time and self._window is None:
+            self._window = SloWindow(self.status_code_stats(), self.method_prefix)
+
+        if elapsed >= self.settle_time + self.measure_time:
+            rps, p99, fail_ratio = self._window.measure()
+            # A probe without traffic proves nothing, make settle_time and measure_time cover the wait times
+            passed = rps > 0 and p99 <= self.p99_slo_ms and fail_ratio <= self.max_fail_ratio
+            self.probes.append({
+                "users": self._user_count,
+                "rps": round(rps, 2),
+                "p99": round(p99, 2),
+                "fail_ratio": round(fail_ratio, 4),
+                "passed": passed,
+            })
+            logging.info(
+                "Probe %d users: %.1f req/s, p99 %.1f ms, fail ratio %.4f, %s",
+                self._user_count, rps, p99, fail_ratio, "passed" if passed else "failed",
+            )
+            user_count = self.next_user_count(passed)
+            if user_count is None or user_count <= 0:
+                self.finish()
+                return None
+            self.start_probe(user_count, run_time)
+
+        return self.result(self._user_count)
+
+
+SHAPE_TYPES = {
+    "step": StepLoadShape,
+    "ramp-to-break": RampToBreakShape,
+    "diurnal": DiurnalShape,
+    "spike": SpikeShape,
+    "max-rps": MaxRpsSearchShape,
+}
+
+
+def create_load_shape(name: str, path: str = LOAD_SHAPES_PATH):
+    """
+    Creates and configures a load shape from a section of the load shapes config.
+
+    Args:
+        name (str): Section name, e.g. "max-rps".
+        path (str, optional): Path of the load shapes config file.
+
+    Returns:
+        GrpcLoadShape: The configured shape.
+    """
+    parser = configparser.ConfigParser()
+    if not parser.read(path):
+        raise LocustError(f"Load shapes file {path} could not be read.")
+    if not parser.has_section(name):
+        raise LocustError(f"Unknown load shape {name}, available shapes: {', '.join(parser.sections())}.")
+
+    params = dict(parser.items(name))
+    shape_type = params.get("type", name)
+    if shape_type not in SHAPE_TYPES:
+        raise LocustError(f"Unknown load shape type {shape_type}, available types: {', '.join(SHAPE_TYPES)}.")
+
+    shape = SHAPE_TYPES[shape_type]()
+    shape.configure(params)
+    return shape
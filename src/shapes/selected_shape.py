@@ -0,0 +1,49 @@
+"""
+Module: selected_shape
+Description: Locustfile providing the load shape selected with the load-shape option.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+from locust import LoadTestShape, events
+
+from src.shapes.load_shapes import LOAD_SHAPES_PATH, MaxRpsSearchShape, create_load_shape
+
+
+@events.init_command_line_parser.add_listener
+def on_init_command_line_parser(parser, **kwargs):
+    """
+    Adds the load shape options to Locust so they can be set from task.config.
+    """
+    parser.add_argument("--load-shape", type=str, default="step", help="Section of config/load_shapes.config to run")
+    parser.add_argument("--load-shapes-file", type=str, default=LOAD_SHAPES_PATH, help="Load shapes config file")
+
+
+class SelectedLoadShape(LoadTestShape):
+    """
+    Delegates to the load shape named by the load-shape option.
+
+    The shape is created on the first tick, once the command line options are parsed.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.shape = None
+
+    def reset_time(self):
+        super().reset_time()
+        if self.shape is not None:
+            self.shape.reset_time()
+
+    def tick(self):
+        if self.shape is None:
+            options = self.runner.environment.parsed_options
+            self.shape = create_load_shape(options.load_shape, options.load_shapes_file)
+            self.shape.runner = self.runner
+            self.shape.start_time = self.start_time
+            if isinstance(self.shape, MaxRpsSearchShape) and not self.shape.report_file and options.csv_prefix:
+                self.shape.report_file = f"{options.csv_prefix}_capacity.csv"
+        return self.shape.tick()
+
+# Command to run the Locust test with a load shape
+# locust -f src/main.py,src/shapes/selected_shape.py --config config/task.config --load-shape max-rps
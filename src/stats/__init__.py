@@ -0,0 +1,8 @@
+"""
+Module: stats
+Description: Initializes the stats module.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+# No specific initialization code required for this module
@@ -0,0 +1,377 @@
+"""
+Module: columnar_export
+Description: Writes per-request events and per-second aggregates to Parquet or Arrow files during the run.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import gevent
+import locust
+from locust import events
+from locust.exception import LocustError
+from locust.runners import MasterRunner, WorkerRunner
+
+from src.stats.rolling_windows import PERCENTILES
+
+COLUMNAR_FORMATS = ("parquet", "arrow")
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+
+
+def _import_pyarrow():
+    """
+    Imports pyarrow, which is only needed when the columnar export is enabled.
+
+    Returns:
+        module: The pyarrow module.
+    """
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise LocustError("The columnar export needs pyarrow, install it with: pip install pyarrow")
+    return pyarrow
+
+
+def event_schema(pa):
+    """
+    Returns the schema of the events files, one row per call.
+    """
+    return pa.schema([
+        ("timestamp", pa.timestamp("us", tz="UTC")),
+        ("worker", pa.string()),
+        ("method", pa.string()),
+        ("status_code", pa.string()),
+        ("failed", pa.bool_()),
+        ("response_time_ms", pa.float64()),
+        ("request_bytes", pa.int64()),
+        ("response_bytes", pa.int64()),
+        ("user_id", pa.string()),
+        ("channel", pa.string()),
+        ("trace_id", pa.string()),
+    ])
+
+
+def aggregate_schema(pa):
+    """
+    Returns the schema of the aggregates files, one row per second and method.
+    """
+    fields = [
+        ("second", pa.timestamp("s", tz="UTC")),
+        ("method", pa.string()),
+        ("requests", pa.int64()),
+        ("failures", pa.int64()),
+        ("average_ms", pa.float64()),
+        ("max_ms", pa.float64()),
+    ]
+    fields += [(f"p{int(fraction * 100)}_ms", pa.float64()) for fraction in PERCENTILES]
+    return pa.schema(fields)
+
+
+def _git_sha():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, timeout=5, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def run_metadata(environment, node: str):
+    """
+    Describes the run, stored in the schema metadata of every file.
+
+    Args:
+        environment: The Locust environment.
+        node (str): Name of the process writing the file.
+
+    Returns:
+        dict: Metadata keys mapped to strings.
+    """
+    options = environment.parsed_options
+    runner = environment.runner
+    if isinstance(runner, MasterRunner):
+        worker_count = runner.worker_count
+    elif isinstance(runner, WorkerRunner):
+        worker_count = ""
+    else:
+        worker_count = 1
+    config = {
+        key: value for key, value in vars(options).items()
+        if isinstance(value, (str, int, float, bool, list, type(None)))
+    }
+    return {
+        "run_started_at": datetime.now(timezone.utc).isoformat(),
+        "git_sha": _git_sha(),
+        "target_host": environment.host or "",
+        "hostname": socket.gethostname(),
+        "node": node,
+        "worker_count": str(worker_count),
+        "locust_version": locust.__version__,
+        "config": json.dumps(config, default=str),
+    }
+
+
+class ColumnarWriter:
+    """
+    Appends rows to a Parquet or Arrow IPC file, one row group per row_group_size rows.
+
+    Rows are buffered as tuples and turned into columns when a row group is
+    full. The encoding and the disk write run on gevent's thread pool, so the
+    users keep running while a row group is written. Row groups are written
+    one at a time and in order.
+    """
+
+    def __init__(self, path: str, schema, file_format: str = "parquet", row_group_size: int = 65536,
+                 metadata: dict = None):
+        pa = _import_pyarrow()
+        self.pa = pa
+        self.path = path
+        self.schema = schema.with_metadata(metadata or {})
+        self.row_group_size = row_group_size
+        self.rows = []
+        self.written = 0
+        self._pending = None
+        if file_format == "parquet":
+            self.writer = pa.parquet.ParquetWriter(path, self.schema, compression="zstd")
+            self._write_table = lambda table: self.writer.write_table(table, row_group_size=row_group_size)
+        else:
+            self.writer = pa.ipc.new_file(path, self.schema)
+            self._write_table = self.writer.write_table
+
+    def append(self, row: tuple):
+        """
+        Adds a row, writing a row group when enough rows are buffered.
+
+        Args:
+            row (tuple): Values in schema order.
+        """
+        self.rows.append(row)
+        if len(self.rows) >= self.row_group_size:
+            self.flush()
+
+    def _wait(self):
+        if self._pending is not None:
+            self._pending.get()
+            self._pending = None
+
+    def flush(self):
+        """
+        Writes the buffered rows as a row group.
+        """
+        rows, self.rows = self.rows, []
+        if not rows:
+            return
+        self._wait()
+        self._pending = gevent.get_hub().threadpool.spawn(self._write, rows)
+
+    def _write(self, rows: list):
+        columns = list(zip(*rows))
+        arrays = [self.pa.array(column, type=field.type) for column, field in zip(columns, self.schema)]
+        self._write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+        self.written += len(rows)
+
+    def close(self):
+        """
+        Writes the remaining rows and closes the file.
+        """
+        self.flush()
+        self._wait()
+        self.writer.close()
+
+
+class ColumnarExport:
+    """
+    Writes the events of one process and, on the master or in local mode, the per-second aggregates.
+
+    Every process writes its own events file, shipping every call to the
+    master would cost more than the calls. The aggregates are the seconds of
+    the rolling window stats, which on the master hold the data of all workers.
+    """
+
+    def __init__(self, environment, directory: str, file_format: str, row_group_size: int, event_sample: float):
+        self.environment = environment
+        self.directory = directory
+        self.file_format = file_format
+        self.row_group_size = row_group_size
+        self.event_sample = event_sample
+        self.events = None
+        self.aggregates = None
+        self.node = "local"
+        self._next_second = 0
+        self._greenlet = None
+        self._closing = None
+
+    def start(self):
+        """
+        Opens the files of a new test.
+        """
+        self._close_aggregates()
+        pa = _import_pyarrow()
+        runner = self.environment.runner
+        if isinstance(runner, WorkerRunner):
+            self.node = f"worker{runner.worker_index}"
+        elif isinstance(runner, MasterRunner):
+            self.node = "master"
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        extension = "parquet" if self.file_format == "parquet" else "arrow"
+        metadata = run_metadata(self.environment, self.node)
+        if not isinstance(runner, MasterRunner) and self.event_sample > 0:
+            self.events = ColumnarWriter(
+                os.path.join(self.directory, f"events-{self.node}-{stamp}.{extension}"),
+                event_schema(pa), self.file_format, self.row_group_size, metadata,
+            )
+        if not isinstance(runner, WorkerRunner):
+            if getattr(self.environment, "rolling_window_stats", None) is None:
+                logging.warning("The per-second aggregates need the rolling window stats, enable --stat-windows")
+            else:
+                self.aggregates = ColumnarWriter(
+                    os.path.join(self.directory, f"aggregates-{stamp}.{extension}"),
+                    aggregate_schema(pa), self.file_format, self.row_group_size, metadata,
+                )
+                self._next_second = int(time.time())
+                self._greenlet = gevent.spawn(self._write_aggregates_loop)
+        logging.info("Writing %s files to %s", self.file_format, self.directory)
+
+    def log(self, name: str, response_time: float, status_code: str, failed: bool, request_length: int,
+            response_length: int, context: dict, trace_id: str, now: float = None):
+        """
+        Adds a finished call to the events file, stamped with now, the epoch time it finished.
+        """
+        if self.events is None or (self.event_sample < 1.0 and random.random() >= self.event_sample):
+            return
+        context = context or {}
+        self.events.append((
+            int((now if now is not None else time.time()) * 1e6),
+            self.node,
+            name,
+            status_code,
+            failed,
+            response_time,
+            request_length,
+            response_length,
+            context.get("user_id"),
+            context.get("channel"),
+            trace_id,
+        ))
+
+    def _write_aggregates(self, final: bool = False):
+        stats = self.environment.rolling_window_stats
+        # Seconds are complete once the rolling windows stop waiting for worker reports,
+        # the final write only runs after the last reports, see stop()
+        until = int(time.time()) - 1 - (0 if final else stats.delay)
+        for second in range(self._next_second, until + 1):
+            for method in sorted(stats.rings):
+                slot = stats.rings[method][second % stats.size]
+                if slot is None or slot[0] != second:
+                    continue
+                histogram = slot[1]
+                self.aggregates.append((
+                    second, method, histogram.count, slot[2], histogram.average, histogram.max,
+                    *(histogram.percentile(fraction) for fraction in PERCENTILES),
+                ))
+        self._next_second = max(self._next_second, until + 1)
+
+    def _write_aggregates_loop(self):
+        while True:
+            gevent.sleep(1)
+            self._write_aggregates()
+
+    def _close_aggregates(self):
+        if self._greenlet is not None:
+            self._greenlet.kill()
+            self._greenlet = None
+        if self._closing is not None and self._closing is not gevent.getcurrent():
+            self._closing.kill()
+        self._closing = None
+        if self.aggregates is not None:
+            self._write_aggregates(final=True)
+            self.aggregates.close()
+            logging.info("Wrote %d rows to %s", self.aggregates.written, self.aggregates.path)
+            self.aggregates = None
+
+    def stop(self, wait_for_workers: bool = True):
+        """
+        Writes the remaining rows and closes the files of the test.
+
+        The master fires test_stop as soon as the workers have stopped, but their
+        last reports arrive up to a report interval later. So on the master the
+        aggregates are written for the rolling window delay before the final write.
+
+        Args:
+            wait_for_workers (bool): False closes the aggregates right away, as on quitting.
+        """
+        if self.events is not None:
+            self.events.close()
+            logging.info("Wrote %d rows to %s", self.events.written, self.events.path)
+            self.events = None
+        if self.aggregates is None:
+            return
+        if wait_for_workers and isinstance(self.environment.runner, MasterRunner):
+            if self._closing is None:
+                delay = self.environment.rolling_window_stats.delay
+                self._closing = gevent.spawn_later(delay, self._close_aggregates)
+        else:
+            self._close_aggregates()
+
+
+@events.init_command_line_parser.add_listener
+def on_init_command_line_parser(parser, **kwargs):
+    """
+    Adds the columnar export options to Locust so they can be set from task.config.
+    """
+    parser.add_argument("--columnar-export", type=str, default="", help="Directory the Parquet or Arrow files are written to")
+    parser.add_argument("--columnar-format", choices=COLUMNAR_FORMATS, default="parquet", help="File format of the columnar export")
+    parser.add_argument("--columnar-row-group", type=int, default=65536, help="Rows per row group")
+    parser.add_argument(
+        "--columnar-event-sample",
+        type=float,
+        default=1.0,
+        help="Fraction of the calls written to the events file, 0 only writes the aggregates",
+    )
+
+
+@events.init.add_listener
+def on_locust_init(environment, **kwargs):
+    """
+    Wires the columnar export to the test lifecycle.
+    """
+    options = environment.parsed_options
+    directory = getattr(options, "columnar_export", "")
+    if not directory:
+        return
+    _import_pyarrow()
+    export = ColumnarExport(
+        environment, directory, options.columnar_format, options.columnar_row_group, options.columnar_event_sample
+    )
+    environment.columnar_export = export
+
+    @environment.events.test_start.add_listener
+    def on_test_start(**kwargs):
+        export.start()
+
+    @environment.events.request.add_listener
+    def on_request(request_type, name, response_time, response_length=0, exception=None, status_code=None,
+                   request_length=0, context=None, trace_id=None, start_time=None, **kwargs):
+        if request_type == "grpc":
+            now = start_time + response_time / 1000 if start_time is not None else None
+            export.log(name, response_time, status_code, exception is not None, request_length or 0,
+                       response_length or 0, context, trace_id, now)
+
+    @environment.events.test_stop.add_listener
+    def on_test_stop(**kwargs):
+        export.stop()
+
+    @environment.events.quitting.add_listener
+    def on_quitting(**kwargs):
+        export.stop(wait_for_workers=False)
@@ -0,0 +1,308 @@
+"""
+Module: generator_health
+Description: Monitors the CPU, greenlet scheduling lag and GC pauses of the load generators and guards against saturation.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import csv
+import gc
+import logging
+import time
+
+import gevent
+import psutil
+from locust import events
+from locust.runners import MasterRunner, WorkerRunner
+
+SAMPLE_FIELDS = [
+    "Timestamp", "Worker", "CPU %", "Average Lag", "Max Lag",
+    "GC Pause", "Max GC Pause", "GC Collections", "Users", "Saturated",
+]
+SATURATION_ACTIONS = ("warn", "fail", "stop")
+
+
+class HealthMonitor:
+    """
+    Samples the health of one load generator process every interval seconds.
+
+    The scheduling lag is how late a greenlet sleeping tick seconds wakes up.
+    It is the delay every response time measured in the same process picks up
+    on top of the real latency. A sample is saturated when the CPU or the lag
+    is over its limit, window saturated samples in a row saturate the generator.
+    """
+
+    def __init__(self, environment, interval: float = 1.0, tick: float = 0.05,
+                 cpu_limit: float = 90.0, lag_limit: float = 50.0, window: int = 5):
+        self.environment = environment
+        self.interval = interval
+        self.tick = tick
+        self.cpu_limit = cpu_limit
+        self.lag_limit = lag_limit
+        self.window = window
+        self.process = psutil.Process()
+        self.samples = []
+        self.latest = None
+        self.saturated_streak = 0
+        self.gc_pause_seconds_total = 0.0
+        self._greenlets = []
+        self._gc_start = None
+        self._reset_window()
+
+    def _reset_window(self):
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self.lag_count = 0
+        self.gc_pause = 0.0
+        self.gc_pause_max = 0.0
+        self.gc_collections = 0
+
+    def _on_gc(self, phase, info):
+        if phase == "start":
+            self._gc_start = time.perf_counter()
+        elif self._gc_start is not None:
+            pause = time.perf_counter() - self._gc_start
+            self._gc_start = None
+            self.gc_pause += pause
+            self.gc_pause_max = max(self.gc_pause_max, pause)
+            self.gc_pause_seconds_total += pause
+            self.gc_collections += 1
+
+    def _measure_lag(self):
+        while True:
+            expected = time.perf_counter() + self.tick
+            gevent.sleep(self.tick)
+            lag = max(time.perf_counter() - expected, 0.0)
+            self.lag_total += lag
+            self.lag_count += 1
+            if lag > self.lag_max:
+                self.lag_max = lag
+
+    def _sample_loop(self):
+        self.process.cpu_percent()
+        while True:
+            gevent.sleep(self.interval)
+            self.sample()
+
+    def sample(self):
+        """
+        Closes the current window and records its sample.
+
+        Returns:
+            list: The sample, a row of SAMPLE_FIELDS without the worker.
+        """
+        cpu = self.process.cpu_percent()
+        lag_average = self.lag_total / self.lag_count * 1000 if self.lag_count else 0.0
+        lag_max = self.lag_max * 1000
+        saturated = cpu >= self.cpu_limit or lag_max >= self.lag_limit
+        self.saturated_streak = self.saturated_streak + 1 if saturated else 0
+        runner = self.environment.runner
+        sample = [
+            round(time.time(), 3),
+            round(cpu, 1),
+            round(lag_average, 2),
+            round(lag_max, 2),
+            round(self.gc_pause * 1000, 2),
+            round(self.gc_pause_max * 1000, 2),
+            self.gc_collections,
+            runner.user_count if runner else 0,
+            self.saturated_streak >= self.window,
+        ]
+        self._reset_window()
+        self.latest = sample
+        self.samples.append(sample)
+        return sample
+
+    def take_samples(self):
+        """
+        Returns the samples taken since the last call and forgets them.
+
+        Returns:
+            list: The samples.
+        """
+        samples, self.samples = self.samples, []
+        return samples
+
+    def start(self):
+        """
+        Starts sampling.
+        """
+        if self._greenlets:
+            return
+        gc.callbacks.append(self._on_gc)
+        self._greenlets = [gevent.spawn(self._measure_lag), gevent.spawn(self._sample_loop)]
+
+    def stop(self):
+        """
+        Stops sampling.
+        """
+        gevent.killall(self._greenlets)
+        self._greenlets = []
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+
+
+class HealthReport:
+    """
+    Writes the health samples of all load generators and acts on saturation.
+
+    Samples are appended to the CSV file as they arrive instead of being kept,
+    so long runs with many workers do not grow the master's memory.
+    """
+
+    def __init__(self, environment, file_path: str = None, action: str = "warn"):
+        self.environment = environment
+        self.action = action
+        self.file = open(file_path, "w", newline="") if file_path else None
+        self.writer = None
+        if self.file:
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(SAMPLE_FIELDS)
+        self.saturated_seconds = {}
+        self.max_cpu = {}
+        self.max_lag = {}
+        self._saturated = set()
+
+    def add(self, worker: str, samples: list, interval: float):
+        """
+        Records the samples of one load generator.
+
+        Args:
+            worker (str): Worker ID, "local" in local mode.
+            samples (list): Samples returned by HealthMonitor.take_samples().
+            interval (float): Seconds between the samples.
+        """
+        for sample in samples:
+            if self.writer:
+                self.writer.writerow([sample[0], worker, *sample[1:]])
+            self.max_cpu[worker] = max(self.max_cpu.get(worker, 0.0), sample[1])
+            self.max_lag[worker] = max(self.max_lag.get(worker, 0.0), sample[3])
+            if sample[-1]:
+                self.saturated_seconds[worker] = self.saturated_seconds.get(worker, 0.0) + interval
+                if worker not in self._saturated:
+                    self._saturated.add(worker)
+                    self._on_saturated(worker, sample)
+            else:
+                self._saturated.discard(worker)
+        if self.file:
+            self.file.flush()
+
+    def _on_saturated(self, worker: str, sample: list):
+        logging.warning(
+            "Load generator %s is saturated (CPU %.0f%%, scheduling lag up to %.1fms), response times are inflated",
+            worker, sample[1], sample[3],
+        )
+        if self.action in ("fail", "stop"):
+            self.environment.process_exit_code = 1
+        if self.action == "stop" and self.environment.runner is not None:
+            logging.warning("Stopping the test, the load generators are saturated")
+            gevent.spawn(self.environment.runner.quit)
+
+    def log_summary(self):
+        """
+        Logs the peak CPU and lag of each load generator and how long it was saturated.
+        """
+        for worker in sorted(self.max_cpu):
+            logging.info(
+                "Load generator %s: peak CPU %.0f%%, peak scheduling lag %.1fms, saturated for %.0fs",
+                worker, self.max_cpu[worker], self.max_lag[worker], self.saturated_seconds.get(worker, 0.0),
+            )
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+@events.init_command_line_parser.add_listener
+def on_init_command_line_parser(parser, **kwargs):
+    """
+    Adds the load generator health options to Locust so they can be set from task.config.
+    """
+    parser.add_argument("--health-interval", type=float, default=1.0, help="Seconds between load generator health samples, 0 disables")
+    parser.add_argument("--saturation-cpu", type=float, default=90.0, help="CPU percent of a load generator process counted as saturated")
+    parser.add_argument(
+        "--saturation-lag",
+        type=float,
+        default=50.0,
+        help="Greenlet scheduling lag in milliseconds counted as saturated",
+    )
+    parser.add_argument(
+        "--saturation-window",
+        type=int,
+        default=5,
+        help="Saturated samples in a row before a load generator is flagged",
+    )
+    parser.add_argument(
+        "--saturation-action",
+        choices=SATURATION_ACTIONS,
+        default="warn",
+        help="What to do when a load generator is saturated: log a warning, also fail the run's exit code, or stop the test",
+    )
+
+
+@events.init.add_listener
+def on_locust_init(environment, **kwargs):
+    """
+    Starts the health monitor on load generating processes and the report on the master or in local mode.
+    """
+    options = environment.parsed_options
+    interval = getattr(options, "health_interval", 0)
+    if not interval:
+        return
+    runner = environment.runner
+    monitor = None
+    report = None
+    if not isinstance(runner, MasterRunner):
+        monitor = environment.generator_health = HealthMonitor(
+            environment,
+            interval=interval,
+            cpu_limit=options.saturation_cpu,
+            lag_limit=options.saturation_lag,
+            window=options.saturation_window,
+        )
+    if not isinstance(runner, WorkerRunner):
+        csv_prefix = getattr(options, "csv_prefix", None)
+        report = HealthReport(
+            environment,
+            f"{csv_prefix}_generator_health.csv" if csv_prefix else None,
+            action=options.saturation_action,
+        )
+
+    @environment.events.test_start.add_listener
+    def on_test_start(**kwargs):
+        if monitor is not None:
+            monitor.start()
+
+    @environment.events.test_stop.add_listener
+    def on_test_stop(**kwargs):
+        if monitor is not None:
+            monitor.stop()
+
+    @environment.events.report_to_master.add_listener
+    def on_report_to_master(client_id, data, **kwargs):
+        data["generator_health"] = monitor.take_samples()
+
+    @environment.events.worker_report.add_listener
+    def on_worker_report(client_id, data, **kwargs):
+        report.add(client_id, data.get("generator_health", []), interval)
+
+    if report is not None and monitor is not None:
+        # Local mode has no worker reports, pick the samples up at the same pace
+        def forward_local_samples():
+            while True:
+                gevent.sleep(interval)
+                report.add("local", monitor.take_samples(), interval)
+
+        environment.generator_health_forwarder = gevent.spawn(forward_local_samples)
+
+    @environment.events.quitting.add_listener
+    def on_quitting(environment, **kwargs):
+        if monitor is not None:
+            monitor.stop()
+        if report is not None:
+            forwarder = getattr(environment, "generator_health_forwarder", None)
+            if forwarder is not None:
+                forwarder.kill()
+                report.add("local", monitor.take_samples(), interval)
+            report.log_summary()
+            report.close()
@@ -0,0 +1,303 @@
+"""
+Module: histogram
+Description: Provides a mergeable log-linear latency histogram shared by the custom stats collectors.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import struct
+
+SUB_BUCKET_BITS = 6
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+# count, total and max of a packed histogram, followed by its packed bucket counts
+HEADER = struct.Struct("<Qdd")
+# number of keys, smallest key and the formats of the key offsets and of the counts
+COUNTS_HEADER = struct.Struct("<Iq2s")
+
+
+def _integer_format(largest: int):
+    for fmt, limit in (("B", 1 << 8), ("H", 1 << 16), ("I", 1 << 32)):
+        if largest < limit:
+            return fmt
+    return "Q"
+
+
+def pack_counts(counts: dict):
+    """
+    Packs a dictionary of integer keys to counts, e.g. histogram buckets.
+
+    Keys are stored as offsets from the smallest key, keys and counts each in
+    the narrowest unsigned integer type that holds them.
+
+    Args:
+        counts (dict): Non-negative integer counts keyed by integers.
+
+    Returns:
+        bytes: The packed counts.
+    """
+    if not counts:
+        return COUNTS_HEADER.pack(0, 0, b"BB")
+    base = min(counts)
+    offsets = [key - base for key in counts]
+    values = list(counts.values())
+    formats = _integer_format(max(offsets)) + _integer_format(max(values))
+    size = len(offsets)
+    return COUNTS_HEADER.pack(size, base, formats.encode()) + struct.pack(
+        f"<{size}{formats[0]}{size}{formats[1]}", *offsets, *values
+    )
+
+
+def merge_packed_counts(target: dict, data: bytes, offset: int = 0):
+    """
+    Adds packed counts to a dictionary.
+
+    Args:
+        target (dict): Counts to add to.
+        data (bytes): Buffer holding pack_counts() output.
+        offset (int, optional): Position of the packed counts in the buffer.
+
+    Returns:
+        int: Position right after the packed counts.
+    """
+    size, base, formats = COUNTS_HEADER.unpack_from(data, offset)
+    layout = struct.Struct(f"<{size}{formats[:1].decode()}{size}{formats[1:].decode()}")
+    values = layout.unpack_from(data, offset + COUNTS_HEADER.size)
+    keys = map(base.__add__, values[:size]) if base else values[:size]
+    for key, count in zip(keys, values[size:]):
+        target[key] = target.get(key, 0) + count
+    return offset + COUNTS_HEADER.size + layout.size
+
+
+def bucket_index(value_us: int):
+    """
+    Maps a value in microseconds to its bucket index.
+
+    Values below SUB_BUCKET_COUNT get one bucket each, larger values share a
+    bucket with neighbours within 1/SUB_BUCKET_COUNT (~1.6%) of them.
+
+    Args:
+        value_us (int): Value in microseconds.
+
+    Returns:
+        int: The bucket index.
+    """
+    if value_us < SUB_BUCKET_COUNT:
+        return value_us if value_us > 0 else 0
+    shift = value_us.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift << SUB_BUCKET_BITS) + (value_us >> shift)
+
+
+def bucket_lower_bound(index: int):
+    """
+    Returns the smallest value in microseconds that falls into a bucket.
+
+    Args:
+        index (int): The bucket index.
+
+    Returns:
+        int: Lower bound of the bucket in microseconds.
+    """
+    if index < 2 * SUB_BUCKET_COUNT:
+        return index
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    return (index - (shift << SUB_BUCKET_BITS)) << shift
+
+
+class LatencyHistogram:
+    """
+    Sparse log-linear histogram of response times.
+
+    Response times are recorded in milliseconds (as Locust reports them) and
+    stored in microsecond buckets, so histograms from different users,
+    workers or time windows can be merged by adding bucket counts.
+    """
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value_ms: float, count: int = 1):
+        """
+        Records a response time.
+
+        Args:
+            value_ms (float): Response time in milliseconds.
+            count (int, optional): Number of occurrences to record.
+        """
+        index = bucket_index(int(value_ms * 1000))
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+        self.total += value_ms * count
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def merge(self, other: "LatencyHistogram"):
+        """
+        Adds the counts of another histogram to this one.
+
+        Args:
+            other (LatencyHistogram): The histogram to merge in.
+        """
+        buckets = self.buckets
+        for index, count in other.buckets.items():
+            buckets[index] = buckets.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.max > self.max:
+            self.max = other.max
+
+    def difference(self, earlier: "LatencyHistogram"):
+        """
+        Returns what was recorded since an earlier copy of this histogram was taken.
+
+        Args:
+            earlier (LatencyHistogram): An earlier copy of this histogram.
+
+        Returns:
+            LatencyHistogram: Histogram of the values recorded in between. Its max is
+            the overall max, as it cannot be recovered from the buckets.
+        """
+        histogram = LatencyHistogram()
+        for index, count in self.buckets.items():
+            count -= earlier.buckets.get(index, 0)
+            if count > 0:
+                histogram.buckets[index] = count
+        histogram.count = max(self.count - earlier.count, 0)
+        histogram.total = max(self.total - earlier.total, 0.0)
+        histogram.max = self.max
+        return histogram
+
+    def copy(self):
+        """
+        Returns an independent copy of the histogram.
+
+        Returns:
+            LatencyHistogram: The copy.
+        """
+        histogram = LatencyHistogram()
+        histogram.merge(self)
+        return histogram
+
+    def percentile(self, fraction: float):
+        """
+        Returns the response time at the given percentile.
+
+        Args:
+            fraction (float): Percentile as a fraction between 0 and 1.
+
+        Returns:
+            float: Response time in milliseconds, 0 if nothing was recorded.
+        """
+        if not self.count:
+            return 0.0
+        threshold = max(1, int(round(self.count * fraction)))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= threshold:
+                return min(bucket_lower_bound(index) / 1000, self.max)
+        return self.max
+
+    @property
+    def average(self):
+        """
+        float: Average response time in milliseconds.
+        """
+        return self.total / self.count if self.count else 0.0
+
+    def pack(self):
+        """
+        Packs the histogram into bytes for the worker report.
+
+        Returns:
+            bytes: The packed histogram.
+        """
+        return HEADER.pack(self.count, self.total, self.max) + pack_counts(self.buckets)
+
+    def merge_packed(self, data: bytes):
+        """
+        Adds the counts of a packed histogram to this one without building it first.
+
+        Args:
+            data (bytes): Output of pack().
+        """
+        count, total, maximum = HEADER.unpack_from(data)
+        merge_packed_counts(self.buckets, data, HEADER.size)
+        self.count += count
+        self.total += total
+        if maximum > self.max:
+            self.max = maximum
+
+    @classmethod
+    def unpack(cls, data: bytes):
+        """
+        Rebuilds a histogram from pack() output.
+
+        Args:
+            data (bytes): The packed histogram.
+
+        Returns:
+            LatencyHistogram: The rebuilt histogram.
+        """
+        histogram = cls()
+        histogram.merge_packed(data)
+        return histogram
+
+
+class KeyedHistograms:
+    """
+    A set of latency histograms keyed by tuples, e.g. (method, status code).
+
+    On workers the collected data is shipped to the master as a delta on every
+    report and reset, on the master (or in local mode) it accumulates for the
+    whole run.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def record(self, key: tuple, response_time: float):
+        """
+        Records a response time under a key.
+
+        Args:
+            key (tuple): The entry key.
+            response_time (float): Response time in milliseconds.
+        """
+        histogram = self.entries.get(key)
+        if histogram is None:
+            histogram = self.entries[key] = LatencyHistogram()
+        histogram.record(response_time)
+
+    def reset(self):
+        """
+        Drops all collected data.
+        """
+        self.entries = {}
+
+    def serialize(self):
+        """
+        Serializes the collected data for the worker report.
+
+        Returns:
+            list: List of [*key, packed histogram] items.
+        """
+        return [[*key, histogram.pack()] for key, histogram in self.entries.items()]
+
+    def merge(self, data: list):
+        """
+        Merges serialized data received from a worker.
+
+        Args:
+            data (list): Output of serialize() on a worker.
+        """
+        entries = self.entries
+        for item in data:
+            key = tuple(item[:-1])
+            histogram = entries.get(key)
+            if histogram is None:
+                histogram = entries[key] = LatencyHistogram()
+            histogram.merge_packed(item[-1])
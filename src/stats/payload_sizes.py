@@ -0,0 +1,164 @@
+"""
+Module: payload_sizes
+Description: Bins response times by request and response payload size per method.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import csv
+import logging
+
+from locust import events
+from locust.runners import WorkerRunner
+
+from src.stats.histogram import KeyedHistograms
+
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+def size_bin(size: int):
+    """
+    Maps a payload size to its power of two bin, bin k holds sizes from 2^(k-1) to 2^k - 1 bytes.
+
+    Args:
+        size (int): Payload size in bytes.
+
+    Returns:
+        int: The bin, 0 for empty payloads.
+    """
+    return int(size).bit_length() if size > 0 else 0
+
+
+def bin_range(index: int):
+    """
+    Returns the smallest and largest size in bytes of a bin.
+
+    Args:
+        index (int): The bin.
+
+    Returns:
+        tuple: (smallest size, largest size)
+    """
+    if index == 0:
+        return 0, 0
+    return 1 << (index - 1), (1 << index) - 1
+
+
+class PayloadSizeStats(KeyedHistograms):
+    """
+    Collects latency histograms keyed by (method, "request" or "response", size bin).
+
+    Every call is recorded twice, once by its request size and once by its
+    response size, so each direction can be read on its own.
+    """
+
+    def log(self, method: str, request_length: int, response_length: int, response_time: float):
+        """
+        Records a finished call.
+
+        Args:
+            method (str): Full gRPC method name.
+            request_length (int): Serialized request size in bytes.
+            response_length (int): Serialized response size in bytes.
+            response_time (float): Response time in milliseconds.
+        """
+        self.record((method, "request", size_bin(request_length)), response_time)
+        self.record((method, "response", size_bin(response_length)), response_time)
+
+    def rows(self):
+        """
+        Builds one report row per method, direction and size bin, sorted by method, direction then size.
+
+        Returns:
+            list: List of row dictionaries.
+        """
+        rows = []
+        for (method, direction, index), histogram in sorted(self.entries.items()):
+            smallest, largest = bin_range(index)
+            row = {
+                "Method": method,
+                "Direction": direction,
+                "Min Bytes": smallest,
+                "Max Bytes": largest,
+                "Request Count": histogram.count,
+                "Average Response Time": round(histogram.average, 2),
+                "Max Response Time": round(histogram.max, 2),
+            }
+            for fraction in PERCENTILES:
+                row[f"{int(fraction * 100)}%"] = round(histogram.percentile(fraction), 2)
+            rows.append(row)
+        return rows
+
+    def write_csv(self, file_path: str):
+        """
+        Writes the size versus latency breakdown to a CSV file.
+
+        Args:
+            file_path (str): Path of the CSV file.
+        """
+        fieldnames = ["Method", "Direction", "Min Bytes", "Max Bytes", "Request Count",
+                      "Average Response Time", "Max Response Time"]
+        fieldnames += [f"{int(fraction * 100)}%" for fraction in PERCENTILES]
+        with open(file_path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(self.rows())
+
+    def log_summary(self):
+        """
+        Logs the request size breakdown as a table.
+        """
+        rows = [row for row in self.rows() if row["Direction"] == "request"]
+        if not rows:
+            return
+        logging.info("%-50s %17s %10s %10s %10s", "Method", "Request bytes", "Count", "p50", "p99")
+        for row in rows:
+            logging.info(
+                "%-50s %17s %10d %10.2f %10.2f",
+                row["Method"], f"{row['Min Bytes']}-{row['Max Bytes']}", row["Request Count"], row["50%"], row["99%"],
+            )
+
+
+@events.init.add_listener
+def on_locust_init(environment, **kwargs):
+    """
+    Attaches a PayloadSizeStats instance to the environment and wires it to Locust events.
+    """
+    stats = PayloadSizeStats()
+    environment.payload_size_stats = stats
+
+    @environment.events.request.add_listener
+    def on_request(name, response_time, response_length=0, request_length=None, **kwargs):
+        if request_length is not None:
+            stats.log(name, request_length, response_length or 0, response_time)
+
+    @environment.events.report_to_master.add_listener
+    def on_report_to_master(client_id, data, **kwargs):
+        data["payload_sizes"] = stats.serialize()
+        stats.reset()
+
+    @environment.events.worker_report.add_listener
+    def on_worker_report(client_id, data, **kwargs):
+        stats.merge(data.get("payload_sizes", []))
+
+    @environment.events.test_start.add_listener
+    def on_test_start(**kwargs):
+        stats.reset()
+
+    @environment.events.reset_stats.add_listener
+    def on_reset_stats(**kwargs):
+        stats.reset()
+
+    @environment.events.quitting.add_listener
+    def on_quitting(environment, **kwargs):
+        if isinstance(environment.runner, WorkerRunner):
+            return
+        stats.log_summary()
+        csv_prefix = getattr(environment.parsed_options, "csv_prefix", None)
+        if csv_prefix:
+            stats.write_csv(f"{csv_prefix}_payload_sizes.csv")
+
+    if environment.web_ui:
+        @environment.web_ui.app.route("/stats/payload_sizes")
+        def payload_sizes_route():
+            return {"payload_sizes": stats.rows()}
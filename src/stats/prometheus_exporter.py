@@ -0,0 +1,326 @@
+"""
+Module: prometheus_exporter
+Description: Exposes live gRPC load test metrics in the Prometheus text format.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import bisect
+import logging
+
+from gevent.pywsgi import WSGIServer
+from locust import events
+from locust.runners import MasterRunner
+
+from src.stats.histogram import bucket_lower_bound
+from src.stats.rolling_windows import PERCENTILES as WINDOW_PERCENTILES
+
+# Upper bounds of the latency histogram buckets in seconds, Prometheus' defaults widened to 30s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+PORT_ATTEMPTS = 64
+
+
+class MethodMetrics:
+    """
+    Live counters, latency histogram and in-flight gauge of one method.
+
+    LocustInterceptor keeps the MethodMetrics of every method it has seen, so
+    a call updates its counters without looking the method up again.
+    """
+    __slots__ = ("method", "in_flight", "requests", "latency_buckets", "latency_sum")
+
+    def __init__(self, method: str):
+        self.method = method
+        self.in_flight = 0
+        self.requests = {}
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+
+    def finished(self, status_code: str, seconds: float):
+        """
+        Records a finished call.
+
+        Args:
+            status_code (str): gRPC status code name.
+            seconds (float): Response time in seconds.
+        """
+        self.in_flight -= 1
+        self.requests[status_code] = self.requests.get(status_code, 0) + 1
+        self.latency_buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.latency_sum += seconds
+
+
+class GrpcMetrics:
+    """
+    Live per-method counters, latency histograms and in-flight gauges of one Locust process.
+
+    Updated by LocustInterceptor on every call. All users of a process are
+    greenlets on one OS thread and an update never yields, so the counters are
+    plain dicts without a lock. Unlike the report stats they are never reset,
+    Prometheus computes rates from the growing totals.
+    """
+
+    def __init__(self):
+        self.methods = {}
+
+    def method(self, method: str):
+        """
+        Returns the metrics of a method, creating them on first use.
+
+        Args:
+            method (str): Full gRPC method name.
+
+        Returns:
+            MethodMetrics: The metrics of the method.
+        """
+        metrics = self.methods.get(method)
+        if metrics is None:
+            metrics = self.methods[method] = MethodMetrics(method)
+        return metrics
+
+    @property
+    def requests(self):
+        return {
+            (method, status_code): count
+            for method, metrics in self.methods.items() for status_code, count in metrics.requests.items()
+        }
+
+    @property
+    def latency_buckets(self):
+        return {method: metrics.latency_buckets for method, metrics in self.methods.items() if metrics.requests}
+
+    @property
+    def latency_sums(self):
+        return {method: metrics.latency_sum for method, metrics in self.methods.items() if metrics.requests}
+
+    @property
+    def in_flight(self):
+        return {method: metrics.in_flight for method, metrics in self.methods.items()}
+
+    @classmethod
+    def for_environment(cls, environment):
+        """
+        Returns the metrics of an environment, creating them on first use.
+
+        Args:
+            environment: The Locust environment.
+
+        Returns:
+            GrpcMetrics: The metrics shared by all users of the environment.
+        """
+        metrics = getattr(environment, "grpc_metrics", None)
+        if metrics is None:
+            metrics = environment.grpc_metrics = cls()
+        return metrics
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return ",".join(f'{name}="{_label_value(value)}"' for name, value in labels.items())
+
+
+def _merged_status_code_stats(environment):
+    """
+    Turns the status code stats merged from the workers into the GrpcMetrics layout.
+
+    Args:
+        environment: The Locust environment of the master.
+
+    Returns:
+        tuple: (requests, latency buckets, latency sums) dictionaries.
+    """
+    requests, latency_buckets, latency_sums = {}, {}, {}
+    stats = getattr(environment, "status_code_stats", None)
+    for (method, status_code), histogram in (stats.entries.items() if stats else ()):
+        if not method.startswith("/"):
+            # Connect times are not calls
+            continue
+        requests[(method, status_code)] = histogram.count
+        buckets = latency_buckets.setdefault(method, [0] * (len(LATENCY_BUCKETS) + 1))
+        for index, count in histogram.buckets.items():
+            buckets[bisect.bisect_left(LATENCY_BUCKETS, bucket_lower_bound(index) / 1e6)] += count
+        latency_sums[method] = latency_sums.get(method, 0.0) + histogram.total / 1000
+    return requests, latency_buckets, latency_sums
+
+
+def render_metrics(environment):
+    """
+    Renders the metrics of a Locust process in the Prometheus text format.
+
+    Workers and local runs expose their own live counters. The master makes no
+    calls, it exposes the status code stats merged from all workers instead,
+    which restart from zero when the stats are reset.
+
+    Args:
+        environment: The Locust environment.
+
+    Returns:
+        str: The metrics page.
+    """
+    runner = environment.runner
+    if isinstance(runner, MasterRunner):
+        requests, latency_buckets, latency_sums = _merged_status_code_stats(environment)
+        in_flight = {}
+    else:
+        metrics = GrpcMetrics.for_environment(environment)
+        requests, latency_buckets, latency_sums = metrics.requests, metrics.latency_buckets, metrics.latency_sums
+        in_flight = metrics.in_flight
+
+    lines = [
+        "# HELP loadtest_grpc_requests_total Finished gRPC calls by method and status code.",
+        "# TYPE loadtest_grpc_requests_total counter",
+    ]
+    for (method, status_code), count in sorted(requests.items()):
+        lines.append(f"loadtest_grpc_requests_total{{{_labels(method=method, code=status_code)}}} {count}")
+
+    lines += [
+        "# HELP loadtest_grpc_request_duration_seconds Response time of gRPC calls by method.",
+        "# TYPE loadtest_grpc_request_duration_seconds histogram",
+    ]
+    for method, buckets in sorted(latency_buckets.items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+            cumulative += count
+            lines.append(f"loadtest_grpc_request_duration_seconds_bucket{{{_labels(method=method, le=bound)}}} {cumulative}")
+        lines.append(f"loadtest_grpc_request_duration_seconds_sum{{{_labels(method=method)}}} {latency_sums[method]:.6f}")
+        lines.append(f"loadtest_grpc_request_duration_seconds_count{{{_labels(method=method)}}} {cumulative}")
+
+    lines += [
+        "# HELP loadtest_grpc_in_flight_requests gRPC calls waiting for their response.",
+        "# TYPE loadtest_grpc_in_flight_requests gauge",
+    ]
+    for method, count in sorted(in_flight.items()):
+        lines.append(f"loadtest_grpc_in_flight_requests{{{_labels(method=method)}}} {count}")
+
+    channel_pool = getattr(environment, "channel_pool", None)
+    if channel_pool is not None:
+        lines += [
+            "# HELP loadtest_grpc_channels Open gRPC channels by connectivity state.",
+            "# TYPE loadtest_grpc_channels gauge",
+        ]
+        for state, count in sorted(channel_pool.state_counts().items()):
+            lines.append(f"loadtest_grpc_channels{{{_labels(state=state)}}} {count}")
+
+    rolling_window_stats = getattr(environment, "rolling_window_stats", None)
+    if rolling_window_stats is not None:
+        rows = rolling_window_stats.rows()
+        lines += [
+            "# HELP loadtest_grpc_window_requests_per_second Calls per second over the last window seconds.",
+            "# TYPE loadtest_grpc_window_requests_per_second gauge",
+        ]
+        for row in rows:
+            labels = _labels(method=row["Method"], window=f"{row['Window']}s")
+            lines.append(f"loadtest_grpc_window_requests_per_second{{{labels}}} {row['Requests/s']}")
+        lines += [
+            "# HELP loadtest_grpc_window_failure_ratio Share of failed calls over the last window seconds.",
+            "# TYPE loadtest_grpc_window_failure_ratio gauge",
+        ]
+        for row in rows:
+            labels = _labels(method=row["Method"], window=f"{row['Window']}s")
+            lines.append(f"loadtest_grpc_window_failure_ratio{{{labels}}} {row['Failure Ratio']}")
+        lines += [
+            "# HELP loadtest_grpc_window_latency_seconds Response time percentiles over the last window seconds.",
+            "# TYPE loadtest_grpc_window_latency_seconds gauge",
+        ]
+        for row in rows:
+            for fraction in WINDOW_PERCENTILES:
+                labels = _labels(method=row["Method"], window=f"{row['Window']}s", quantile=f"{fraction:g}")
+                value = row[f"{int(fraction * 100)}%"] / 1000
+                lines.append(f"loadtest_grpc_window_latency_seconds{{{labels}}} {value:.6f}")
+
+    health = getattr(environment, "generator_health", None)
+    if health is not None and health.latest is not None:
+        _, cpu, _, lag_max, _, _, _, _, saturated = health.latest
+        lines += [
+            "# HELP loadtest_generator_cpu_percent CPU use of the load generator process.",
+            "# TYPE loadtest_generator_cpu_percent gauge",
+            f"loadtest_generator_cpu_percent {cpu}",
+            "# HELP loadtest_generator_scheduling_lag_seconds Largest greenlet wake-up delay of the last sample.",
+            "# TYPE loadtest_generator_scheduling_lag_seconds gauge",
+            f"loadtest_generator_scheduling_lag_seconds {lag_max / 1000:.6f}",
+            "# HELP loadtest_generator_gc_pause_seconds_total Time spent in garbage collection.",
+            "# TYPE loadtest_generator_gc_pause_seconds_total counter",
+            f"loadtest_generator_gc_pause_seconds_total {health.gc_pause_seconds_total:.6f}",
+            "# HELP loadtest_generator_saturated 1 while the load generator is saturated.",
+            "# TYPE loadtest_generator_saturated gauge",
+            f"loadtest_generator_saturated {int(saturated)}",
+        ]
+
+    lines += [
+        "# HELP loadtest_users Running Locust users.",
+        "# TYPE loadtest_users gauge",
+        f"loadtest_users {runner.user_count if runner else 0}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(environment, host: str, port: int):
+    """
+    Serves /metrics on the first free port from the given one up.
+
+    Workers started on the same machine end up on consecutive ports.
+
+    Args:
+        environment: The Locust environment.
+        host (str): Address to listen on.
+        port (int): First port to try.
+
+    Returns:
+        WSGIServer: The started server.
+    """
+
+    def application(environ, start_response):
+        if environ.get("PATH_INFO") != "/metrics":
+            start_response("404 Not Found", [("Content-Type", "text/plain")])
+            return [b"Not Found\n"]
+        body = render_metrics(environment).encode()
+        start_response("200 OK", [("Content-Type", CONTENT_TYPE), ("Content-Length", str(len(body)))])
+        return [body]
+
+    for attempt in range(PORT_ATTEMPTS):
+        server = WSGIServer((host, port + attempt), application, log=None)
+        try:
+            server.start()
+        except OSError:
+            continue
+        logging.info("Serving Prometheus metrics on http://%s:%d/metrics", host, port + attempt)
+        return server
+    raise OSError(f"No free metrics port in {port}-{port + PORT_ATTEMPTS - 1}")
+
+
+@events.init_command_line_parser.add_listener
+def on_init_command_line_parser(parser, **kwargs):
+    """
+    Adds the metrics endpoint options to Locust so they can be set from task.config.
+    """
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=0,
+        help="Serve Prometheus metrics from this port on, 0 only serves them on the web UI at /metrics",
+    )
+    parser.add_argument("--metrics-host", type=str, default="0.0.0.0", help="Address the metrics endpoint listens on")
+
+
+@events.init.add_listener
+def on_locust_init(environment, **kwargs):
+    """
+    Creates the metrics of the environment and starts the endpoints.
+    """
+    GrpcMetrics.for_environment(environment)
+    options = environment.parsed_options
+    if options and options.metrics_port:
+        environment.metrics_server = start_metrics_server(environment, options.metrics_host, options.metrics_port)
+
+        @environment.events.quitting.add_listener
+        def on_quitting(**kwargs):
+            environment.metrics_server.stop(timeout=1)
+
+    if environment.web_ui:
+        @environment.web_ui.app.route("/metrics")
+        def metrics_route():
+            return render_metrics(environment), 200, {"Content-Type": CONTENT_TYPE}
@@ -0,0 +1,224 @@
+"""
+Module: rolling_windows
+Description: Keeps per-method latency histograms of the last seconds in ring buffers for rolling window percentiles.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import math
+import time
+
+from locust import events
+from locust.runners import WORKER_REPORT_INTERVAL, MasterRunner
+
+from src.stats.histogram import LatencyHistogram
+
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+class RollingWindowStats:
+    """
+    Ring buffers of one-second latency histograms per method.
+
+    A window covers the last complete seconds, so the figures of a window do
+    not jump around while the current second fills up. Percentiles over a
+    window are computed from the merged histograms of its seconds and are as
+    exact as the histograms themselves.
+
+    Workers ship every completed second once, the master merges the seconds
+    of all workers by their epoch second. Worker data arrives up to a report
+    interval late, so the master's windows end delay seconds earlier. Batched
+    request events arrive up to a flush interval late, so with batching a
+    second is only complete, and shipped, delay seconds after it ended.
+    """
+
+    def __init__(self, windows: tuple = (1, 10, 60), delay: int = 0):
+        self.windows = tuple(sorted(windows))
+        self.delay = delay
+        # Room for the largest window, the delay, the second being filled and one not yet shipped
+        self.size = self.windows[-1] + delay + 2
+        self.rings = {}
+        self._shipped_until = 0
+
+    def _slot(self, method: str, second: int):
+        ring = self.rings.get(method)
+        if ring is None:
+            ring = self.rings[method] = [None] * self.size
+        slot = ring[second % self.size]
+        if slot is None or slot[0] != second:
+            if slot is not None and slot[0] > second:
+                # Too old for the ring
+                return None
+            slot = ring[second % self.size] = [second, LatencyHistogram(), 0]
+        return slot
+
+    def log(self, method: str, response_time: float, failed: bool, now: float = None):
+        """
+        Records a finished call in the slot of the current second.
+
+        Args:
+            method (str): Full gRPC method name.
+            response_time (float): Response time in milliseconds.
+            failed (bool): Whether the call failed.
+            now (float, optional): Epoch time of the call, defaults to now.
+        """
+        slot = self._slot(method, int(now if now is not None else time.time()))
+        if slot is None:
+            return
+        slot[1].record(response_time)
+        if failed:
+            slot[2] += 1
+
+    def window(self, method: str, seconds: int, now: float = None):
+        """
+        Merges the seconds of a window of one method.
+
+        Args:
+            method (str): Full gRPC method name.
+            seconds (int): Window length in seconds.
+            now (float, optional): Epoch time the window ends at, defaults to now.
+
+        Returns:
+            tuple: (LatencyHistogram of the window, number of failed calls)
+        """
+        end = int(now if now is not None else time.time()) - 1 - self.delay
+        start = end - seconds + 1
+        histogram = LatencyHistogram()
+        failures = 0
+        for slot in self.rings.get(method, ()):
+            if slot is not None and start <= slot[0] <= end:
+                histogram.merge(slot[1])
+                failures += slot[2]
+        return histogram, failures
+
+    def totals(self, seconds: int, method_prefix: str = "", now: float = None):
+        """
+        Merges a window of all methods starting with a prefix, e.g. for SLO checks.
+
+        Args:
+            seconds (int): Window length in seconds.
+            method_prefix (str, optional): Method name prefix, e.g. "/pb.VacancyService/".
+            now (float, optional): Epoch time the window ends at, defaults to now.
+
+        Returns:
+            tuple: (LatencyHistogram of the window, number of failed calls)
+        """
+        histogram = LatencyHistogram()
+        failures = 0
+        for method in list(self.rings):
+            if method.startswith(method_prefix):
+                method_histogram, method_failures = self.window(method, seconds, now)
+                histogram.merge(method_histogram)
+                failures += method_failures
+        return histogram, failures
+
+    def serialize(self, now: float = None):
+        """
+        Serializes the seconds completed since the last report, up to delay seconds ago.
+
+        Args:
+            now (float, optional): Current epoch time, defaults to now.
+
+        Returns:
+            list: List of [method, second, packed histogram, failures] items.
+        """
+        current = int(now if now is not None else time.time()) - self.delay
+        data = []
+        for method, ring in self.rings.items():
+            for slot in ring:
+                if slot is not None and self._shipped_until <= slot[0] < current:
+                    data.append([method, slot[0], slot[1].pack(), slot[2]])
+        self._shipped_until = current
+        return data
+
+    def merge(self, data: list):
+        """
+        Merges serialized seconds received from a worker.
+
+        Args:
+            data (list): Output of serialize() on a worker.
+        """
+        for method, second, histogram_data, failures in data:
+            slot = self._slot(method, second)
+            if slot is not None:
+                slot[1].merge_packed(histogram_data)
+                slot[2] += failures
+
+    def rows(self, now: float = None):
+        """
+        Builds one row per method and window.
+
+        Args:
+            now (float, optional): Epoch time the windows end at, defaults to now.
+
+        Returns:
+            list: List of row dictionaries.
+        """
+        now = now if now is not None else time.time()
+        rows = []
+        for method in sorted(self.rings):
+            for seconds in self.windows:
+                histogram, failures = self.window(method, seconds, now)
+                row = {
+                    "Method": method,
+                    "Window": seconds,
+                    "Request Count": histogram.count,
+                    "Requests/s": round(histogram.count / seconds, 2),
+                    "Failure Ratio": round(failures / histogram.count, 4) if histogram.count else 0.0,
+                    "Average Response Time": round(histogram.average, 2),
+                    "Max Response Time": round(histogram.max, 2),
+                }
+                for fraction in PERCENTILES:
+                    row[f"{int(fraction * 100)}%"] = round(histogram.percentile(fraction), 2)
+                rows.append(row)
+        return rows
+
+
+@events.init_command_line_parser.add_listener
+def on_init_command_line_parser(parser, **kwargs):
+    """
+    Adds the rolling window options to Locust so they can be set from task.config.
+    """
+    parser.add_argument(
+        "--stat-windows",
+        type=str,
+        default="1,10,60",
+        help="Comma separated rolling window lengths in seconds, empty disables",
+    )
+
+
+@events.init.add_listener
+def on_locust_init(environment, **kwargs):
+    """
+    Attaches a RollingWindowStats instance to the environment and wires it to Locust events.
+    """
+    spec = getattr(environment.parsed_options, "stat_windows", "")
+    windows = tuple(int(value) for value in spec.split(",") if value.strip())
+    if not windows:
+        return
+    options = environment.parsed_options
+    # Batched request events reach the listeners up to a flush interval after the call
+    delay = math.ceil(options.event_flush_interval) if getattr(options, "event_batch_size", 1) > 1 else 0
+    if isinstance(environment.runner, MasterRunner):
+        delay += int(WORKER_REPORT_INTERVAL) + 1
+    stats = RollingWindowStats(windows, delay)
+    environment.rolling_window_stats = stats
+
+    @environment.events.request.add_listener
+    def on_request(request_type, name, response_time, exception=None, start_time=None, **kwargs):
+        if request_type == "grpc":
+            now = start_time + response_time / 1000 if start_time is not None else None
+            stats.log(name, response_time, exception is not None, now)
+
+    @environment.events.report_to_master.add_listener
+    def on_report_to_master(client_id, data, **kwargs):
+        data["rolling_windows"] = stats.serialize()
+
+    @environment.events.worker_report.add_listener
+    def on_worker_report(client_id, data, **kwargs):
+        stats.merge(data.get("rolling_windows", []))
+
+    if environment.web_ui:
+        @environment.web_ui.app.route("/stats/windows")
+        def windows_route():
+            return {"windows": stats.rows()}
@@ -0,0 +1,230 @@
+"""
+Module: slow_requests
+Description: Keeps the K slowest calls of every method with the context needed to look them up.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import csv
+import heapq
+import itertools
+import logging
+import re
+import time
+
+from google.protobuf import text_format
+from locust import events
+from locust.runners import WorkerRunner
+
+FIELDS = ["Timestamp", "Method", "Status Code", "Response Time", "User", "Channel", "Request", "Trace ID"]
+SUMMARY_LENGTH = 120
+# Fields left out of request summaries
+SECRET_FIELD_PATTERN = re.compile(r"password|token", re.IGNORECASE)
+
+
+def summarize_request(request):
+    """
+    Describes a request in one short line, by its ID when it has one.
+
+    Passwords and tokens are left out.
+
+    Args:
+        request: The request message, or the serialized request of a replayed call.
+
+    Returns:
+        str: The summary, e.g. "Id: 26038359-a876-4f32-9b38-46c05398020a".
+    """
+    if isinstance(request, bytes):
+        return f"{len(request)} bytes"
+    for field in ("Id", "id"):
+        value = getattr(request, field, None)
+        if value:
+            return f"{field}: {value}"
+    try:
+        secrets = [field.name for field, _ in request.ListFields() if SECRET_FIELD_PATTERN.search(field.name)]
+        if secrets:
+            request = type(request).FromString(request.SerializeToString())
+            for name in secrets:
+                request.ClearField(name)
+        summary = text_format.MessageToString(request, as_one_line=True)
+    except (AttributeError, TypeError):
+        return ""
+    return summary if len(summary) <= SUMMARY_LENGTH else summary[:SUMMARY_LENGTH - 3] + "..."
+
+
+class SlowestRequests:
+    """
+    Keeps the k slowest calls per method in min-heaps.
+
+    The fastest kept call sits at the top of each heap, so a call that is not
+    slower than it is rejected with one comparison. Only calls that make it
+    into the top k are described and cost O(log k). Workers ship their heaps
+    with every report and start over, the master merges them into the run's
+    top k, which is the same as the top k of all calls.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self.heaps = {}
+        self._sequence = itertools.count()
+
+    def _push(self, heap: list, response_time: float, record: list):
+        # The sequence number breaks response time ties, records are never compared
+        entry = (response_time, next(self._sequence), record)
+        if len(heap) < self.k:
+            heapq.heappush(heap, entry)
+        else:
+            heapq.heapreplace(heap, entry)
+
+    def log(self, method: str, status_code: str, response_time: float, context: dict = None,
+            request=None, trace_id: str = None):
+        """
+        Records a finished call if it is among the k slowest of its method.
+
+        Args:
+            method (str): Full gRPC method name.
+            status_code (str): gRPC status code name.
+            response_time (float): Response time in milliseconds.
+            context (dict, optional): Request event context with the user ID and channel.
+            request (optional): The request message.
+            trace_id (str, optional): Trace ID sent with the call.
+        """
+        heap = self.heaps.get(method)
+        if heap is None:
+            heap = self.heaps[method] = []
+        elif len(heap) >= self.k and response_time <= heap[0][0]:
+            return
+        context = context or {}
+        self._push(heap, response_time, [
+            round(time.time(), 3),
+            method,
+            status_code,
+            round(response_time, 2),
+            context.get("user_id", ""),
+            context.get("channel", ""),
+            summarize_request(request),
+            trace_id or "",
+        ])
+
+    def reset(self):
+        """
+        Drops all records.
+        """
+        self.heaps = {}
+
+    def serialize(self):
+        """
+        Serializes the records for the worker report.
+
+        Returns:
+            list: The records of all methods.
+        """
+        return [record for heap in self.heaps.values() for _, _, record in heap]
+
+    def merge(self, data: list):
+        """
+        Merges serialized records received from a worker.
+
+        Args:
+            data (list): Output of serialize() on a worker.
+        """
+        for record in data:
+            heap = self.heaps.get(record[1])
+            if heap is None:
+                heap = self.heaps[record[1]] = []
+            elif len(heap) >= self.k and record[3] <= heap[0][0]:
+                continue
+            self._push(heap, record[3], record)
+
+    def rows(self):
+        """
+        Builds one report row per record, by method then slowest first.
+
+        Returns:
+            list: List of row dictionaries.
+        """
+        rows = []
+        for method in sorted(self.heaps):
+            for _, _, record in sorted(self.heaps[method], reverse=True):
+                rows.append(dict(zip(FIELDS, record)))
+        return rows
+
+    def write_csv(self, file_path: str):
+        """
+        Writes the slowest calls to a CSV file.
+
+        Args:
+            file_path (str): Path of the CSV file.
+        """
+        with open(file_path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(self.rows())
+
+    def log_summary(self):
+        """
+        Logs the slowest call of every method.
+        """
+        for method in sorted(self.heaps):
+            response_time, _, record = max(self.heaps[method])
+            logging.info(
+                "Slowest %s: %.2fms %s, user %s, channel %s, %s",
+                method, response_time, record[2], record[4], record[5], record[6],
+            )
+
+
+@events.init_command_line_parser.add_listener
+def on_init_command_line_parser(parser, **kwargs):
+    """
+    Adds the slowest request options to Locust so they can be set from task.config.
+    """
+    parser.add_argument("--slowest-requests", type=int, default=20, help="Slowest calls kept per method, 0 disables")
+
+
+@events.init.add_listener
+def on_locust_init(environment, **kwargs):
+    """
+    Attaches a SlowestRequests instance to the environment and wires it to Locust events.
+    """
+    k = getattr(environment.parsed_options, "slowest_requests", 0)
+    if not k:
+        return
+    slowest = SlowestRequests(k)
+    environment.slowest_requests = slowest
+
+    @environment.events.request.add_listener
+    def on_request(request_type, name, response_time, status_code=None, context=None, request=None,
+                   trace_id=None, **kwargs):
+        if request_type == "grpc":
+            slowest.log(name, status_code, response_time, context, request, trace_id)
+
+    @environment.events.report_to_master.add_listener
+    def on_report_to_master(client_id, data, **kwargs):
+        data["slowest_requests"] = slowest.serialize()
+        slowest.reset()
+
+    @environment.events.worker_report.add_listener
+    def on_worker_report(client_id, data, **kwargs):
+        slowest.merge(data.get("slowest_requests", []))
+
+    @environment.events.test_start.add_listener
+    def on_test_start(**kwargs):
+        slowest.reset()
+
+    @environment.events.reset_stats.add_listener
+    def on_reset_stats(**kwargs):
+        slowest.reset()
+
+    @environment.events.quitting.add_listener
+    def on_quitting(environment, **kwargs):
+        if isinstance(environment.runner, WorkerRunner):
+            return
+        slowest.log_summary()
+        csv_prefix = getattr(environment.parsed_options, "csv_prefix", None)
+        if csv_prefix:
+            slowest.write_csv(f"{csv_prefix}_slow_requests.csv")
+
+    if environment.web_ui:
+        @environment.web_ui.app.route("/stats/slow_requests")
+        def slow_requests_route():
+            return {"slow_requests": slowest.rows()}
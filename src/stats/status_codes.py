@@ -0,0 +1,153 @@
+"""
+Module: status_codes
+Description: Tracks gRPC status codes per method with counters and latency histograms.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import csv
+import logging
+
+from locust import events
+from locust.runners import WorkerRunner
+
+from src.stats.histogram import KeyedHistograms, LatencyHistogram
+
+PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+class StatusCodeStats(KeyedHistograms):
+    """
+    Collects request counts and latency histograms keyed by (method, status code).
+    """
+
+    def log(self, method: str, status_code: str, response_time: float):
+        """
+        Records a finished call.
+
+        Args:
+            method (str): Full gRPC method name.
+            status_code (str): gRPC status code name, e.g. "UNAVAILABLE".
+            response_time (float): Response time in milliseconds.
+        """
+        self.record((method, status_code), response_time)
+
+    def totals(self, method_prefix: str = ""):
+        """
+        Merges the data of all methods starting with a prefix.
+
+        Args:
+            method_prefix (str, optional): Method name prefix, e.g. "/pb.VacancyService/".
+
+        Returns:
+            tuple: (LatencyHistogram of all matching calls, number of calls that did not return OK)
+        """
+        histogram = LatencyHistogram()
+        failures = 0
+        for (method, status_code), entry in self.entries.items():
+            if method.startswith(method_prefix):
+                histogram.merge(entry)
+                if status_code != "OK":
+                    failures += entry.count
+        return histogram, failures
+
+    def rows(self):
+        """
+        Builds one report row per method and status code, sorted by method then count.
+
+        Returns:
+            list: List of row dictionaries.
+        """
+        totals = {}
+        for (method, _), histogram in self.entries.items():
+            totals[method] = totals.get(method, 0) + histogram.count
+
+        rows = []
+        for (method, status_code), histogram in self.entries.items():
+            row = {
+                "Method": method,
+                "Status Code": status_code,
+                "Request Count": histogram.count,
+                "Share %": round(100.0 * histogram.count / totals[method], 2),
+                "Average Response Time": round(histogram.average, 2),
+                "Max Response Time": round(histogram.max, 2),
+            }
+            for fraction in PERCENTILES:
+                row[f"{int(fraction * 100)}%"] = round(histogram.percentile(fraction), 2)
+            rows.append(row)
+        rows.sort(key=lambda row: (row["Method"], -row["Request Count"]))
+        return rows
+
+    def write_csv(self, file_path: str):
+        """
+        Writes the status code breakdown to a CSV file.
+
+        Args:
+            file_path (str): Path of the CSV file.
+        """
+        rows = self.rows()
+        fieldnames = ["Method", "Status Code", "Request Count", "Share %", "Average Response Time", "Max Response Time"]
+        fieldnames += [f"{int(fraction * 100)}%" for fraction in PERCENTILES]
+        with open(file_path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def log_summary(self):
+        """
+        Logs the status code breakdown as a table.
+        """
+        rows = self.rows()
+        if not rows:
+            return
+        logging.info("%-50s %-20s %10s %8s %10s %10s", "Method", "Status", "Count", "Share%", "p50", "p99")
+        for row in rows:
+            logging.info(
+                "%-50s %-20s %10d %8.2f %10.2f %10.2f",
+                row["Method"], row["Status Code"], row["Request Count"], row["Share %"], row["50%"], row["99%"],
+            )
+
+
+@events.init.add_listener
+def on_locust_init(environment, **kwargs):
+    """
+    Attaches a StatusCodeStats instance to the environment and wires it to Locust events.
+    """
+    stats = StatusCodeStats()
+    environment.status_code_stats = stats
+
+    @environment.events.request.add_listener
+    def on_request(name, response_time, status_code=None, **kwargs):
+        if status_code is not None:
+            stats.log(name, status_code, response_time)
+
+    @environment.events.report_to_master.add_listener
+    def on_report_to_master(client_id, data, **kwargs):
+        data["status_codes"] = stats.serialize()
+        stats.reset()
+
+    @environment.events.worker_report.add_listener
+    def on_worker_report(client_id, data, **kwargs):
+        stats.merge(data.get("status_codes", []))
+
+    @environment.events.test_start.add_listener
+    def on_test_start(**kwargs):
+        stats.reset()
+
+    @environment.events.reset_stats.add_listener
+    def on_reset_stats(**kwargs):
+        stats.reset()
+
+    @environment.events.quitting.add_listener
+    def on_quitting(environment, **kwargs):
+        if isinstance(environment.runner, WorkerRunner):
+            return
+        stats.log_summary()
+        csv_prefix = getattr(environment.parsed_options, "csv_prefix", None)
+        if csv_prefix:
+            stats.write_csv(f"{csv_prefix}_status_codes.csv")
+
+    if environment.web_ui:
+        @environment.web_ui.app.route("/stats/status_codes")
+        def status_codes_route():
+            return {"status_codes": stats.rows()}
@@ -0,0 +1,8 @@
+"""
+Module: tools
+Description: Initializes the tools module containing command line utilities.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+# No specific initialization code required for this module
@@ -0,0 +1,174 @@
+"""
+Module: channel_profile_sweep
+Description: Benchmarks every gRPC channel option profile against the target and reports the best one.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import argparse
+import csv
+import logging
+import os
+import time
+
+import gevent
+import grpc
+import grpc.experimental.gevent as grpc_gevent
+from dotenv import load_dotenv
+from gevent.pool import Pool
+
+from src.clients.channel_options import CHANNEL_PROFILES_PATH, load_channel_profiles
+from src.clients.messages_client import Messages
+from src.clients.service_client import VacancyServiceClient
+from src.stats.histogram import LatencyHistogram
+
+grpc_gevent.init_gevent()
+
+logging.basicConfig(level=logging.INFO)
+
+
+def build_call(client: VacancyServiceClient, rpc: str, limit: int, vacancy_id: str):
+    """
+    Builds a zero-argument callable performing one benchmark call.
+
+    Args:
+        client (VacancyServiceClient): The vacancy service client.
+        rpc (str): Either "get-vacancies" or "get-vacancy".
+        limit (int): Page size for GetVacancies.
+        vacancy_id (str): Vacancy ID for GetVacancy.
+
+    Returns:
+        Callable: The benchmark call.
+    """
+    if rpc == "get-vacancy":
+        message = Messages.get_vacancy(id=vacancy_id)
+        return lambda: client.get_vacancy(message)
+
+    message = Messages.get_vacancies(limit=limit)
+    return lambda: list(client.get_vacancies(message))
+
+
+def benchmark_profile(host: str, options: list, args):
+    """
+    Runs a closed-loop benchmark with one channel option profile.
+
+    Args:
+        host (str): Target host.
+        options (list): Channel options of the profile.
+        args (argparse.Namespace): Command line arguments.
+
+    Returns:
+        dict: Requests per second, error count and latency percentiles.
+    """
+    channels = [grpc.insecure_channel(host, options=options) for _ in range(args.channels)]
+    calls = [build_call(VacancyServiceClient(channel), args.rpc, args.limit, args.vacancy_id) for channel in channels]
+    histogram = LatencyHistogram()
+    state = {"errors": 0, "measuring": False}
+    measure_start = time.perf_counter() + args.warmup
+    deadline = measure_start + args.duration
+
+    def worker(index):
+        call = calls[index % len(calls)]
+        while True:
+            start = time.perf_counter()
+            if start >= deadline:
+                return
+            try:
+                call()
+                failed = False
+            except grpc.RpcError:
+                failed = True
+            if start >= measure_start:
+                if failed:
+                    state["errors"] += 1
+                else:
+                    histogram.record((time.perf_counter() - start) * 1000)
+
+    pool = Pool(args.concurrency)
+    for index in range(args.concurrency):
+        pool.spawn(worker, index)
+    pool.join()
+    for channel in channels:
+        channel.close()
+
+    return {
+        "rps": round(histogram.count / args.duration, 2),
+        "errors": state["errors"],
+        "p50": round(histogram.percentile(0.5), 2),
+        "p99": round(histogram.percentile(0.99), 2),
+        "max": round(histogram.max, 2),
+    }
+
+
+def parse_args():
+    """
+    Parses the command line arguments.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Benchmark gRPC channel option profiles against the target.")
+    parser.add_argument("--host", default=os.getenv("HOST"), help="Target host, defaults to the HOST environment variable")
+    parser.add_argument("--profiles-file", default=CHANNEL_PROFILES_PATH, help="Channel profiles config file")
+    parser.add_argument("--profiles", nargs="*", help="Profiles to benchmark, all profiles when omitted")
+    parser.add_argument("--rpc", choices=("get-vacancies", "get-vacancy"), default="get-vacancies")
+    parser.add_argument("--limit", type=int, default=100, help="Page size for GetVacancies")
+    parser.add_argument("--vacancy-id", help="Vacancy ID for GetVacancy")
+    parser.add_argument("--concurrency", type=int, default=32, help="Number of concurrent callers")
+    parser.add_argument("--channels", type=int, default=1, help="Number of channels the callers are spread over")
+    parser.add_argument("--warmup", type=float, default=3, help="Warm-up seconds excluded from the results")
+    parser.add_argument("--duration", type=float, default=15, help="Measured seconds per profile")
+    parser.add_argument("--csv", help="Optional CSV file for the results")
+    args = parser.parse_args()
+    if not args.host:
+        parser.error("--host or the HOST environment variable is required")
+    if args.rpc == "get-vacancy" and not args.vacancy_id:
+        parser.error("--vacancy-id is required for get-vacancy")
+    args.channel_profiles = load_channel_profiles(args.profiles_file)
+    unknown = [name for name in args.profiles or () if name not in args.channel_profiles]
+    if unknown:
+        parser.error(
+            f"unknown profiles: {', '.join(unknown)} (valid profiles: {', '.join(args.channel_profiles)})"
+        )
+    return args
+
+
+def main():
+    args = parse_args()
+    profiles = args.channel_profiles
+    names = args.profiles or list(profiles)
+
+    results = []
+    for name in names:
+        logging.info("Benchmarking channel profile %s", name)
+        result = benchmark_profile(args.host, profiles[name], args)
+        result["profile"] = name
+        results.append(result)
+        # Let the server drain before the next profile
+        gevent.sleep(1)
+
+    logging.info("%-20s %10s %8s %10s %10s %10s", "Profile", "RPS", "Errors", "p50", "p99", "Max")
+    for result in results:
+        logging.info(
+            "%-20s %10.2f %8d %10.2f %10.2f %10.2f",
+            result["profile"], result["rps"], result["errors"], result["p50"], result["p99"], result["max"],
+        )
+
+    best_rps = max(results, key=lambda result: result["rps"])
+    best_p99 = min((result for result in results if result["rps"]), key=lambda result: result["p99"], default=best_rps)
+    logging.info("Highest throughput: %s (%.2f req/s)", best_rps["profile"], best_rps["rps"])
+    logging.info("Lowest p99 latency: %s (%.2f ms)", best_p99["profile"], best_p99["p99"])
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=["profile", "rps", "errors", "p50", "p99", "max"])
+            writer.writeheader()
+            writer.writerows(results)
+
+
+if __name__ == "__main__":
+    main()
+
+# Command to run the sweep
+# python -m src.tools.channel_profile_sweep --host vacancies.cyrextech.net:7823 --duration 15
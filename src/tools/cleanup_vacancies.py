@@ -0,0 +1,213 @@
+"""
+Module: cleanup_vacancies
+Description: Deletes the vacancies left behind by load tests and seeding runs.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import argparse
+import csv
+import logging
+import os
+import time
+
+import gevent
+import grpc
+import grpc.experimental.gevent as grpc_gevent
+from dotenv import load_dotenv
+from gevent.pool import Pool
+
+from src.clients.messages_client import Messages
+from src.clients.service_client import VacancyServiceClient
+from src.utils.credential_store import get_longest_valid_token
+from src.utils.utils import TEST_DATA_TAG
+
+grpc_gevent.init_gevent()
+
+logging.basicConfig(level=logging.INFO)
+
+
+class RateLimiter:
+    """
+    Spaces calls evenly at a maximum rate shared by all greenlets.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = time.monotonic()
+
+    def wait(self):
+        """
+        Waits for the next free slot, returns at once without a rate.
+        """
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(self.next_slot, now)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            gevent.sleep(slot - now)
+
+
+def read_manifest(path: str):
+    """
+    Streams the vacancy IDs of a seeding manifest.
+
+    Args:
+        path (str): Manifest CSV file with an id column.
+
+    Yields:
+        str: The vacancy IDs.
+    """
+    with open(path, "r", newline="") as file:
+        for row in csv.DictReader(file):
+            yield row["id"]
+
+
+def scan_tagged_vacancies(client: VacancyServiceClient, tags: list, page_size: int, timeout: float):
+    """
+    Pages through GetVacancies and collects the IDs of tagged vacancies.
+
+    The whole listing is scanned before anything is deleted, deleting while
+    paging would shift the later pages and skip vacancies.
+
+    Args:
+        client (VacancyServiceClient): The vacancy service client.
+        tags (list): Tags marking test data, matched as "[tag]" in the title or description.
+        page_size (int): Vacancies per page.
+        timeout (float): Seconds before a page request times out.
+
+    Returns:
+        tuple: List of tagged vacancy IDs and the number of vacancies scanned.
+    """
+    markers = [f"[{tag}]" for tag in tags]
+    tagged = []
+    scanned = 0
+    for page in range(1, 1 << 31):
+        message = Messages.get_vacancies(page=page, limit=page_size)
+        vacancies = list(client.stub.GetVacancies(message, metadata=client.metadata, timeout=timeout))
+        scanned += len(vacancies)
+        for vacancy in vacancies:
+            if any(marker in vacancy.Title or marker in vacancy.Description for marker in markers):
+                tagged.append(vacancy.Id)
+        if len(vacancies) < page_size:
+            break
+        if not page % 100:
+            logging.info("Scanned %d vacancies, %d tagged", scanned, len(tagged))
+    return tagged, scanned
+
+
+class Sweeper:
+    """
+    Deletes vacancies with bounded concurrency and a maximum request rate.
+
+    Vacancies that are already gone count as deleted, so a sweep can simply be
+    run again after an interruption.
+    """
+
+    def __init__(self, client: VacancyServiceClient, concurrency: int, rate: float, timeout: float = 10.0):
+        self.client = client
+        self.concurrency = concurrency
+        self.rate_limiter = RateLimiter(rate)
+        self.timeout = timeout
+        self.deleted = 0
+        self.missing = 0
+        self.failed = 0
+
+    def _delete(self, vacancy_id: str):
+        self.rate_limiter.wait()
+        try:
+            response = self.client.stub.DeleteVacancy(
+                Messages.delete_vacancy(id=vacancy_id), metadata=self.client.metadata, timeout=self.timeout
+            )
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.NOT_FOUND:
+                self.missing += 1
+            else:
+                self.failed += 1
+                logging.warning("DeleteVacancy %s failed: %s %s", vacancy_id, e.code().name, e.details())
+            return
+        if response.success:
+            self.deleted += 1
+        else:
+            self.missing += 1
+
+    def run(self, vacancy_ids):
+        """
+        Deletes the given vacancies.
+
+        Args:
+            vacancy_ids (Iterable): IDs of the vacancies to delete.
+        """
+        pool = Pool(self.concurrency)
+        for index, vacancy_id in enumerate(vacancy_ids, 1):
+            # Blocks while all slots are busy, so the IDs are read as fast as they are deleted
+            pool.spawn(self._delete, vacancy_id)
+            if not index % 10000:
+                logging.info("Deleted %d, already gone %d, failed %d", self.deleted, self.missing, self.failed)
+        pool.join()
+        logging.info("Deleted %d, already gone %d, failed %d", self.deleted, self.missing, self.failed)
+
+
+def parse_args():
+    """
+    Parses the command line arguments.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Delete the vacancies created by load tests and seeding runs.")
+    parser.add_argument("--host", default=os.getenv("HOST"), help="Target host, defaults to the HOST environment variable")
+    parser.add_argument("--manifest", help="Delete the IDs of this seeding manifest instead of scanning")
+    parser.add_argument(
+        "--tags",
+        default=f"{TEST_DATA_TAG},{TEST_DATA_TAG}-seed",
+        help="Comma separated tags marking test data, matched as [tag] in the title or description",
+    )
+    parser.add_argument("--page-size", type=int, default=500, help="Vacancies per GetVacancies page while scanning")
+    parser.add_argument("--concurrency", type=int, default=16, help="Number of deletes in flight")
+    parser.add_argument("--rate", type=float, default=200, help="Maximum deletes per second, 0 for no limit")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be deleted")
+    parser.add_argument("--access-token", default=os.getenv("ACCESS_TOKEN"), help="Bearer token sent with every call")
+    parser.add_argument("--credential-store", help="Take the longest valid access token from this credential store")
+    parser.add_argument("--timeout", type=float, default=10, help="Seconds before a call times out")
+    args = parser.parse_args()
+    if not args.host:
+        parser.error("--host or the HOST environment variable is required")
+    return args
+
+
+def main():
+    args = parse_args()
+    access_token = args.access_token
+    if args.credential_store:
+        access_token = get_longest_valid_token(args.credential_store)
+        if not access_token:
+            raise SystemExit(f"No valid access token in {args.credential_store}")
+
+    channel = grpc.insecure_channel(args.host)
+    client = VacancyServiceClient(channel)
+    client.set_access_token(access_token)
+    try:
+        if args.manifest:
+            vacancy_ids = read_manifest(args.manifest)
+        else:
+            tags = [tag.strip() for tag in args.tags.split(",") if tag.strip()]
+            vacancy_ids, scanned = scan_tagged_vacancies(client, tags, args.page_size, args.timeout)
+            logging.info("Scanned %d vacancies, %d tagged with %s", scanned, len(vacancy_ids), ", ".join(tags))
+
+        if args.dry_run:
+            count = len(vacancy_ids) if isinstance(vacancy_ids, list) else sum(1 for _ in vacancy_ids)
+            logging.info("Dry run, %d vacancies would be deleted", count)
+            return
+        Sweeper(client, args.concurrency, args.rate, timeout=args.timeout).run(vacancy_ids)
+    finally:
+        channel.close()
+
+
+if __name__ == "__main__":
+    main()
+
+# Command to run the cleanup
+# python -m src.tools.cleanup_vacancies --host vacancies.cyrextech.net:7823 --rate 200
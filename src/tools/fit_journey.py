@@ -0,0 +1,55 @@
+"""
+Module: fit_journey
+Description: Fits a session journey model with think time distributions to a traffic capture.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import argparse
+import logging
+
+from src.replay.capture import iter_capture
+from src.replay.journey import END, START, THINK_TIME_KINDS, fit_journey
+
+logging.basicConfig(level=logging.INFO)
+
+
+def parse_args():
+    """
+    Parses the command line arguments.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Fit a Markov chain journey model to the sessions of a capture.")
+    parser.add_argument("--capture", required=True, help="Capture recorded by src/tools/recording_proxy.py")
+    parser.add_argument("--output", default="config/journey.json", help="Journey model file to write")
+    parser.add_argument("--session-gap", type=float, default=300, help="Idle seconds that end a session")
+    parser.add_argument("--think-time", choices=THINK_TIME_KINDS, default="lognormal", help="Think time distribution to fit")
+    parser.add_argument("--max-think-time", type=float, help="Upper bound of drawn think times in seconds")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    model = fit_journey(
+        iter_capture(args.capture),
+        session_gap=args.session_gap,
+        think_time=args.think_time,
+        max_think_time=args.max_think_time,
+    )
+    model.save(args.output)
+    for state, targets in model.transitions.items():
+        path = ", ".join(f"{target} {probability:.0%}" for target, probability in targets.items())
+        think_time = model.think_times.get(state) if state != START else None
+        logging.info("%s -> %s%s", state, path, f" | think {think_time.spec}" if think_time else "")
+    if END in model.think_times:
+        logging.info("Between sessions: %s", model.think_times[END].spec)
+    logging.info("Wrote the journey model to %s", args.output)
+
+
+if __name__ == "__main__":
+    main()
+
+# Command to fit a journey model
+# python -m src.tools.fit_journey --capture captures/staging.bin --output config/journey.json --think-time lognormal
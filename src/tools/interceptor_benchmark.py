@@ -0,0 +1,206 @@
+"""
+Module: interceptor_benchmark
+Description: Measures the overhead of LocustInterceptor in nanoseconds per intercepted call.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import argparse
+import importlib
+import shlex
+import time
+import uuid
+
+import grpc
+from locust import events
+from locust.argument_parser import get_parser
+from locust.env import Environment
+from locust.event import Events
+
+from src.clients.locust_client import LocustInterceptor
+from src.clients.messages_client import Messages
+from src.replay.capture import METHODS
+
+GET_VACANCY = "/pb.VacancyService/GetVacancy"
+GET_VACANCIES = "/pb.VacancyService/GetVacancies"
+
+
+class _CallDetails(grpc.ClientCallDetails):
+    def __init__(self, method: str):
+        self.method = method
+        self.timeout = None
+        self.metadata = None
+        self.credentials = None
+        self.wait_for_ready = None
+        self.compression = None
+
+
+class _UnaryOutcome:
+    """
+    A finished unary call, like the outcome gRPC hands to interceptors.
+    """
+
+    def __init__(self, response):
+        self._response = response
+
+    def code(self):
+        return grpc.StatusCode.OK
+
+    def result(self, timeout=None):
+        return self._response
+
+
+class _StreamOutcome:
+    """
+    A finished server stream, like the call gRPC hands to interceptors.
+    """
+
+    def __init__(self, responses: list):
+        self._responses = iter(responses)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._responses)
+
+    def code(self):
+        return grpc.StatusCode.OK
+
+
+def build_environment(listeners: str, locust_args: str):
+    """
+    Creates the Locust environment the interceptor reports to.
+
+    Args:
+        listeners (str): "none" for no request listeners, "all" for the listeners of src/main.py.
+        locust_args (str): Extra Locust command line options.
+
+    Returns:
+        Environment: The environment.
+    """
+    importlib.import_module("src.main")
+    options = get_parser().parse_args(["-f", "src/main.py", "--headless"] + shlex.split(locust_args))
+    if listeners == "none":
+        return Environment(events=Events(), parsed_options=options)
+    environment = Environment(events=events, parsed_options=options, host="benchmark")
+    runner = environment.create_local_runner()
+    events.init.fire(environment=environment, runner=runner, web_ui=None)
+    return environment
+
+
+def measure(function, calls: int, repeats: int):
+    """
+    Times a function and keeps the fastest of several runs.
+
+    Args:
+        function (Callable): Function making one call.
+        calls (int): Calls per run.
+        repeats (int): Number of runs.
+
+    Returns:
+        float: Nanoseconds per call of the fastest run.
+    """
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        for _ in range(calls):
+            function()
+        elapsed = (time.perf_counter_ns() - start) / calls
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(listeners: str, locust_args: str, calls: int, repeats: int, stream_messages: int):
+    """
+    Benchmarks a unary and a server streaming call with and without the interceptor.
+
+    Args:
+        listeners (str): "none" or "all".
+        locust_args (str): Extra Locust command line options.
+        calls (int): Calls per run.
+        repeats (int): Number of runs.
+        stream_messages (int): Messages per server stream.
+
+    Returns:
+        list: (call, bare ns, intercepted ns) rows.
+    """
+    environment = build_environment(listeners, locust_args)
+    interceptor = LocustInterceptor(environment=environment, context={"user_id": "benchmark", "channel": "benchmark#1"})
+
+    request = Messages.get_vacancy(id=str(uuid.uuid4()))
+    response = METHODS[GET_VACANCY].response_class()
+    response.vacancy.Id = request.Id
+    response.vacancy.Title = "benchmark"
+    unary_details = _CallDetails(GET_VACANCY)
+
+    def unary_continuation(call_details, request):
+        return _UnaryOutcome(response)
+
+    stream_request = Messages.get_vacancies(limit=stream_messages)
+    stream_responses = [response.vacancy] * stream_messages
+    stream_details = _CallDetails(GET_VACANCIES)
+
+    def stream_continuation(call_details, request):
+        return _StreamOutcome(stream_responses)
+
+    def bare_stream():
+        for _ in stream_continuation(stream_details, stream_request):
+            pass
+
+    def intercepted_stream():
+        for _ in interceptor.intercept_unary_stream(stream_continuation, stream_details, stream_request):
+            pass
+
+    rows = [
+        (
+            "unary",
+            measure(lambda: unary_continuation(unary_details, request).result(), calls, repeats),
+            measure(lambda: interceptor.intercept_unary_unary(unary_continuation, unary_details, request).result(), calls, repeats),
+        ),
+        (
+            f"stream of {stream_messages}",
+            measure(bare_stream, calls, repeats),
+            measure(intercepted_stream, calls, repeats),
+        ),
+    ]
+    flush = getattr(environment, "request_event_batch", None)
+    if flush is not None:
+        flush.flush()
+    return rows
+
+
+def parse_args():
+    """
+    Parses the command line arguments.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Measure the per-call overhead of LocustInterceptor.")
+    parser.add_argument("--calls", type=int, default=100000, help="Calls per run")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per measurement, the fastest is reported")
+    parser.add_argument("--stream-messages", type=int, default=10, help="Messages per server stream")
+    parser.add_argument(
+        "--listeners",
+        choices=("none", "all"),
+        default="all",
+        help="none measures the interceptor alone, all includes the request listeners of src/main.py",
+    )
+    parser.add_argument("--locust-args", default="", help="Extra Locust options, e.g. \"--event-batch-size 256\"")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    rows = run(args.listeners, args.locust_args, args.calls, args.repeats, args.stream_messages)
+    print(f"{'Call':<16}{'Bare ns':>12}{'Intercepted ns':>16}{'Overhead ns':>14}")
+    for name, bare, intercepted in rows:
+        print(f"{name:<16}{bare:>12.0f}{intercepted:>16.0f}{intercepted - bare:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
+
+# Command to run the benchmark
+# python -m src.tools.interceptor_benchmark --listeners all --calls 100000
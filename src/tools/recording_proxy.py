@@ -0,0 +1,279 @@
+"""
+Module: recording_proxy
+Description: gRPC proxy forwarding calls to an upstream service while recording them for replay.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import argparse
+import hashlib
+import logging
+import queue
+import signal
+import threading
+import time
+from concurrent import futures
+
+import grpc
+
+from src.replay.capture import METHODS, CaptureRecord, CaptureWriter
+
+logging.basicConfig(level=logging.INFO)
+
+# Headers set by the gRPC transport itself, they must not be copied to the upstream call
+_TRANSPORT_HEADERS = ("user-agent", "grpc-")
+# time_remaining() reports calls without a deadline as roughly 2**63 seconds
+_NO_DEADLINE = 1e9
+SIGN_IN_METHOD = "/pb.AuthService/SignInUser"
+
+
+class AsyncRecorder:
+    """
+    Writes capture records from a background thread.
+
+    Proxy handlers only enqueue records, they never wait for the disk. When the
+    queue is full records are dropped and counted rather than slowing the calls.
+    """
+
+    def __init__(self, writer: CaptureWriter, queue_size: int = 100000, flush_interval: float = 1.0):
+        self.writer = writer
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.recorded = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, record: CaptureRecord):
+        """
+        Enqueues a record without blocking.
+
+        Args:
+            record (CaptureRecord): The captured call.
+        """
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                record = False
+            if record is None:
+                break
+            if record:
+                self.writer.write(record)
+                self.recorded += 1
+            if time.monotonic() >= next_flush:
+                self.writer.flush()
+                next_flush = time.monotonic() + self.flush_interval
+        self.writer.flush()
+
+    def close(self):
+        """
+        Writes the remaining records and closes the capture file.
+        """
+        self.queue.put(None)
+        self._thread.join()
+        self.writer.close()
+
+
+def _forward_metadata(context):
+    """
+    Returns the client metadata to send upstream.
+
+    Args:
+        context (grpc.ServicerContext): The server call context.
+
+    Returns:
+        tuple: The metadata without the transport headers.
+    """
+    return tuple(
+        (key, value) for key, value in context.invocation_metadata()
+        if not key.startswith(":") and not key.startswith(_TRANSPORT_HEADERS)
+    )
+
+
+def _token_session(access_token: str):
+    """
+    Derives a session key from an access token, the token itself is not recorded.
+
+    Args:
+        access_token (str): The access token.
+
+    Returns:
+        str: The session key.
+    """
+    return "token:" + hashlib.sha256(access_token.encode()).hexdigest()[:16]
+
+
+def _session(context):
+    """
+    Returns the session key of a call.
+
+    Calls are grouped by the access token they carry. gRPC clients share
+    connections between channels, so the client address only tells calls
+    without a token apart by machine.
+
+    Args:
+        context (grpc.ServicerContext): The server call context.
+
+    Returns:
+        str: The session key.
+    """
+    for key, value in context.invocation_metadata():
+        if key == "authorization" and value.startswith("Bearer "):
+            return _token_session(value[len("Bearer "):])
+    return context.peer()
+
+
+def _upstream_timeout(context):
+    """
+    Returns the client's remaining deadline to pass on to the upstream call.
+
+    Args:
+        context (grpc.ServicerContext): The server call context.
+
+    Returns:
+        float: Seconds left, None when the client set no deadline.
+    """
+    remaining = context.time_remaining()
+    return None if remaining is None or remaining > _NO_DEADLINE else remaining
+
+
+class RecordingProxy(grpc.GenericRpcHandler):
+    """
+    Forwards every method of the generated services to an upstream channel.
+
+    Requests and responses are passed through as bytes without being parsed, so
+    the proxy adds little more than one extra hop. Each finished call is handed
+    to the recorder with its method, start time, request bytes, response size,
+    status, upstream latency and session key.
+    """
+
+    def __init__(self, upstream_channel, recorder: AsyncRecorder):
+        self.recorder = recorder
+        self._handlers = {}
+        for path, method in METHODS.items():
+            if method.server_streaming:
+                upstream = upstream_channel.unary_stream(path)
+                handler = grpc.unary_stream_rpc_method_handler(self._forward_stream(path, upstream))
+            else:
+                upstream = upstream_channel.unary_unary(path)
+                handler = grpc.unary_unary_rpc_method_handler(self._forward_unary(path, upstream))
+            self._handlers[path] = handler
+
+    def service(self, handler_call_details):
+        return self._handlers.get(handler_call_details.method)
+
+    def _forward_unary(self, path: str, upstream):
+        record = self.recorder.record
+
+        def forward(request, context):
+            timestamp = time.time()
+            session = _session(context)
+            start_perf_counter = time.perf_counter()
+            status = "UNKNOWN"
+            response_size = 0
+            try:
+                response, call = upstream.with_call(
+                    request, metadata=_forward_metadata(context), timeout=_upstream_timeout(context)
+                )
+                context.set_trailing_metadata(call.trailing_metadata() or ())
+                status = "OK"
+                response_size = len(response)
+                if path == SIGN_IN_METHOD:
+                    # The sign-in belongs to the session of the token it returns
+                    access_token = METHODS[path].response_class.FromString(response).access_token
+                    if access_token:
+                        session = _token_session(access_token)
+                return response
+            except grpc.RpcError as e:
+                status = e.code().name
+                context.abort(e.code(), e.details())
+            finally:
+                record(CaptureRecord(
+                    timestamp, path, request, response_size, status, (time.perf_counter() - start_perf_counter) * 1000,
+                    session,
+                ))
+
+        return forward
+
+    def _forward_stream(self, path: str, upstream):
+        record = self.recorder.record
+
+        def forward(request, context):
+            timestamp = time.time()
+            session = _session(context)
+            start_perf_counter = time.perf_counter()
+            # Stays CANCELLED if the client goes away mid-stream
+            status = "CANCELLED"
+            response_size = 0
+            try:
+                for response in upstream(request, metadata=_forward_metadata(context), timeout=_upstream_timeout(context)):
+                    response_size += len(response)
+                    yield response
+                status = "OK"
+            except grpc.RpcError as e:
+                status = e.code().name
+                context.abort(e.code(), e.details())
+            finally:
+                record(CaptureRecord(
+                    timestamp, path, request, response_size, status, (time.perf_counter() - start_perf_counter) * 1000,
+                    session,
+                ))
+
+        return forward
+
+
+def parse_args():
+    """
+    Parses the command line arguments.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Record gRPC traffic while forwarding it to an upstream service.")
+    parser.add_argument("--listen", default="0.0.0.0:7823", help="Address the proxy listens on")
+    parser.add_argument("--upstream", required=True, help="Upstream host, e.g. vacancies.cyrextech.net:7823")
+    parser.add_argument("--upstream-tls", action="store_true", help="Connect to the upstream with TLS")
+    parser.add_argument("--output", required=True, help="Capture file, .jsonl for JSON lines, anything else for binary")
+    parser.add_argument("--workers", type=int, default=64, help="Concurrent calls the proxy can serve")
+    parser.add_argument("--queue-size", type=int, default=100000, help="Records buffered before new ones are dropped")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.upstream_tls:
+        upstream_channel = grpc.secure_channel(args.upstream, grpc.ssl_channel_credentials())
+    else:
+        upstream_channel = grpc.insecure_channel(args.upstream)
+
+    recorder = AsyncRecorder(CaptureWriter(args.output), queue_size=args.queue_size)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=args.workers))
+    server.add_generic_rpc_handlers((RecordingProxy(upstream_channel, recorder),))
+    server.add_insecure_port(args.listen)
+    server.start()
+    logging.info("Recording calls to %s on %s into %s", args.upstream, args.listen, args.output)
+
+    stopped = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stopped.set())
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    stopped.wait()
+
+    server.stop(grace=5).wait()
+    recorder.close()
+    upstream_channel.close()
+    logging.info("Recorded %d calls, dropped %d", recorder.recorded, recorder.dropped)
+
+
+if __name__ == "__main__":
+    main()
+
+# Command to run the proxy
+# python -m src.tools.recording_proxy --listen 0.0.0.0:7823 --upstream vacancies.cyrextech.net:7823 --output captures/staging.bin
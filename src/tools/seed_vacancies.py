@@ -0,0 +1,279 @@
+"""
+Module: seed_vacancies
+Description: Creates a large vacancy dataset with controlled field distributions and writes an ID manifest.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import argparse
+import bisect
+import csv
+import itertools
+import logging
+import os
+import random
+import string
+import time
+
+import gevent
+import grpc
+import grpc.experimental.gevent as grpc_gevent
+from dotenv import load_dotenv
+from gevent.pool import Pool
+
+import src.protos.vacancy_pb2 as vacancy
+from src.clients.channel_options import get_channel_options
+from src.clients.messages_client import Messages
+from src.clients.service_client import VacancyServiceClient
+from src.utils.credential_store import get_longest_valid_token
+from src.utils.utils import TEST_DATA_TAG, tag_text
+
+grpc_gevent.init_gevent()
+
+logging.basicConfig(level=logging.INFO)
+
+MANIFEST_FIELDS = ["id", "title", "division", "country", "description_size", "created_at"]
+
+RETRYABLE_CODES = {
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+}
+
+
+class WeightedChoice:
+    """
+    Draws values with fixed weights, parsed from "value=weight,value=weight".
+    """
+
+    def __init__(self, spec: str, convert=str):
+        values, weights = [], []
+        for item in spec.split(","):
+            value, _, weight = item.strip().partition("=")
+            values.append(convert(value))
+            weights.append(float(weight or 1))
+        self.values = values
+        self.cumulative = list(itertools.accumulate(weights))
+
+    def __call__(self, rng: random.Random):
+        return self.values[bisect.bisect_right(self.cumulative, rng.random() * self.cumulative[-1])]
+
+
+class VacancyFactory:
+    """
+    Builds create vacancy requests following the configured distributions.
+
+    Descriptions are slices of one random text, so large descriptions cost no
+    more to build than small ones. Every title starts with the seed tag, which
+    is how the cleanup sweeper finds seeded vacancies.
+    """
+
+    def __init__(self, tag: str, divisions: str, countries: str, description_sizes: str, seed: int = None):
+        self.tag = tag
+        self.rng = random.Random(seed)
+        self.divisions = WeightedChoice(divisions, vacancy.Vacancy.DIVISION.Value)
+        self.countries = WeightedChoice(countries)
+        self.description_sizes = WeightedChoice(description_sizes, int)
+        text_size = max(self.description_sizes.values) * 2
+        self.text = "".join(self.rng.choice(string.ascii_lowercase + "     ") for _ in range(text_size))
+
+    def build(self):
+        """
+        Returns a new request and the fields written to the manifest.
+
+        Returns:
+            tuple: The CreateVacancyRequest and a dict of its manifest fields.
+        """
+        rng = self.rng
+        size = self.description_sizes(rng)
+        offset = rng.randrange(len(self.text) - size + 1)
+        fields = {
+            "title": tag_text(self.text[offset:offset + 24].strip() or "vacancy", self.tag),
+            "division": self.divisions(rng),
+            "country": self.countries(rng),
+            "description_size": size,
+        }
+        message = Messages.create_vacancy(
+            country=fields["country"],
+            description=self.text[offset:offset + size],
+            division=fields["division"],
+            title=fields["title"],
+        )
+        return message, fields
+
+
+class Manifest:
+    """
+    CSV file of the seeded vacancy IDs, which doubles as the seeding checkpoint.
+
+    Rows are buffered and flushed every flush_interval seconds, a restarted run
+    counts the rows already written and only creates the missing vacancies.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.existing = 0
+        if os.path.exists(path):
+            with open(path, "r", newline="") as file:
+                self.existing = sum(1 for _ in csv.DictReader(file))
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=MANIFEST_FIELDS)
+        if new_file:
+            self.writer.writeheader()
+        self._last_flush = time.monotonic()
+
+    def add(self, row: dict):
+        self.writer.writerow(row)
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self.file.flush()
+            self._last_flush = now
+
+    def close(self):
+        self.file.close()
+
+
+class Seeder:
+    """
+    Creates vacancies with a fixed number of concurrent calls spread over many channels.
+    """
+
+    def __init__(self, clients: list, factory: VacancyFactory, manifest: Manifest, timeout: float = 10.0, retries: int = 5):
+        self.clients = clients
+        self.factory = factory
+        self.manifest = manifest
+        self.timeout = timeout
+        self.retries = retries
+        self.created = 0
+        self.failed = 0
+
+    def _create(self, client: VacancyServiceClient):
+        message, fields = self.factory.build()
+        for attempt in itertools.count():
+            try:
+                response = client.stub.CreateVacancy(message, metadata=client.metadata, timeout=self.timeout)
+                break
+            except grpc.RpcError as e:
+                if e.code() not in RETRYABLE_CODES or attempt >= self.retries:
+                    self.failed += 1
+                    logging.warning("CreateVacancy failed: %s %s", e.code().name, e.details())
+                    return
+            gevent.sleep(min(0.1 * 2 ** attempt, 5.0) * random.uniform(0.5, 1.5))
+        fields["id"] = response.vacancy.Id
+        fields["division"] = vacancy.Vacancy.DIVISION.Name(fields["division"])
+        fields["created_at"] = round(time.time(), 3)
+        self.manifest.add(fields)
+        self.created += 1
+
+    def _worker(self, index: int, remaining):
+        client = self.clients[index % len(self.clients)]
+        for _ in remaining:
+            self._create(client)
+
+    def run(self, count: int, concurrency: int, progress_interval: float = 10.0):
+        """
+        Creates vacancies until count vacancies are in the manifest.
+
+        Args:
+            count (int): Total number of vacancies wanted, including those of previous runs.
+            concurrency (int): Number of calls in flight.
+            progress_interval (float): Seconds between progress logs.
+        """
+        missing = max(count - self.manifest.existing, 0)
+        logging.info("%d vacancies in the manifest, creating %d", self.manifest.existing, missing)
+        # Workers share one iterator, each item is one vacancy to create
+        remaining = iter(range(missing))
+        start = time.perf_counter()
+        progress = gevent.spawn(self._log_progress, start, progress_interval)
+        pool = Pool(concurrency)
+        try:
+            for index in range(concurrency):
+                pool.spawn(self._worker, index, remaining)
+            pool.join()
+        finally:
+            progress.kill()
+            self._log_progress_line(start)
+
+    def _log_progress(self, start: float, interval: float):
+        while True:
+            gevent.sleep(interval)
+            self._log_progress_line(start)
+
+    def _log_progress_line(self, start: float):
+        elapsed = time.perf_counter() - start
+        logging.info(
+            "Created %d vacancies, %d failed, %.1f/s", self.created, self.failed, self.created / elapsed if elapsed else 0
+        )
+
+
+def parse_args():
+    """
+    Parses the command line arguments.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Seed the vacancy service with a large, known dataset.")
+    parser.add_argument("--host", default=os.getenv("HOST"), help="Target host, defaults to the HOST environment variable")
+    parser.add_argument("--count", type=int, required=True, help="Total number of vacancies wanted")
+    parser.add_argument("--manifest", default="vacancies_manifest.csv", help="ID manifest, also used to resume")
+    parser.add_argument("--tag", default=f"{TEST_DATA_TAG}-seed", help="Tag put in front of every title, used by the cleanup")
+    parser.add_argument("--concurrency", type=int, default=256, help="Number of calls in flight")
+    parser.add_argument("--channels", type=int, default=8, help="Number of channels the calls are spread over")
+    parser.add_argument("--channel-profile", default="high-throughput", help="Channel option profile")
+    parser.add_argument(
+        "--divisions",
+        default="DEVELOPMENT=40,SECURITY=20,SALES=25,OTHER=15",
+        help="Division weights",
+    )
+    parser.add_argument("--countries", default="TR=30,US=25,DE=20,GB=15,NL=10", help="Country weights")
+    parser.add_argument(
+        "--description-sizes",
+        default="200=60,1000=30,8000=10",
+        help="Description size weights, in characters",
+    )
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible datasets")
+    parser.add_argument("--access-token", default=os.getenv("ACCESS_TOKEN"), help="Bearer token sent with every call")
+    parser.add_argument("--credential-store", help="Take the longest valid access token from this credential store")
+    parser.add_argument("--timeout", type=float, default=10, help="Seconds before a call times out")
+    parser.add_argument("--retries", type=int, default=5, help="Retries of overloaded or unreachable calls")
+    args = parser.parse_args()
+    if not args.host:
+        parser.error("--host or the HOST environment variable is required")
+    return args
+
+
+def main():
+    args = parse_args()
+    access_token = args.access_token
+    if args.credential_store:
+        access_token = get_longest_valid_token(args.credential_store)
+        if not access_token:
+            raise SystemExit(f"No valid access token in {args.credential_store}")
+
+    options = get_channel_options(args.channel_profile)
+    channels = [grpc.insecure_channel(args.host, options=options) for _ in range(args.channels)]
+    clients = []
+    for channel in channels:
+        client = VacancyServiceClient(channel)
+        client.set_access_token(access_token)
+        clients.append(client)
+
+    factory = VacancyFactory(args.tag, args.divisions, args.countries, args.description_sizes, seed=args.seed)
+    manifest = Manifest(args.manifest)
+    try:
+        Seeder(clients, factory, manifest, timeout=args.timeout, retries=args.retries).run(args.count, args.concurrency)
+    finally:
+        manifest.close()
+        for channel in channels:
+            channel.close()
+
+
+if __name__ == "__main__":
+    main()
+
+# Command to seed the vacancy store
+# python -m src.tools.seed_vacancies --host vacancies.cyrextech.net:7823 --count 1000000 --manifest vacancies_manifest.csv
@@ -0,0 +1,237 @@
+"""
+Module: credential_store
+Description: SQLite store of signed in test accounts, indexed by token expiry.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+import jwt
+
+Credential = namedtuple(
+    "Credential",
+    ["email", "password", "user_id", "access_token", "access_expires_at", "refresh_token", "refresh_expires_at"],
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS credentials (
+    email TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    user_id TEXT,
+    access_token TEXT NOT NULL,
+    access_expires_at REAL NOT NULL,
+    refresh_token TEXT,
+    refresh_expires_at REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS credentials_access_expires_at ON credentials (access_expires_at);
+CREATE INDEX IF NOT EXISTS credentials_refresh_expires_at ON credentials (refresh_expires_at);
+"""
+
+_UPSERT = """
+INSERT OR REPLACE INTO credentials
+    (email, password, user_id, access_token, access_expires_at, refresh_token, refresh_expires_at, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _token_claims(token: str):
+    """
+    Reads the claims of a JWT token without verifying its signature.
+
+    Args:
+        token (str): The JWT token.
+
+    Returns:
+        dict: The token claims, empty if the token cannot be decoded.
+    """
+    if not token:
+        return {}
+    try:
+        return jwt.decode(token, options={"verify_signature": False})
+    except jwt.InvalidTokenError:
+        return {}
+
+
+def token_subject(token: str):
+    """
+    Reads the user ID an access token was issued for.
+
+    Args:
+        token (str): The JWT access token.
+
+    Returns:
+        str: The sub claim of the token, None if it has none.
+    """
+    return _token_claims(token).get("sub")
+
+
+class CredentialStore:
+    """
+    Stores the tokens of signed in accounts as they come in.
+
+    Accounts are buffered and written in one transaction per batch_size
+    accounts, so a crash loses at most one batch. The expiry of both tokens is
+    kept in indexed columns, finding the tokens valid for a given time does not
+    decode any token.
+    """
+
+    def __init__(self, path: str, batch_size: int = 100):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = []
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(_SCHEMA)
+
+    def add(self, email: str, password: str, access_token: str, refresh_token: str = None):
+        """
+        Adds or replaces the tokens of an account.
+
+        Args:
+            email (str): Account email.
+            password (str): Account password.
+            access_token (str): Access token returned by SignInUser.
+            refresh_token (str, optional): Refresh token returned by SignInUser.
+        """
+        access_claims = _token_claims(access_token)
+        refresh_claims = _token_claims(refresh_token)
+        row = (
+            email,
+            password,
+            access_claims.get("sub"),
+            access_token,
+            access_claims.get("exp", 0),
+            refresh_token,
+            refresh_claims.get("exp"),
+            time.time(),
+        )
+        with self._lock:
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        if self._pending:
+            with self.connection:
+                self.connection.executemany(_UPSERT, self._pending)
+            self._pending = []
+
+    def flush(self):
+        """
+        Writes the buffered accounts.
+        """
+        with self._lock:
+            self._flush()
+
+    def valid_for(self, minutes: float, limit: int = None):
+        """
+        Returns the accounts whose access token is valid for at least the given time.
+
+        Args:
+            minutes (float): Minimum remaining validity of the access token.
+            limit (int, optional): Maximum number of accounts.
+
+        Returns:
+            list: Credential tuples, longest valid first.
+        """
+        self.flush()
+        query = (
+            "SELECT email, password, user_id, access_token, access_expires_at, refresh_token, refresh_expires_at "
+            "FROM credentials WHERE access_expires_at >= ? ORDER BY access_expires_at DESC"
+        )
+        parameters = [time.time() + minutes * 60]
+        if limit:
+            query += " LIMIT ?"
+            parameters.append(limit)
+        return [Credential(*row) for row in self.connection.execute(query, parameters)]
+
+    def close(self):
+        """
+        Writes the buffered accounts and closes the database.
+        """
+        self.flush()
+        self.connection.close()
+
+
+# Loaded credentials per (store path, minimum validity), longest valid first
+_loaded_credentials = {}
+
+
+def load_valid_credentials(path: str, minutes: float):
+    """
+    Returns the credentials valid for at least the given time.
+
+    The store is read on first use. Every call drops the cached credentials
+    that are no longer valid long enough, and reads the store again once none
+    are left, e.g. after the provisioning pipeline refreshed the tokens.
+
+    Args:
+        path (str): Credential store file.
+        minutes (float): Minimum remaining validity of the access token.
+
+    Returns:
+        list: Credential tuples.
+
+    Raises:
+        ValueError: If no stored access token is valid long enough.
+    """
+    credentials = _loaded_credentials.get((path, minutes), [])
+    deadline = time.time() + minutes * 60
+    while credentials and credentials[-1].access_expires_at < deadline:
+        credentials.pop()
+    if not credentials:
+        store = CredentialStore(path)
+        try:
+            credentials = store.valid_for(minutes)
+        finally:
+            store.close()
+        if not credentials:
+            raise ValueError(f"No access token in {path} is valid for {minutes:g} more minutes")
+        _loaded_credentials[(path, minutes)] = credentials
+    return credentials
+
+
+def get_longest_valid_token(path: str):
+    """
+    Returns the stored access token that stays valid the longest.
+
+    Args:
+        path (str): Credential store file.
+
+    Returns:
+        str: The access token, None if no stored token is valid.
+    """
+    store = CredentialStore(path)
+    try:
+        credentials = store.valid_for(0, limit=1)
+    finally:
+        store.close()
+    return credentials[0].access_token if credentials else None
+
+
+credential_counter = 0
+
+
+def get_stored_credential(path: str, minutes: float):
+    """
+    Hands out the stored credentials round robin, like get_user does for the .env users.
+
+    Args:
+        path (str): Credential store file.
+        minutes (float): Minimum remaining validity of the access token.
+
+    Returns:
+        Credential: The next stored credential.
+    """
+    global credential_counter
+    credentials = load_valid_credentials(path, minutes)
+    credential = credentials[credential_counter % len(credentials)]
+    credential_counter += 1
+    return credential
@@ -12,6 +12,24 @@ import string
 from dotenv import load_dotenv
 
 
+# Marks the records created by the load test, see src/tools/cleanup_vacancies.py
+TEST_DATA_TAG = "loadtest"
+
+
+def tag_text(text: str, tag: str = TEST_DATA_TAG):
+    """
+    Prefixes a text with a test data tag.
+
+    Args:
+        text (str): The text to tag.
+        tag (str, optional): The tag.
+
+    Returns:
+        str: The text as "[tag] text".
+    """
+    return f"[{tag}] {text}"
+
+
 class RandomText:
     """
     Utility class for generating random text strings.
@@ -0,0 +1,87 @@
+"""
+Module: test_columnar_export
+Description: Tests the per-second aggregates the columnar export writes on the master.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import argparse
+from types import SimpleNamespace
+
+import pytest
+from locust.runners import MasterRunner
+
+from src.stats import columnar_export
+from src.stats.columnar_export import ColumnarExport
+from src.stats.rolling_windows import RollingWindowStats
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+METHOD = "/pb.VacancyService/GetVacancy"
+START = 1_700_000_000
+
+
+class StubMasterRunner(MasterRunner):
+    worker_count = 2
+
+    def __init__(self):
+        self.greenlet = None
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = [START + 0.1]
+    monkeypatch.setattr(columnar_export, "time", SimpleNamespace(time=lambda: clock[0]))
+    return clock
+
+
+def master_export(directory):
+    environment = SimpleNamespace(
+        runner=StubMasterRunner(),
+        parsed_options=argparse.Namespace(),
+        host="",
+        rolling_window_stats=RollingWindowStats((1,), delay=1),
+    )
+    return ColumnarExport(environment, str(directory), "parquet", 100, 0.0)
+
+
+def worker_report(seconds, calls_per_second=5):
+    stats = RollingWindowStats((1,))
+    for second in seconds:
+        for _ in range(calls_per_second):
+            stats.log(METHOD, 10.0, False, now=second)
+    return stats.serialize(now=seconds[-1] + 1)
+
+
+def read_requests(directory):
+    (path,) = directory.glob("aggregates-*.parquet")
+    table = pq.read_table(path).to_pydict()
+    return {second.timestamp(): requests for second, requests in zip(table["second"], table["requests"])}
+
+
+def test_master_merges_late_worker_reports(tmp_path, clock):
+    export = master_export(tmp_path)
+    stats = export.environment.rolling_window_stats
+    export.start()
+    stats.merge(worker_report([START, START + 1]))
+    clock[0] = START + 2.2
+    export.stop()
+    # A worker's last report arrives after test_stop
+    stats.merge(worker_report([START + 1]))
+    assert export.aggregates is not None
+    export._closing.join()
+    assert export.aggregates is None
+    assert read_requests(tmp_path) == {START: 5, START + 1: 10}
+
+
+def test_quitting_closes_right_away(tmp_path, clock):
+    export = master_export(tmp_path)
+    stats = export.environment.rolling_window_stats
+    export.start()
+    stats.merge(worker_report([START]))
+    clock[0] = START + 1.5
+    export.stop()
+    export.stop(wait_for_workers=False)
+    assert export.aggregates is None
+    assert export._closing is None
+    assert read_requests(tmp_path) == {START: 5}
@@ -0,0 +1,72 @@
+"""
+Module: test_histogram
+Description: Tests the packing, merging and percentiles of the latency histograms.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import random
+
+import pytest
+
+from src.stats.histogram import SUB_BUCKET_COUNT, KeyedHistograms, LatencyHistogram
+
+
+def random_histogram(seed: int, count: int = 2000):
+    rng = random.Random(seed)
+    histogram = LatencyHistogram()
+    values = [rng.lognormvariate(2, 1.5) for _ in range(count)]
+    for value in values:
+        histogram.record(value)
+    return histogram, values
+
+
+def test_pack_round_trip():
+    histogram, _ = random_histogram(1)
+    unpacked = LatencyHistogram.unpack(histogram.pack())
+    assert unpacked.buckets == histogram.buckets
+    assert unpacked.count == histogram.count
+    assert unpacked.total == pytest.approx(histogram.total)
+    assert unpacked.max == histogram.max
+
+
+def test_pack_empty_histogram():
+    unpacked = LatencyHistogram.unpack(LatencyHistogram().pack())
+    assert unpacked.buckets == {}
+    assert unpacked.count == 0
+    assert unpacked.percentile(0.99) == 0.0
+
+
+def test_merge_packed_matches_merge():
+    first, _ = random_histogram(2)
+    second, _ = random_histogram(3, count=500)
+    second.record(3_600_000)
+    merged = first.copy()
+    merged.merge(second)
+
+    packed = LatencyHistogram.unpack(first.pack())
+    packed.merge_packed(second.pack())
+    assert packed.buckets == merged.buckets
+    assert packed.count == merged.count == 2501
+    assert packed.max == merged.max == 3_600_000
+
+
+def test_keyed_histograms_merge_worker_reports():
+    worker = KeyedHistograms()
+    worker.record(("/pb.VacancyService/GetVacancy", "OK"), 12.5)
+    worker.record(("/pb.VacancyService/GetVacancy", "UNAVAILABLE"), 3.0)
+    master = KeyedHistograms()
+    master.merge(worker.serialize())
+    master.merge(worker.serialize())
+    assert master.entries[("/pb.VacancyService/GetVacancy", "OK")].count == 2
+    assert master.entries[("/pb.VacancyService/GetVacancy", "UNAVAILABLE")].count == 2
+
+
+@pytest.mark.parametrize("fraction", [0.5, 0.9, 0.99, 1.0])
+def test_percentile_bounds(fraction):
+    histogram, values = random_histogram(4)
+    exact = sorted(values)[max(1, round(len(values) * fraction)) - 1]
+    percentile = histogram.percentile(fraction)
+    # A bucket spans 1/SUB_BUCKET_COUNT of its values, the percentile is its lower bound
+    assert exact * (1 - 1 / SUB_BUCKET_COUNT) - 0.001 <= percentile <= exact
+    assert percentile <= histogram.max
@@ -0,0 +1,82 @@
+"""
+Module: test_journey
+Description: Tests think time specs and the journey model fitted from captured sessions.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import random
+
+import pytest
+from locust.exception import LocustError
+
+from src.replay.capture import CaptureRecord
+from src.replay.journey import END, START, JourneyModel, ThinkTime, fit_journey
+
+SIGN_IN = "/pb.AuthService/SignInUser"
+GET_VACANCIES = "/pb.VacancyService/GetVacancies"
+GET_VACANCY = "/pb.VacancyService/GetVacancy"
+
+
+@pytest.mark.parametrize("spec", [
+    "weibull:shape=1",
+    "constant:fast",
+    "exponential:mean",
+    "exponential:max=10",
+    "lognormal:sigma=0.5",
+    "empirical:1,two,3",
+])
+def test_think_time_rejects_invalid_specs(spec):
+    with pytest.raises(LocustError):
+        ThinkTime(spec)
+
+
+@pytest.mark.parametrize("spec", ["constant:2", "exponential:mean=5,max=8", "lognormal:median=3,sigma=0.8,max=8",
+                                  "empirical:0.5,1,4"])
+def test_think_time_draws_within_bounds(spec):
+    think_time = ThinkTime(spec)
+    rng = random.Random(1)
+    draws = [think_time.draw(rng) for _ in range(1000)]
+    assert all(0 <= draw <= 8 for draw in draws)
+
+
+def capture(sessions: list):
+    records = []
+    for index, methods in enumerate(sessions):
+        timestamp = 1000.0 + index * 10000
+        for method in methods:
+            records.append(CaptureRecord(timestamp, method, b"", 0, "OK", 10.0, f"token:{index}"))
+            timestamp += 2.0
+    return records
+
+
+def test_fit_journey_transitions_sum_to_one():
+    model = fit_journey(capture([
+        [SIGN_IN, GET_VACANCIES, GET_VACANCY],
+        [SIGN_IN, GET_VACANCIES],
+        [SIGN_IN, GET_VACANCY, GET_VACANCY],
+        [GET_VACANCIES],
+    ]), think_time="exponential")
+    for state, targets in model.transitions.items():
+        assert sum(targets.values()) == pytest.approx(1.0, abs=1e-5), state
+    assert model.transitions[START] == {GET_VACANCIES: 0.25, SIGN_IN: 0.75}
+    assert model.transitions[SIGN_IN] == pytest.approx({GET_VACANCIES: 2 / 3, GET_VACANCY: 1 / 3}, abs=1e-5)
+    assert END in model.transitions[GET_VACANCY]
+
+
+def test_fit_journey_splits_sessions_on_idle_gap():
+    records = capture([[SIGN_IN, GET_VACANCIES]])
+    last = records[-1]
+    records.append(last._replace(timestamp=last.timestamp + 1000, method=GET_VACANCY))
+    model = fit_journey(records, session_gap=300)
+    assert model.transitions[START] == {GET_VACANCY: 0.5, SIGN_IN: 0.5}
+    assert END in model.think_times
+
+
+def test_journey_model_round_trips_through_json(tmp_path):
+    model = fit_journey(capture([[SIGN_IN, GET_VACANCIES], [SIGN_IN, GET_VACANCY]]))
+    path = tmp_path / "journey.json"
+    model.save(str(path))
+    loaded = JourneyModel.load(str(path))
+    assert loaded.transitions == model.transitions
+    assert loaded.to_dict() == model.to_dict()
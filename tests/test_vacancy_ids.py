@@ -0,0 +1,59 @@
+"""
+Module: test_vacancy_ids
+Description: Tests the alias table and the vacancy ID sampling strategies.
+Author: oaslananka
+GitHub: https://github.com/oaslananka
+"""
+
+import random
+from collections import Counter
+
+import pytest
+from locust.exception import LocustError
+
+from src.clients.vacancy_ids import AliasTable, VacancyIdSampler, read_manifest_ids
+
+DRAWS = 200000
+
+
+@pytest.mark.parametrize("weights", [
+    [1, 1, 1, 1],
+    [5, 1, 3, 1],
+    [0.7, 0.2, 0.1],
+    [10, 0, 0, 1],
+    [1.0 / rank ** 1.1 for rank in range(1, 51)],
+])
+def test_alias_table_frequencies_follow_weights(weights):
+    table = AliasTable(weights)
+    rng = random.Random(7)
+    counts = Counter(table.draw(rng) for _ in range(DRAWS))
+    total = sum(weights)
+    for index, weight in enumerate(weights):
+        assert counts[index] / DRAWS == pytest.approx(weight / total, abs=0.005)
+
+
+def test_hot_set_share():
+    ids = [str(index) for index in range(1000)]
+    sampler = VacancyIdSampler(ids, strategy="hot-set", hot_fraction=0.1, hot_share=0.9, seed=3)
+    hot = set(sampler.ids[:100])
+    hits = sum(sampler.sample() in hot for _ in range(DRAWS // 4))
+    assert hits / (DRAWS // 4) == pytest.approx(0.9, abs=0.01)
+
+
+def test_recency_favours_the_newest_ids():
+    ids = [str(index) for index in range(1000)]
+    sampler = VacancyIdSampler(ids, strategy="recency", recency_half_life=0.1, seed=5)
+    draws = [int(sampler.sample()) for _ in range(DRAWS // 4)]
+    # Half of the weight is in the newest tenth of the IDs
+    assert sum(draw >= 900 for draw in draws) / len(draws) == pytest.approx(0.5, abs=0.02)
+
+
+def test_empty_index_is_rejected():
+    with pytest.raises(LocustError):
+        VacancyIdSampler([], strategy="uniform")
+
+
+def test_manifest_ids_are_read_oldest_first(tmp_path):
+    path = tmp_path / "manifest.csv"
+    path.write_text("id,title,created_at\nb,x,20.5\na,x,10.0\nc,x,30\n")
+    assert read_manifest_ids(str(path)) == ["a", "b", "c"]